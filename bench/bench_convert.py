@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Time convert_markdown_to_html against the old regex pipeline.
+
+Builds writeup-shaped markdown of increasing size, checks that both
+converters produce identical HTML and prints the time each one takes.
+Fenced code blocks and code spans are left out of the check, since
+the old pipeline ran them through the inline rules and mangled them,
+and #tag links are taken back to plain text, as it never made them.
+
+The exit status is 1 when the tokenizer is less than --min-speedup
+times as fast as the old pipeline at any size.  The default floor sits
+below the 1.0-1.2x this tree measures, to leave room for timing noise,
+so a run fails on a real slowdown rather than an unlucky one.
+
+    python bench/bench_convert.py
+    python bench/bench_convert.py --sizes 64 1024 8192 --repeat 5
+    python bench/bench_convert.py --min-speedup 1.1
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(HERE, '..', 'blogs'), HERE]
+
+import ch  # noqa: E402
+import legacy_ch  # noqa: E402
+
+_FENCED = re.compile(r'^[ \t]*```.*?^[ \t]*```[ \t]*\n', re.M | re.S)
+_CODE_SPAN = re.compile(r'`[^`\n]*`')
+_TAG_LINK = re.compile(r'<a href="/tags/[^"]*" class="tag">(#[^<]*)</a>')
+
+WRITEUP = '''# {name} - Write-Up
+
+**Date:** 13/03/2025
+**Challenge Category:** #Web-Security
+Platform: #picoCTF
+**Difficulty:** #Easy
+**Status:** #Solved
+
+---
+## Problem Description
+
+*Who doesn't love cookies?
+Try to figure out the best one. [http://mercury.picoctf.net:27177/](http://mercury.picoctf.net:27177/)*
+
+- **Target:** http://mercury.picoctf.net:27177/
+- **Goal:** extract a flag
+---
+
+## Tools Used
+
+* Cookie-Editor Extension
+* Burp Suite
+
+---
+
+## Solution Steps
+
+1. **Inspecting the page**
+   if search with the placeholder `snickerdoodle` we get this response ![[Pasted image 20250313080345.png]]
+   let's see the cookie editor extension ![[Pasted image 20250313080434.png]]
+
+2. **How to get the cookie value of the flag**
+   let's see the request passed ![[Pasted image 20250313080826.png]]
+   So I can brute force the cookie value until `picoCTF{` shows up
+
+```python
+for i in range(1, 29):
+    cookies = {"name": str(i)}
+    response = requests.get(url, cookies=cookies)
+```
+
+### Flag
+
+`picoCTF{{name}_flag}`
+
+---
+'''
+
+
+def make_vault(kib):
+    """Concatenate writeups until the document reaches `kib` KiB."""
+    parts = []
+    size = 0
+    i = 0
+    while size < kib * 1024:
+        part = WRITEUP.replace("{name}", f"challenge_{i}")
+        parts.append(part)
+        size += len(part)
+        i += 1
+    return ''.join(parts)
+
+
+def best_of(funcs, text, repeat):
+    """Best wall time of each function; runs alternate so both see the same machine load."""
+    best = [float('inf')] * len(funcs)
+    for _ in range(repeat):
+        for i, func in enumerate(funcs):
+            start = time.perf_counter()
+            func(text, 'vault.md')
+            best[i] = min(best[i], time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the markdown converter')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[16, 256, 1024, 4096],
+                        help='Document sizes in KiB (default: 16 256 1024 4096)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per size, best is reported')
+    parser.add_argument('--min-speedup', type=float, default=0.9,
+                        help='Fail when any size is slower than this against legacy (default: 0.9)')
+    args = parser.parse_args()
+
+    print(f'{"size":>8}  {"legacy":>10}  {"tokenizer":>10}  {"speedup":>7}')
+    slow = []
+    for kib in args.sizes:
+        text = make_vault(kib)
+        check = _CODE_SPAN.sub('', _FENCED.sub('', text))
+        html = _TAG_LINK.sub(r'\1', ch.convert_markdown_to_html(check, 'vault.md'))
+        if html != legacy_ch.convert_markdown_to_html(check, 'vault.md'):
+            sys.exit(f'output differs from the legacy converter at {kib} KiB')
+        old, new = best_of([legacy_ch.convert_markdown_to_html, ch.convert_markdown_to_html], text, args.repeat)
+        print(f'{kib:>6}KB  {old * 1000:>8.1f}ms  {new * 1000:>8.1f}ms  {old / new:>6.2f}x')
+        if old / new < args.min_speedup:
+            slow.append(f'{kib} KiB at {old / new:.2f}x')
+    if slow:
+        sys.exit(f'below the {args.min_speedup:.2f}x floor: {", ".join(slow)}')
+
+
+if __name__ == '__main__':
+    main()
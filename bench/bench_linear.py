@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Check that list handling stays linear on pathological input.
+
+The old converter found lists with nested lazy DOTALL regexes; lists
+are now a line state machine with nesting capped at a fixed depth, so
+time should grow linearly however the lines are arranged.  This doubles
+the size of inputs built from long indented and whitespace-only runs,
+deep nesting and unclosed markers, and reports how conversion time grows from the
+smallest to the largest size; a growth exponent near 1 is linear, 2
+quadratic.
+
+    python bench/bench_linear.py
+    python bench/bench_linear.py --lines 2000 64000 --legacy
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(HERE, '..', 'blogs'), HERE]
+
+import ch  # noqa: E402
+import legacy_ch  # noqa: E402
+
+# Each case builds a document of roughly n lines
+CASES = {
+    'indented run': lambda n: '* item\n' + '   continuation line\n' * n,
+    'whitespace run': lambda n: '* item\n' + '    \n' * n + 'end\n',
+    'blank then indented': lambda n: '1. step\n' + '\n   another paragraph\n' * (n // 2),
+    'many items': lambda n: '* bullet\n1. number\n' * (n // 2),
+    'nested staircase': lambda n: ''.join('  ' * (i % 12) + '* level\n' for i in range(n)),
+    'nested wide': lambda n: '* top\n' + '  * child\n    text\n' * (n // 2),
+    'unclosed emphasis items': lambda n: '* *a **b `c\n' * n,
+}
+
+# Above this a case counts as worse than linear
+LIMIT = 1.3
+
+
+def best_time(func, text, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def growth(func, make, sizes, repeat):
+    """Times per size and the exponent k in time ~ size**k across the range.
+
+    Measured end to end rather than per doubling, which one noisy run
+    could skew.
+    """
+    times = [best_time(func, make(n), repeat) for n in sizes]
+    if len(sizes) < 2 or times[0] <= 0:
+        return times, 0.0
+    return times, math.log(times[-1] / times[0], sizes[-1] / sizes[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that list conversion time grows linearly')
+    parser.add_argument('--lines', type=int, nargs=2, default=[4000, 64000], metavar=('MIN', 'MAX'),
+                        help='Smallest and largest input in lines, doubling in between (default: 4000 64000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per size, best is kept')
+    parser.add_argument('--legacy', action='store_true',
+                        help='Also time the old regex converter (slow: it is capped at 8000 lines)')
+    args = parser.parse_args()
+
+    sizes = []
+    n = args.lines[0]
+    while n <= args.lines[1]:
+        sizes.append(n)
+        n *= 2
+
+    converters = [('tokenizer', ch.convert_markdown_to_html, sizes)]
+    if args.legacy:
+        converters.append(('legacy', legacy_ch.convert_markdown_to_html, [s for s in sizes if s <= 8000]
+                           or sizes[:1]))
+
+    worst = 0.0
+    print(f'{"case":<24} {"converter":<10} ' + ' '.join(f'{n:>9}' for n in sizes) + '  exponent')
+    for case, make in CASES.items():
+        for name, func, case_sizes in converters:
+            times, exponent = growth(func, make, case_sizes, args.repeat)
+            cells = ' '.join(f'{t * 1000:>7.1f}ms' for t in times)
+            print(f'{case:<24} {name:<10} {cells}  {exponent:>6.2f}')
+            if name == 'tokenizer':
+                worst = max(worst, exponent)
+    if worst > LIMIT:
+        print(f'growth exponent {worst:.2f} is above {LIMIT}: some case is worse than linear', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Time the search index at site sizes the real site is far from.
+
+    python bench/bench_search.py                  # 10,000 pages
+    python bench/bench_search.py --pages 2000 --words 400
+
+Pages are drawn from a Zipf-distributed vocabulary, which is how words
+in prose are spread, so a few posting lists are very long and most are
+short.  The index is built from scratch, then updated for one page
+with a few words changed, one rewritten, one added and one deleted, each time reporting the seconds taken
+and the files rewritten.  Tokenizing is timed separately on a parsed
+writeup, since a build does it once per converted page.  Last come the
+index size, raw and gzipped, and what a two-word search downloads.
+"""
+import argparse
+import bisect
+import itertools
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(HERE, '..', 'blogs'), HERE]
+
+import ch  # noqa: E402
+import ch_search  # noqa: E402
+from bench_convert import WRITEUP  # noqa: E402
+
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+
+def vocabulary(size, rng):
+    """`size` distinct made-up words, 2 to 10 letters."""
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(LETTERS) for _ in range(rng.randint(2, 10))))
+    return sorted(words)
+
+
+class Pages:
+    """Makes synthetic {word: weight} pages; rank r is drawn with weight 1/r."""
+
+    def __init__(self, vocabulary_size, words_per_page, seed=0):
+        self.rng = random.Random(seed)
+        self.words = vocabulary(vocabulary_size, self.rng)
+        self.rng.shuffle(self.words)
+        self.cumulative = list(itertools.accumulate(1 / rank for rank in range(1, vocabulary_size + 1)))
+        self.words_per_page = words_per_page
+
+    def _word(self):
+        return self.words[bisect.bisect(self.cumulative, self.rng.random() * self.cumulative[-1])]
+
+    def make(self, n):
+        terms = {}
+        for _ in range(self.words_per_page):
+            word = self._word()
+            terms[word] = terms.get(word, 0) + 1
+        title = ' '.join(self._word() for _ in range(3))
+        for word in title.split():
+            terms[word] = terms.get(word, 0) + ch_search.TITLE_WEIGHT
+        terms = {word: min(weight, ch_search.MAX_WEIGHT) for word, weight in terms.items()}
+        return f'ctf/page{n}.md', (f'ctf/page{n}.html', title, terms)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def index_size(directory):
+    raw = compressed = largest = shards = 0
+    for name in os.listdir(directory):
+        size = os.path.getsize(os.path.join(directory, name))
+        if name.endswith('.gz'):
+            compressed += size
+            continue
+        raw += size
+        if name.endswith('.bin'):
+            shards += 1
+            largest = max(largest, size)
+    return raw, compressed, largest, shards
+
+
+def query_bytes(directory, words, rng, queries=200):
+    """Mean bytes a two-word search fetches: index.json, both shards and one docs block."""
+    base = os.path.getsize(os.path.join(directory, 'index.json')) + os.path.getsize(os.path.join(directory, 'docs-0.json'))
+    total = 0
+    for _ in range(queries):
+        total += base
+        for word in rng.sample(words, 2):
+            path = os.path.join(directory, ch_search.shard_name(ch_search.shard_key(word)))
+            if os.path.exists(path):
+                total += os.path.getsize(path)
+    return total / queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark building and updating the search index')
+    parser.add_argument('--pages', type=int, default=10000, help='Pages in the index (default: 10000)')
+    parser.add_argument('--words', type=int, default=600, help='Words drawn per page (default: 600)')
+    parser.add_argument('--vocabulary', type=int, default=50000, help='Distinct words (default: 50000)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    sections = ch.parse_markdown(WRITEUP.replace('{name}', 'Search'))
+    seconds, terms = timed(lambda: [ch_search.page_terms(sections, 'Search') for _ in range(100)])
+    print(f'tokenize writeup   {seconds * 10:>8.2f} ms/page  ({len(terms[0])} words)')
+
+    source = Pages(args.vocabulary, args.words, args.seed)
+    changed = dict(source.make(n) for n in range(args.pages))
+    work = tempfile.mkdtemp(prefix='ch-search-bench-')
+    try:
+        seconds, written = timed(lambda: ch_search.update_search(work, changed, changed))
+        print(f'full index         {seconds:>8.2f} s   {args.pages / seconds:>8.0f} pages/s  {written} files')
+
+        pages = dict.fromkeys(changed)
+        rel = 'ctf/page1.md'
+        url, title, terms = changed[rel]
+        terms = dict(terms)
+        for word in sorted(terms)[:3]:
+            terms[word] = terms[word] % ch_search.MAX_WEIGHT + 1
+        touched_up = {rel: (url, title, terms)}
+        seconds, written = timed(lambda: ch_search.update_search(work, pages, touched_up))
+        print(f'edit three words   {seconds * 1000:>8.1f} ms  {written} files rewritten')
+
+        edited = dict([source.make(0)])
+        seconds, written = timed(lambda: ch_search.update_search(work, pages, edited))
+        print(f'rewrite one page   {seconds * 1000:>8.1f} ms  {written} files rewritten')
+
+        added = dict([source.make(args.pages)])
+        pages.update(added)
+        seconds, written = timed(lambda: ch_search.update_search(work, pages, added))
+        print(f'add one page       {seconds * 1000:>8.1f} ms  {written} files rewritten')
+
+        del pages[f'ctf/page{args.pages // 2}.md']
+        seconds, written = timed(lambda: ch_search.update_search(work, pages, {}))
+        print(f'delete one page    {seconds * 1000:>8.1f} ms  {written} files rewritten')
+
+        seconds, written = timed(lambda: ch_search.update_search(work, pages, {}))
+        print(f'no change          {seconds * 1000:>8.1f} ms  {written} files rewritten')
+
+        directory = os.path.join(work, ch_search.SEARCH_DIR)
+        raw, compressed, largest, shards = index_size(directory)
+        print(f'index              {raw / 1e6:>8.2f} MB in {shards} shards, {compressed / 1e6:.2f} MB as .gz, '
+              f'largest shard {largest / 1e3:.0f} KB')
+        mean = query_bytes(directory, source.words[:1000], random.Random(args.seed))
+        print(f'two-word search    {mean / 1e3:>8.1f} KB fetched on average (common words)')
+    finally:
+        shutil.rmtree(work)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Throughput benchmarks compared against a stored baseline.
+
+    python bench/bench_suite.py             # run, compare with bench/baseline.json
+    python bench/bench_suite.py --save      # run, store the results as the new baseline
+    python bench/bench_suite.py --quick     # skip the larger sizes, fewer runs
+
+Times convert_markdown_to_html in MB/s on every vault_gen shape at a few
+sizes plus a 1 MB monster, then `ch.py build` over a generated vault in
+pages/s, both cold and as a no-op rebuild.  Any figure more than
+--tolerance below the baseline is flagged and makes the exit status 1.
+Baselines only mean something on the machine that recorded them, so
+re-record one with --save before comparing on a new machine.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(HERE, '..', 'blogs'), HERE]
+
+import ch  # noqa: E402
+import ch_build  # noqa: E402
+import vault_gen  # noqa: E402
+
+BASELINE = os.path.join(HERE, 'baseline.json')
+
+
+def best_time(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_convert(sizes, repeat):
+    """{case: MB/s} for every shape and size, plus the 1 MB monster."""
+    cases = [(shape, kib) for shape in vault_gen.SHAPES for kib in sizes] + [('monster', 1024)]
+    results = {}
+    for shape, kib in cases:
+        text = vault_gen.make_page(shape, kib)
+        seconds = best_time(lambda: ch.convert_markdown_to_html(text, f'{shape}.md'), repeat)
+        results[f'convert {shape} {kib}KiB MB/s'] = len(text.encode('utf-8')) / seconds / 1e6
+    return results
+
+
+def bench_build(pages, kib, repeat, jobs):
+    """{case: rate} for a cold build and a no-op rebuild of a generated vault."""
+    work = tempfile.mkdtemp(prefix='ch-bench-')
+    try:
+        src = os.path.join(work, 'src')
+        out = os.path.join(work, 'out')
+        paths = vault_gen.make_vault(src, pages, kib)
+        size = sum(os.path.getsize(path) for path in paths)
+        cold = best_time(lambda: ch_build.build(src, out, jobs=jobs, force=True), repeat)
+        noop = best_time(lambda: ch_build.build(src, out, jobs=jobs), repeat)
+    finally:
+        shutil.rmtree(work)
+    return {
+        f'build cold {pages}x{kib}KiB pages/s': pages / cold,
+        f'build cold {pages}x{kib}KiB MB/s': size / cold / 1e6,
+        f'build no-op {pages}x{kib}KiB pages/s': pages / noop,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print each figure next to its baseline; returns the number of regressions."""
+    slower = 0
+    width = max(map(len, results))
+    for case, value in results.items():
+        base = baseline.get(case)
+        if base is None:
+            print(f'{case:<{width}}  {value:>10.1f}')
+            continue
+        ratio = value / base
+        flag = ''
+        if ratio < 1 - tolerance:
+            flag = '  SLOWER'
+            slower += 1
+        print(f'{case:<{width}}  {value:>10.1f}  baseline {base:>10.1f}  {ratio:>6.2f}x{flag}')
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the converter against a stored baseline')
+    parser.add_argument('--baseline', default=BASELINE, help='Baseline file (default: bench/baseline.json)')
+    parser.add_argument('--save', action='store_true', help='Store these results as the baseline')
+    parser.add_argument('--quick', action='store_true', help='Skip the larger sizes and run fewer times')
+    parser.add_argument('--repeat', type=int, default=None, help='Runs per case, best is kept (default: 5, 2 with --quick)')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Fraction below the baseline that counts as a slowdown (default: 0.25)')
+    parser.add_argument('--jobs', type=int, default=1, help='Worker processes for the build (default: 1)')
+    args = parser.parse_args()
+
+    repeat = args.repeat or (2 if args.quick else 5)
+    sizes = [16] if args.quick else [16, 256]
+
+    results = bench_convert(sizes, repeat)
+    results.update(bench_build(200, 4, repeat, args.jobs))
+
+    if args.save:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'results': {case: round(value, 2) for case, value in results.items()},
+            }, f, indent=1)
+            f.write('\n')
+        compare(results, {}, args.tolerance)
+        print(f'baseline saved to {args.baseline}')
+        return 0
+
+    try:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    except (OSError, ValueError, KeyError):
+        baseline = {}
+        print(f'no usable baseline in {args.baseline}; run with --save to record one', file=sys.stderr)
+    slower = compare(results, baseline, args.tolerance)
+    if slower:
+        print(f'{slower} figure(s) more than {args.tolerance:.0%} below the baseline', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
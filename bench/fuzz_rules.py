@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""Look for inputs that make a converter rule slower than linear.
+
+Markdown pasted from CTF challenge pages can be hostile, so every rule
+is run on generated input built from the characters the rules react to:
+runs of unmatched `*`, `_`, backticks, brackets, embeds, header tags,
+#tags and list markers.  Each input is a short unit repeated k times; the
+rule is timed at two sizes and the growth exponent k in time ~ size**k
+is reported.  Anything above --limit is a finding, and so is any input
+that overruns its time budget: each input runs in a worker process
+that is killed when it takes longer than --budget seconds per timed run.
+
+Findings are kept as regression cases in bench/fuzz_corpus/, one file
+per input named after its rule, and the corpus is checked first on
+every run.
+
+    python bench/fuzz_rules.py                    # corpus, then 200 random inputs per rule
+    python bench/fuzz_rules.py --cases 2000 --seed 7 --save
+    python bench/fuzz_rules.py --corpus-only
+"""
+import argparse
+import hashlib
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(HERE, '..', 'blogs'), HERE]
+
+import ch  # noqa: E402
+
+CORPUS = os.path.join(HERE, 'fuzz_corpus')
+
+ATOMS = ('*', '**', '_', '__', '`', '```', '[', ']', '(', ')', '](', '[a](', '![', '![a](',
+         '![[', ']]', '<', '>', '<h1>', '</h1>', '<h2>x', '# ', '## ', '* ', '1. ', '---',
+         ' ', '  ', '\t', 'a', 'word ', ':', '**Date:** ', '\n', '\n\n', '\n   ', '#', '#a ', '#a/', '<code>',
+         '</code>', '<a ', '</a>')
+
+
+def _inline(rule):
+    # Rules that see one line at a time get the input with newlines removed
+    def run(text):
+        return rule(text.replace('\n', ' '))
+    return run
+
+
+def _fresh_fences(line):
+    fences = ch._FenceState()
+    fences.remaining = line.count('```')
+    return ch._protect_code(line, fences)
+
+
+def _inline_line(line):
+    fences = ch._FenceState()
+    fences.remaining = line.count('```')
+    return ch._render_inline(line, fences)
+
+
+# The converter's rules, private ones included, each as text -> anything.
+# The names double as corpus file name prefixes.
+RULES = {
+    'asterisks': _inline(lambda line: ch._render_emphasis(line, '*')),
+    'underscores': _inline(lambda line: ch._render_emphasis(line, '_')),
+    'code': _inline(_fresh_fences),
+    'code_blocks': lambda text: list(ch._code_blocks(text.split('\n'))),
+    'links': _inline(ch._render_links),
+    'embeds': _inline(ch._render_embeds),
+    'image_links': _inline(ch._render_image_links),
+    'inline': _inline(_inline_line),
+    'tags': ch.strip_tags,
+    'hashtags': _inline(ch._split_tags),
+    'section_ids': _inline(ch._section_id),
+    'document': ch.parse_markdown,
+    'metadata': lambda text: ch.extract_metadata(ch.parse_markdown(text)),
+    'page': lambda text: ch.convert_markdown_to_html(text, 'fuzz.md'),
+}
+
+
+def random_unit(rng):
+    return ''.join(rng.choice(ATOMS) for _ in range(rng.randint(1, 12)))
+
+
+def scaled(unit, size):
+    return unit * max(1, size // len(unit))
+
+
+def best_time(rule, text, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rule(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def exponent(rule, unit, small, large):
+    """(growth exponent, time at the large size) for one unit."""
+    a = best_time(rule, scaled(unit, small))
+    b = best_time(rule, scaled(unit, large))
+    # Below 10 ms the clock says more about the machine than the rule; a
+    # quadratic rule is far slower than that at the larger size
+    if b < 1e-2:
+        return 0.0, b
+    return math.log(max(b, 1e-9) / max(a, 1e-9), large / small), b
+
+
+def _worker(conn, cases, small, large, limit):
+    for index, (rule, unit) in enumerate(cases):
+        conn.send(('start', index))
+        growth, seconds = exponent(RULES[rule], unit, small, large)
+        if growth > limit:
+            # One slow run on a busy machine is not a finding; a second
+            # measurement has to agree
+            growth, seconds = min((growth, seconds), exponent(RULES[rule], unit, small, large))
+        conn.send(('done', index, (growth, seconds)))
+    conn.send(('finished',))
+
+
+def run_cases(cases, small, large, limit, budget):
+    """Measure every (rule, unit) case; returns [(rule, unit, exponent, seconds or None)].
+
+    Cases run in a child process.  One that overruns the budget is
+    killed, recorded with seconds None, and the rest carry on in a new
+    child.
+    """
+    results = []
+    start = 0
+    while start < len(cases):
+        parent, child = multiprocessing.Pipe()
+        worker = multiprocessing.Process(target=_worker, args=(child, cases[start:], small, large, limit),
+                                         daemon=True)
+        worker.start()
+        current = None
+        while True:
+            # Each of the up to twelve timed runs of a case gets the budget
+            if not parent.poll(budget * 12):
+                worker.terminate()
+                rule, unit = cases[start + current]
+                results.append((rule, unit, float('inf'), None))
+                start += current + 1
+                break
+            message = parent.recv()
+            if message[0] == 'start':
+                current = message[1]
+            elif message[0] == 'done':
+                growth, seconds = message[2]
+                rule, unit = cases[start + message[1]]
+                results.append((rule, unit, growth, seconds))
+            else:
+                start = len(cases)
+                break
+        worker.join()
+    return results
+
+
+def load_corpus():
+    cases = []
+    if os.path.isdir(CORPUS):
+        for name in sorted(os.listdir(CORPUS)):
+            rule = name.rsplit('-', 1)[0]
+            if rule in RULES:
+                with open(os.path.join(CORPUS, name), encoding='utf-8', newline='') as f:
+                    cases.append((rule, f.read()))
+    return cases
+
+
+def save_case(rule, unit):
+    os.makedirs(CORPUS, exist_ok=True)
+    digest = hashlib.sha256(unit.encode('utf-8')).hexdigest()[:10]
+    path = os.path.join(CORPUS, f'{rule}-{digest}.txt')
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(unit)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fuzz converter rules for worse-than-linear time')
+    parser.add_argument('--cases', type=int, default=200, help='Random inputs per rule (default: 200)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rules', nargs='+', choices=list(RULES), default=list(RULES))
+    parser.add_argument('--size', type=int, default=2000, help='Smaller input size in characters (default: 2000)')
+    parser.add_argument('--scale', type=int, default=16, help='Larger input is this many times bigger (default: 16)')
+    parser.add_argument('--limit', type=float, default=1.5, help='Growth exponent counted as a finding (default: 1.5)')
+    parser.add_argument('--budget', type=float, default=2.0, help='Seconds one run may take (default: 2)')
+    parser.add_argument('--save', action='store_true', help='Add new findings to the regression corpus')
+    parser.add_argument('--corpus-only', action='store_true', help='Only re-check the regression corpus')
+    args = parser.parse_args()
+
+    small, large = args.size, args.size * args.scale
+    corpus = [case for case in load_corpus() if case[0] in args.rules]
+    rng = random.Random(args.seed)
+    generated = [] if args.corpus_only else [(rule, random_unit(rng)) for rule in args.rules for _ in range(args.cases)]
+
+    findings = 0
+    for label, cases in (('corpus', corpus), ('random', generated)):
+        if not cases:
+            continue
+        results = run_cases(cases, small, large, args.limit, args.budget)
+        bad = [r for r in results if r[3] is None or r[2] > args.limit]
+        worst = {}
+        for rule, unit, growth, seconds in results:
+            if growth > worst.get(rule, (-1,))[0]:
+                worst[rule] = (growth, unit)
+        print(f'{label}: {len(results)} input(s), {len(bad)} finding(s)')
+        for rule, (growth, unit) in sorted(worst.items()):
+            print(f'  {rule:<12} worst exponent {growth:>5.2f}  {unit!r:.60}')
+        for rule, unit, growth, seconds in bad:
+            what = 'over budget' if seconds is None else f'exponent {growth:.2f}'
+            print(f'  FINDING {rule}: {what} on {unit!r:.80}', file=sys.stderr)
+            if label == 'random' and args.save:
+                print(f'    saved as {save_case(rule, unit)}', file=sys.stderr)
+        findings += len(bad)
+    return 1 if findings else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Check that converting one file stays cheap to start.
+
+An editor hook runs `python blogs/ch.py IN OUT` once per save, so the
+time is mostly interpreter start-up and imports rather than conversion.
+This runs that command on a writeup under `python -X importtime`,
+compares the modules it imports with a bare `python -c pass`, and fails
+if any module a plain conversion should not need is imported, if the
+extra import time goes over --budget milliseconds, or if the command
+itself, best of --repeat, takes longer than --limit milliseconds.  It
+also prints wall-clock time for a bare python and for `python -m ch`: a
+script named on the command line is compiled on every run, while a
+module run with -m is loaded from its cached bytecode.
+
+html, and re with it, is imported to escape the code on a page, which
+the default --budget allows for.
+
+    python bench/startup_budget.py
+    python bench/startup_budget.py --budget 15 --limit 60 --repeat 20
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from bench_convert import WRITEUP  # noqa: E402
+
+BLOGS = os.path.join(HERE, '..', 'blogs')
+CH = os.path.join(BLOGS, 'ch.py')
+
+# Imported only by the paths that need them: the cache, --profile and
+# options parsed with argparse
+FORBIDDEN = ('argparse', 'hashlib', 'marshal', 'json', 'shutil', 'gettext')
+
+
+def import_times(command):
+    """{module: (cumulative microseconds, nesting)} for every module `command` imports.
+
+    Nesting is 0 for a module imported by the command itself, 1 for one
+    imported by that module, and so on.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', *command],
+                            capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        try:
+            modules[name.strip()] = int(cumulative), (len(name) - len(name.lstrip()) - 1) // 2
+        except ValueError:
+            continue  # the header line
+    return modules
+
+
+def wall_time(command, repeat, cwd=None):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *command], check=True, cwd=cwd)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the import cost of a one-file conversion')
+    parser.add_argument('--budget', type=float, default=20.0,
+                        help='Import milliseconds allowed on top of bare python, as -X importtime measures '
+                             'them (default: 20)')
+    parser.add_argument('--limit', type=float, default=100.0,
+                        help='Milliseconds `ch.py IN OUT` may take from start to finish (default: 100)')
+    parser.add_argument('--repeat', type=int, default=10, help='Wall-clock runs, best is kept (default: 10)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='ch-startup-') as work:
+        source = os.path.join(work, 'writeup.md')
+        with open(source, 'w', encoding='utf-8') as f:
+            f.write(WRITEUP.replace('{name}', 'Startup'))
+        convert = [CH, source, os.path.join(work, 'writeup.html')]
+        bare = ['-c', 'pass']
+
+        base = import_times(bare)
+        extra = {name: us for name, us in import_times(convert).items() if name not in base}
+        # Cumulative times already include what each module imports
+        top = {name: us for name, (us, nesting) in extra.items() if not nesting}
+        extra_ms = sum(top.values()) / 1000
+
+        bare_s = wall_time(bare, args.repeat)
+        convert_s = wall_time(convert, args.repeat)
+        # Once to write the bytecode cache, then timed
+        wall_time(['-m', 'ch', *convert[1:]], 1, BLOGS)
+        module_s = wall_time(['-m', 'ch', *convert[1:]], args.repeat, BLOGS)
+
+    print(f'python -c pass   {bare_s * 1000:>7.1f} ms')
+    print(f'ch.py IN OUT     {convert_s * 1000:>7.1f} ms  (+{(convert_s - bare_s) * 1000:.1f} ms)  '
+          f'limit {args.limit:.1f} ms')
+    print(f'-m ch IN OUT     {module_s * 1000:>7.1f} ms  (+{(module_s - bare_s) * 1000:.1f} ms)')
+    print(f'extra imports    {extra_ms:>7.1f} ms  budget {args.budget:.1f} ms')
+    for name, us in sorted(top.items(), key=lambda item: -item[1]):
+        print(f'  {name:<20} {us / 1000:>6.2f} ms')
+
+    failed = 0
+    for name in FORBIDDEN:
+        if name in extra:
+            print(f'{name} is imported by a plain conversion', file=sys.stderr)
+            failed += 1
+    if extra_ms > args.budget:
+        print(f'extra imports take {extra_ms:.1f} ms, over the {args.budget:.1f} ms budget', file=sys.stderr)
+        failed += 1
+    if convert_s * 1000 > args.limit:
+        print(f'ch.py IN OUT takes {convert_s * 1000:.1f} ms, over the {args.limit:.1f} ms limit', file=sys.stderr)
+        failed += 1
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
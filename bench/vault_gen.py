@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Generate synthetic Obsidian-style writeups for benchmarks.
+
+Each shape stresses a different part of the converter:
+
+    writeup    the picoCTF writeup layout the site is built from
+    headings   many short sections, one heading every few lines
+    fences     long ``` code blocks between short paragraphs
+    lists      bullet and numbered lists with indented continuations
+    images     image-dense steps like Cookies.md, ![[...]] on every line
+    monster    all of the above mixed into one large document
+
+    python bench/vault_gen.py OUT_DIR --pages 200 --kib 8
+"""
+import argparse
+import os
+import random
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from bench_convert import WRITEUP  # noqa: E402
+
+WORDS = ('cookie flag request response header server client script value page admin token '
+         'payload burp proxy inspect source robots hidden input login password hash decode '
+         'base64 javascript html css picoCTF challenge solution step').split()
+
+
+def _sentence(rng, words=(6, 14)):
+    text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(*words)))
+    if rng.random() < 0.3:
+        text += f' `{rng.choice(WORDS)}`'
+    if rng.random() < 0.2:
+        text += f' **{rng.choice(WORDS)}**'
+    if rng.random() < 0.1:
+        text += f' [{rng.choice(WORDS)}](https://example.com/{rng.choice(WORDS)})'
+    return text[0].upper() + text[1:] + '.'
+
+
+def _image(rng):
+    return f'![[Pasted image 2025031{rng.randint(0, 9)}{rng.randint(100000, 999999)}.png]]'
+
+
+def writeup(rng, i):
+    return WRITEUP.replace('{name}', f'challenge_{i}')
+
+
+def headings(rng, i):
+    parts = [f'# Heading-heavy {i}\n']
+    for n in range(rng.randint(8, 16)):
+        parts.append(f'\n{"#" * rng.randint(2, 4)} Part {n} {rng.choice(WORDS)}\n\n{_sentence(rng)}\n')
+    return ''.join(parts)
+
+
+def fences(rng, i):
+    parts = [f'# Fences {i}\n\n{_sentence(rng)}\n']
+    for n in range(rng.randint(2, 4)):
+        code = '\n'.join(f'{"    " * rng.randint(0, 2)}{rng.choice(WORDS)} = "{rng.choice(WORDS)}"  # {n}'
+                         for _ in range(rng.randint(20, 60)))
+        parts.append(f'\n```python\n{code}\n```\n\n{_sentence(rng)}\n')
+    return ''.join(parts)
+
+
+def lists(rng, i):
+    parts = [f'# Lists {i}\n\n## Steps\n\n']
+    for n in range(1, rng.randint(4, 9)):
+        parts.append(f'{n}. **{_sentence(rng, (2, 4))}**\n')
+        for _ in range(rng.randint(1, 4)):
+            parts.append(f'   {_sentence(rng)}\n')
+    parts.append('\n## Tools\n\n')
+    for _ in range(rng.randint(3, 8)):
+        parts.append(f'- {_sentence(rng, (2, 6))}\n')
+        if rng.random() < 0.4:
+            parts.append(f'  {_sentence(rng)}\n')
+    return ''.join(parts) + '\n---\n'
+
+
+def images(rng, i):
+    parts = [f'# Images {i}\n\n**Date:** 13/03/2025\n**Challenge Category:** #Web-Security\n\n## Solution Steps\n\n']
+    for n in range(1, rng.randint(4, 8)):
+        parts.append(f'{n}. **{_sentence(rng, (2, 4))}**\n')
+        for _ in range(rng.randint(2, 4)):
+            parts.append(f'   {_sentence(rng, (4, 8))} {_image(rng)}\n')
+        parts.append('\n')
+    return ''.join(parts)
+
+
+SHAPES = {
+    'writeup': writeup,
+    'headings': headings,
+    'fences': fences,
+    'lists': lists,
+    'images': images,
+}
+
+
+def make_page(shape, kib, seed=0):
+    """A document of the given shape, grown to at least `kib` KiB."""
+    rng = random.Random(f'{shape}:{kib}:{seed}')
+    makers = list(SHAPES.values()) if shape == 'monster' else [SHAPES[shape]]
+    parts = []
+    size = 0
+    i = 0
+    while size < kib * 1024:
+        part = rng.choice(makers)(rng, i)
+        parts.append(part)
+        size += len(part)
+        i += 1
+    return ''.join(parts)
+
+
+def make_vault(out_dir, pages, kib=4, shapes=tuple(SHAPES), seed=0):
+    """Write `pages` markdown files cycling through `shapes`; returns their paths."""
+    paths = []
+    for n in range(pages):
+        shape = shapes[n % len(shapes)]
+        directory = os.path.join(out_dir, shape)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{shape}-{n}.md')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(make_page(shape, kib, seed + n))
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic markdown vault')
+    parser.add_argument('out_dir', help='Directory to write the vault to')
+    parser.add_argument('--pages', type=int, default=200, help='Number of pages (default: 200)')
+    parser.add_argument('--kib', type=int, default=4, help='Approximate size of each page in KiB (default: 4)')
+    parser.add_argument('--shapes', nargs='+', choices=[*SHAPES, 'monster'], default=list(SHAPES),
+                        help='Shapes to cycle through (default: all but monster)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    paths = make_vault(args.out_dir, args.pages, args.kib, args.shapes, args.seed)
+    print(f'{len(paths)} page(s) written to {args.out_dir}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,142 +1,44 @@
 #!/usr/bin/env python3
+# Converting one file from an editor hook is dominated by start-up, so only
+# these are imported up front; html, hashlib, argparse and the rest are
+# imported by the functions that need them, and a plain conversion only
+# reaches html (and with it re), for code.
 import sys
-import re
-import argparse
-import html
 import os
 
-def convert_markdown_to_html(markdown_text,filename=None):
-    html_text = markdown_text
+_MAX_LIST_DEPTH = 8
+_READ_SIZE = 1 << 16
+# Patterns are compiled by _regex() on first use
+_METADATA_LINE = r'(?:<strong>)?([A-Za-z][A-Za-z ]*):(?:</strong>)?\s+(.*)'
+_REGEXES = {}
+_CACHE_VERSION = 6
+# Where a node was in a block split at a header tag (_wrap_sections)
+_NODE_MARK = '\0'
+# Where a code span was in the text the other inline rules see (_CodeSpans)
+_CODE_GAP = '\0'
+# Where a #tag links to, by tag_slug(), from every page: its page in the
+# tags directory at the root of the site, which build and watch write
+# (see ch_tags.py)
+TAG_URL = '/tags/{}.html'
+# tag_slug() by tag name; a vault uses a few tags over and over
+_SLUGS = {}
+# The ASCII characters a #tag is made of
+_TAG_CHARS = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ-_/'
+_COMMANDS = {'build': 'ch_build', 'watch': 'ch_watch', 'serve': 'ch_serve', 'dist': 'ch_dist', 'daemon': 'ch_daemon'}
+_BLOCK_TAGS = ('<h1>', '<h2>', '<h3>', '<h4>', '<h5>', '<h6>', '<ul>', '<ol>', '<pre>', '</ul>', '</ol>', '</pre>', '<hr>')
 
-    if filename:
-        # Remove the file extension and replace hyphens/underscores with spaces
-        title = re.sub(r'\.(md|markdown)$', '', filename)
-        title = re.sub(r'[-_]', ' ', title)
-        title = title.title()  # Capitalize first letter of each word
-    else:
-        title = "Converted Markdown"
-    
-    # Handle headers
-    html_text = re.sub(r'^# (.*?)$', r'<h1>\1</h1>', html_text, flags=re.MULTILINE)
-    html_text = re.sub(r'^## (.*?)$', r'<h2>\1</h2>', html_text, flags=re.MULTILINE)
-    html_text = re.sub(r'^### (.*?)$', r'<h3>\1</h3>', html_text, flags=re.MULTILINE)
-    html_text = re.sub(r'^#### (.*?)$', r'<h4>\1</h4>', html_text, flags=re.MULTILINE)
-    html_text = re.sub(r'^##### (.*?)$', r'<h5>\1</h5>', html_text, flags=re.MULTILINE)
-    html_text = re.sub(r'^###### (.*?)$', r'<h6>\1</h6>', html_text, flags=re.MULTILINE)
-    
-    # Handle bold
-    html_text = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', html_text)
-    html_text = re.sub(r'__(.*?)__', r'<strong>\1</strong>', html_text)
-    
-    # Handle italic
-    html_text = re.sub(r'\*(.*?)\*', r'<em>\1</em>', html_text)
-    html_text = re.sub(r'_(.*?)_', r'<em>\1</em>', html_text)
-    
-    # Handle code blocks
-    html_text = re.sub(r'```(.*?)```', r'<pre><code>\1</code></pre>', html_text, flags=re.DOTALL)
-    
-    # Handle inline code
-    html_text = re.sub(r'`(.*?)`', r'<code>\1</code>', html_text)
-    
-    # Handle links
-    html_text = re.sub(r'\[(.*?)\]\((.*?)\)', r'<a href="\2" class="read-more">\1</a>', html_text)
-    
-    # Handle images - MODIFIED to add <br> tags before and after images
-    html_text = re.sub(r'!\[\[(.*?)\]\]', r'<br><img src="pics/\1" alt="\1"><br>', html_text)
-    html_text = re.sub(r'!\[(.*?)\]\((.*?)\)', r'<br><img src="\2" alt="\1"><br>', html_text)
-    
-    # Handle horizontal rules
-    html_text = re.sub(r'^---$', '<hr>', html_text, flags=re.MULTILINE)
-    
-    # Handle unordered lists - fixed to include indented content
-    def replace_ul(match):
-        content = match.group(0)
-        # Split by list item markers
-        items = re.split(r'(?=^\* )', content, flags=re.MULTILINE)
-        items = [item for item in items if item.strip()]
-        
-        list_html = '<ul>\n'
-        for item in items:
-            # Remove the list marker from the first line
-            item_content = re.sub(r'^\* ', '', item)
-            # Replace newlines within the item with spaces or <br> tags as needed
-            item_content = re.sub(r'\n\s+', ' ', item_content)
-            list_html += f'  <li>{item_content}</li>\n'
-        list_html += '</ul>'
-        return list_html
-    
-    # Find unordered list blocks (bullet points and their content)
-    html_text = re.sub(r'(^\* .*?(?:\n\s+.*?)*)(?:\n(?!\s+)|\Z)', replace_ul, html_text, flags=re.MULTILINE | re.DOTALL)
-    
-    # Handle ordered lists - fixed to include indented content
-    def replace_ol(match):
-        content = match.group(0)
-        # Split by ordered list item markers (e.g., "1. ", "2. ")
-        items = re.split(r'(?=^\d+\. )', content, flags=re.MULTILINE)
-        items = [item for item in items if item.strip()]
-        
-        list_html = '<ol>\n'
-        for item in items:
-            # Remove the list marker from the first line (e.g., "1. ")
-            item_content = re.sub(r'^\d+\. ', '', item)
-            # Preserve paragraph structure within list items but join consecutive lines
-            item_content = re.sub(r'\n\s+', ' ', item_content)
-            list_html += f'  <li>{item_content}</li>\n'
-        list_html += '</ol>'
-        return list_html
-    
-    # Find ordered list blocks (numbered items and their content)
-    html_text = re.sub(r'(^\d+\. .*?(?:\n\s+.*?)*)(?:\n(?!\s+)|\Z)', replace_ol, html_text, flags=re.MULTILINE | re.DOTALL)
-    
-    # Handle paragraphs (must be done last)
-    paragraphs = []
-    in_special_block = False
-    
-    for line in html_text.split('\n'):
-        if line.strip() == '':
-            in_special_block = False
-            paragraphs.append(line)
-            continue
-            
-        if line.startswith(('<h1>', '<h2>', '<h3>', '<h4>', '<h5>', '<h6>', '<ul>', '<ol>', '<pre>', '</ul>', '</ol>', '</pre>', '<hr>')):
-            in_special_block = True
-            paragraphs.append(line)
-            continue
-            
-        if not in_special_block and not line.startswith(('  <li>', '</ul>', '</ol>')):
-            paragraphs.append(f'<p>{line}</p>')
-        else:
-            paragraphs.append(line)
-            
-    html_text = '\n'.join(paragraphs)
-    
-    # Add section divs around headers and their content
-    def add_sections(html_content):
-        # First, split by h1, h2, etc.
-        pattern = r'<h[1-6]>.*?</h[1-6]>'
-        sections = re.split(pattern, html_content)
-        headers = re.findall(pattern, html_content)
-        
-        # Reconstruct with section divs
-        result = []
-        
-        # Add intro content before first header if it exists
-        if sections[0].strip():
-            result.append(f'<div class="section">{sections[0]}</div>')
-        
-        # Combine headers with their respective content
-        for i in range(len(headers)):
-            if i < len(sections) - 1:
-                section_id = re.sub(r'[^a-zA-Z0-9]', '-', re.sub(r'<.*?>', '', headers[i]).lower())
-                result.append(f'<div class="section" id="{section_id}">{headers[i]}{sections[i+1]}</div>')
-        
-        return ''.join(result)
-    
-    html_text = add_sections(html_text)
-    
-    
-    # Create the complete HTML document
-    html_document = f'''<!DOCTYPE html>
+
+class _SlugTable(dict):
+    """str.translate table for ids: letters and digits stay, all else becomes -."""
+
+    def __missing__(self, code):
+        self[code] = code if code < 128 and chr(code).isalnum() else '-'
+        return self[code]
+
+
+_SLUG = _SlugTable()
+
+_PAGE_HEAD = '''<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
@@ -153,7 +55,8 @@ def convert_markdown_to_html(markdown_text,filename=None):
         </ul>
     </nav>
     <div class="container">
-{html_text}
+'''
+_PAGE_FOOT = '''
 <div class="section">
             <a href="/blogs/picoCTF/picoCTF.html" class="read-more">← Back to All Challenges</a>
         </div>
@@ -163,47 +66,2127 @@ def convert_markdown_to_html(markdown_text,filename=None):
     </div>
 </body>
 </html>'''
-    
-    return html_document
 
-def main():
-    parser = argparse.ArgumentParser(description='Convert Markdown to HTML with custom styling')
-    parser.add_argument('input_file', nargs='?', type=argparse.FileType('r', encoding='utf-8'), default=sys.stdin,
-                        help='Input Markdown file (default: stdin)')
-    parser.add_argument('output_file', nargs='?', type=argparse.FileType('w', encoding='utf-8'), default=sys.stdout,
-                        help='Output HTML file (default: stdout)')
-    parser.add_argument('--add-nav', action='store_true', help='Add navigation menu')
-    
-    args = parser.parse_args()
-    
-    markdown_text = args.input_file.read()
-    
-    # Get the filename if available
-    filename = None
-    if hasattr(args.input_file, 'name') and args.input_file.name != '<stdin>':
-        filename = os.path.basename(args.input_file.name)
-    
-    html_output = convert_markdown_to_html(markdown_text, filename)
-    
-    # Optional: Add navigation if requested
-    if args.add_nav:
-        # Extract headers to build navigation
-        headers = re.findall(r'<h[1-6]>(.*?)</h[1-6]>', html_output)
-        nav_items = []
-        for header in headers:
-            header_id = re.sub(r'[^a-zA-Z0-9]', '-', header.lower())
-            nav_items.append(f'<li><a href="#{header_id}">{header}</a></li>')
-        
-        nav_html = f'''<nav>
+
+# The parsed form of a page.  Inline content is a string of finished HTML or,
+# when it holds links, images or tags, a list of parts: strings alternating
+# with Link, Image and Tag nodes (or, in list items, nested List nodes),
+# starting and ending with a string.  Block nodes that
+# share their last output line with whatever follows them have `glued` set.
+
+class Section:
+    """A header and everything up to the next one; `heading` is None for the intro."""
+    __slots__ = ('heading', 'children')
+
+    def __init__(self, heading, children):
+        self.heading = heading
+        self.children = children
+
+
+class Heading:
+    __slots__ = ('level', 'children', 'id', 'closing', 'glued')
+
+    def __init__(self, level, children, id=None, closing=None, glued=False):
+        self.level = level
+        self.children = children
+        self.id = id
+        # Header tags typed as raw HTML need not close at the level they open
+        self.closing = level if closing is None else closing
+        self.glued = glued
+
+
+class Paragraph:
+    __slots__ = ('children',)
+    glued = False
+
+    def __init__(self, children):
+        self.children = children
+
+
+class Text:
+    """A line passed through without a paragraph around it."""
+    __slots__ = ('children', 'glued')
+
+    def __init__(self, children, glued=False):
+        self.children = children
+        self.glued = glued
+
+
+class Rule:
+    __slots__ = ()
+    glued = False
+
+
+class List:
+    """A <ul> or <ol> block; each item is inline content, nested Lists included."""
+    __slots__ = ('ordered', 'items', 'glued')
+
+    def __init__(self, ordered, items, glued=False):
+        self.ordered = ordered
+        self.items = items
+        self.glued = glued
+
+
+class Code:
+    """A fenced code block; `text` is exactly as typed, less the fence's indentation, `indent`."""
+    __slots__ = ('lang', 'text', 'indent')
+    glued = False
+
+    def __init__(self, lang, text, indent=0):
+        self.lang = lang
+        self.text = text
+        self.indent = indent
+
+
+class Link:
+    __slots__ = ('href', 'children')
+
+    def __init__(self, href, children):
+        self.href = href
+        self.children = children
+
+
+class Image:
+    __slots__ = ('src', 'alt')
+
+    def __init__(self, src, alt):
+        self.src = src
+        self.alt = alt
+
+
+class Tag:
+    """An Obsidian #tag, as typed less the #; it links to its page under TAG_URL."""
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+
+class _FenceState:
+    """Tracks ``` markers across lines.
+
+    Markers pair up in document order; when their total is odd the last
+    one has no partner and is left as three plain backticks.  `remaining`
+    is how many more markers may still be turned into tags.
+    """
+
+    def __init__(self):
+        self.remaining = 0
+        self.open = False
+
+
+def _regex(pattern):
+    compiled = _REGEXES.get(pattern)
+    if compiled is None:
+        import re
+        compiled = _REGEXES[pattern] = re.compile(pattern)
+    return compiled
+
+
+def _split_runs(line, char):
+    """Split `line` into text segments and the lengths of the `char` runs between them."""
+    pieces = line.split(char)
+    segments = [pieces[0]]
+    runs = []
+    run = 1
+    for index in range(1, len(pieces) - 1):
+        piece = pieces[index]
+        if piece:
+            runs.append(run)
+            segments.append(piece)
+            run = 1
+        else:
+            run += 1
+    runs.append(run)
+    segments.append(pieces[-1])
+    return segments, runs
+
+
+def _interleave(segments, tags):
+    out = [None] * (len(segments) + len(tags))
+    out[::2] = segments
+    out[1::2] = tags
+    return ''.join(out)
+
+
+def _alternate(count, opening, closing, literal):
+    # Delimiters pair left to right; an odd one out stays as typed
+    tags = [opening, closing] * (count // 2)
+    if count % 2:
+        tags.append(literal)
+    return tags
+
+
+def _render_emphasis(line, char):
+    """Turn `**`/`__` pairs into <strong> and the leftover singles into <em>.
+
+    Doubles are taken from the left of each run and pair in order; an
+    unpaired last double counts as two singles, and an unpaired last
+    single stays as typed.
+    """
+    double = char * 2
+    doubles = line.count(double)
+    if not doubles:
+        pieces = line.split(char)
+        return _interleave(pieces, _alternate(len(pieces) - 1, '<em>', '</em>', char))
+    if doubles % 2 == 0 and line.count(char) == doubles * 2:
+        pieces = line.split(double)
+        return _interleave(pieces, _alternate(doubles, '<strong>', '</strong>', double))
+
+    segments, runs = _split_runs(line, char)
+    return _interleave(segments, _emphasis_tags(runs, char))
+
+
+def _emphasis_tags(runs, char):
+    # What each run of `char` becomes, by _render_emphasis's rules
+    doubles = singles = 0
+    for run in runs:
+        doubles += run // 2
+        singles += run % 2
+    if doubles % 2:
+        singles += 2
+    unpaired_double = doubles - 1 if doubles % 2 else -1
+    unpaired_single = singles - 1 if singles % 2 else -1
+    tags = []
+    d = s = 0
+    for run in runs:
+        out = []
+        for _ in range(run // 2):
+            if d == unpaired_double:
+                for _ in range(2):
+                    out.append(char if s == unpaired_single else ('</em>' if s % 2 else '<em>'))
+                    s += 1
+            else:
+                out.append('</strong>' if d % 2 else '<strong>')
+            d += 1
+        if run % 2:
+            out.append(char if s == unpaired_single else ('</em>' if s % 2 else '<em>'))
+            s += 1
+        tags.append(''.join(out))
+    return tags
+
+
+def _render_emphasis_around(pieces, char):
+    """_render_emphasis over the text between code spans, pairing across them.
+
+    No run of `char` reaches over a span, so the runs of all the pieces
+    pair up as the runs of one line would.
+    """
+    splits = [_split_runs(piece, char) if char in piece else ([piece], []) for piece in pieces]
+    tags = _emphasis_tags([run for segments, runs in splits for run in runs], char)
+    out = []
+    taken = 0
+    for segments, runs in splits:
+        out.append(_interleave(segments, tags[taken:taken + len(runs)]))
+        taken += len(runs)
+    return out
+
+
+def _code_markers(line, fences):
+    """Split `line` at its backticks into text segments and the tags each backtick run becomes.
+
+    ``` markers are taken from the left of each run while the document
+    still has paired markers left; the remaining backticks pair up on
+    the line as inline code.  Each run's tags come as a list.
+    """
+    if not fences.remaining or '```' not in line:
+        pieces = line.split('`')
+        return pieces, [[tag] for tag in _alternate(len(pieces) - 1, '<code>', '</code>', '`')]
+
+    segments, runs = _split_runs(line, '`')
+    rendered = []
+    singles = 0
+    for run in runs:
+        markers = []
+        while run >= 3 and fences.remaining:
+            markers.append('</code></pre>' if fences.open else '<pre><code>')
+            fences.open = not fences.open
+            fences.remaining -= 1
+            run -= 3
+        rendered.append((markers, run))
+        singles += run
+    unpaired = singles - 1 if singles % 2 else -1
+    tags = []
+    s = 0
+    for markers, run in rendered:
+        for _ in range(run):
+            markers.append('`' if s == unpaired else ('</code>' if s % 2 else '<code>'))
+            s += 1
+        tags.append(markers)
+    return segments, tags
+
+
+def _protect_code(line, fences):
+    """Take the code out of `line` before the other inline rules see it.
+
+    Returns the text around the code, as pieces, and the HTML of every
+    stretch of code between them, from the backtick that opens it to the
+    one that closes it, its text escaped.  A line that starts inside a
+    block opened by a ``` earlier on is code up to the marker that
+    closes it.
+    """
+    import html
+    if not fences.open and (not fences.remaining or '```' not in line):
+        # Only code spans: every other piece between backticks is code
+        pieces = line.split('`')
+        count = len(pieces) - 1
+        spans = [f'<code>{html.escape(piece, False)}</code>' for piece in pieces[1:count - count % 2:2]]
+        outside = pieces[::2]
+        if count % 2:
+            outside[-1] += '`' + pieces[-1]
+        return outside, spans
+    depth = 1 if fences.open else 0
+    segments, tags = _code_markers(line, fences)
+    outside = [''] if depth else []
+    text = []
+    spans = []
+    span = []
+    for index, segment in enumerate(segments):
+        if depth:
+            span.append(html.escape(segment, False))
+        else:
+            text.append(segment)
+        if index == len(tags):
+            break
+        for tag in tags[index]:
+            if tag == '`':
+                (span if depth else text).append(tag)
+                continue
+            if not depth:
+                outside.append(''.join(text))
+                text = []
+            span.append(tag)
+            depth += -1 if tag[:2] == '</' else 1
+            if not depth:
+                spans.append(''.join(span))
+                span = []
+    if span:
+        spans.append(''.join(span))
+    outside.append(''.join(text))
+    return outside, spans
+
+
+class _CodeSpans:
+    """The code taken out of a line, by where it stood.
+
+    `text` is the text around the code with one _CODE_GAP where each span
+    was, which no inline rule matches, ends a #tag on or starts one after.
+    The offsets of those gaps are kept, so the same character in the
+    source is left alone.  fill() puts the spans back into the inline
+    content made from `text`.
+    """
+    __slots__ = ('text', 'spans', 'offsets', '_pos', '_next')
+
+    def __init__(self, pieces, spans):
+        self.text = _CODE_GAP.join(pieces)
+        self.spans = spans
+        self.offsets = []
+        offset = -1
+        for piece in pieces[:-1]:
+            offset += len(piece) + 1
+            self.offsets.append(offset)
+
+    def fill(self, content):
+        self._pos = self._next = 0
+        return self._fill_parts(content)
+
+    def _fill_parts(self, content):
+        # Walks content in source order, keeping count of the characters of
+        # `text` each part was made from
+        if content.__class__ is str:
+            return self._fill_text(content)
+        out = []
+        for part in content:
+            cls = part.__class__
+            if cls is str:
+                part = self._fill_text(part)
+            elif cls is Link:
+                # [text](href)
+                self._pos += 1
+                part.children = self._fill_parts(part.children)
+                self._pos += 2
+                part.href = self._fill_text(part.href)
+                self._pos += 1
+            elif cls is Image:
+                # ![[name]]: the name is both its alt and the end of its src
+                self._pos += 3
+                alt = self._fill_text(part.alt)
+                part.src = part.src[:len(part.src) - len(part.alt)] + alt
+                part.alt = alt
+                self._pos += 2
+            else:
+                self._pos += 1 + len(part.name)
+            out.append(part)
+        return out
+
+    def _fill_text(self, text):
+        start = self._pos
+        end = self._pos = start + len(text)
+        offsets = self.offsets
+        index = self._next
+        if index == len(offsets) or offsets[index] >= end:
+            return text
+        out = []
+        last = 0
+        while index < len(offsets) and offsets[index] < end:
+            cut = offsets[index] - start
+            out.append(text[last:cut])
+            out.append(self.spans[index])
+            last = cut + 1
+            index += 1
+        out.append(text[last:])
+        self._next = index
+        return ''.join(out)
+
+
+def _render_links(line):
+    # Links: [text](href)
+    out = []
+    start = 0
+    i = line.find('[')
+    while i >= 0:
+        j = line.find('](', i + 1)
+        if j < 0:
+            break
+        k = line.find(')', j + 2)
+        if k < 0:
+            break
+        out.append(f'{line[start:i]}<a href="{line[j + 2:k]}" class="read-more">{line[i + 1:j]}</a>')
+        start = k + 1
+        i = line.find('[', start)
+    if not out:
+        return line
+    out.append(line[start:])
+    return ''.join(out)
+
+
+def _render_embeds(line):
+    # Obsidian image embeds: ![[file]]
+    out = []
+    start = 0
+    i = line.find('![[')
+    while i >= 0:
+        j = line.find(']]', i + 3)
+        if j < 0:
+            break
+        name = line[i + 3:j]
+        out.append(f'{line[start:i]}<br><img src="pics/{name}" alt="{name}"><br>')
+        start = j + 2
+        i = line.find('![[', start)
+    if not out:
+        return line
+    out.append(line[start:])
+    return ''.join(out)
+
+
+def _split_links(line):
+    parts = []
+    start = 0
+    i = line.find('[')
+    while i >= 0:
+        j = line.find('](', i + 1)
+        if j < 0:
+            break
+        k = line.find(')', j + 2)
+        if k < 0:
+            break
+        parts.append(line[start:i])
+        parts.append(Link(line[j + 2:k], line[i + 1:j]))
+        start = k + 1
+        i = line.find('[', start)
+    parts.append(line[start:])
+    return parts
+
+
+def _split_embeds(text):
+    # None when an embed is left open; its ]] may lie past a link edge
+    parts = []
+    start = 0
+    i = text.find('![[')
+    while i >= 0:
+        j = text.find(']]', i + 3)
+        if j < 0:
+            return None
+        name = text[i + 3:j]
+        parts.append(text[start:i])
+        parts.append(Image(f'pics/{name}', name))
+        start = j + 2
+        i = text.find('![[', start)
+    parts.append(text[start:])
+    return parts
+
+
+def tag_slug(name):
+    """The name of a tag's page: lowercased, with / and any other character
+    that is not a letter, digit, - or _ turned into -."""
+    slug = _SLUGS.get(name)
+    if slug is None:
+        slug = _SLUGS[name] = ''.join(c if c.isalnum() or c in '-_' else '-' for c in name.lower())
+    return slug
+
+
+def _tag_end(text, start):
+    """Where the run of letters, digits, -, _ and / from text[start] ends."""
+    end = start
+    while True:
+        # lstrip() takes the ASCII ones in one go; other letters one at a
+        # time.  Bounded bites keep a long run from being copied over and over.
+        bite = text[end:end + 64]
+        rest = bite.lstrip(_TAG_CHARS)
+        end += len(bite) - len(rest)
+        if rest:
+            if not rest[0].isalnum():
+                return end
+            end += 1
+        elif len(bite) < 64:
+            return end
+
+
+def _split_tags(text, at_start=True):
+    # Obsidian #tags: a # at the start, after whitespace or after an inline
+    # tag such as <strong>, then letters, digits, -, _ and /, not all of
+    # them digits.  Not inside an HTML tag, a code span or a link.  None
+    # when there are none.  at_start is False for text right after a link
+    # or image, which a # can't start a tag against.
+    parts = None
+    start = scanned = 0
+    in_tag = in_code = in_link = False
+    has_code = '<code' in text
+    has_link = '<a ' in text
+    i = text.find('#')
+    while i >= 0:
+        if text[i - 1] not in ' \t\n>' if i else not at_start:
+            i = text.find('#', i + 1)
+            continue
+        end = _tag_end(text, i + 1)
+        # A trailing / ends the sentence rather than the tag
+        name = text[i + 1:end].rstrip('/')
+        if not name or name.isdigit():
+            i = text.find('#', i + 1)
+            continue
+        # Catch up on the text since the last candidate; each stretch is
+        # searched once, so this stays linear
+        lt = text.rfind('<', scanned, i)
+        gt = text.rfind('>', scanned, i)
+        if lt >= 0 or gt >= 0:
+            in_tag = lt > gt
+        if has_code:
+            opened = text.rfind('<code', scanned, i)
+            closed = text.rfind('</code>', scanned, i)
+            if opened >= 0 or closed >= 0:
+                in_code = opened > closed
+        if has_link:
+            opened = text.rfind('<a ', scanned, i)
+            closed = text.rfind('</a>', scanned, i)
+            if opened >= 0 or closed >= 0:
+                in_link = opened > closed
+        scanned = i
+        if not (in_tag or in_code or in_link):
+            if parts is None:
+                parts = []
+            parts.append(text[start:i])
+            parts.append(Tag(name))
+            start = i + 1 + len(name)
+        i = text.find('#', i + 1)
+    if parts is None:
+        return None
+    parts.append(text[start:])
+    return parts
+
+
+def _tag_parts(content):
+    """content with the #tags in its strings split out as Tag nodes."""
+    if content.__class__ is str:
+        parts = _split_tags(content)
+        return content if parts is None else parts
+    out = []
+    for index, part in enumerate(content):
+        # Link text is left alone: a tag there would put a link in a link
+        pieces = None if index % 2 or '#' not in part else _split_tags(part, not index)
+        if pieces is None:
+            out.append(part)
+        else:
+            out.extend(pieces)
+    return out
+
+
+def _content(parts):
+    return parts[0] if len(parts) == 1 else parts
+
+
+def _inline_parts(line):
+    """Split a rendered line into inline content with Link and Image nodes.
+
+    Returns None for malformed input where an image rule would reach
+    across a link's edges; the caller keeps such a line as plain HTML.
+    """
+    parts = _split_links(line) if '](' in line else [line]
+    if '![' in line:
+        out = []
+        for part in parts:
+            if part.__class__ is Link:
+                text = part.children
+                if '![[' in part.href or '](' in part.href or '](' in text:
+                    return None
+                if '![[' in text:
+                    pieces = _split_embeds(text)
+                    if pieces is None:
+                        return None
+                    part.children = _content(pieces)
+                out.append(part)
+            elif '](' in part:
+                return None
+            elif '![[' in part:
+                pieces = _split_embeds(part)
+                if pieces is None:
+                    return None
+                out.extend(pieces)
+            else:
+                out.append(part)
+        parts = out
+    return _content(parts)
+
+
+def _render_inline(line, fences):
+    # Code comes out first, so nothing in it is taken for emphasis, a link
+    # or a tag; it goes back in once the rest of the line is done.
+    code = None
+    if '`' in line or fences.open:
+        pieces, spans = _protect_code(line, fences)
+        if spans:
+            if '*' in line:
+                pieces = _render_emphasis_around(pieces, '*')
+            if '_' in line:
+                pieces = _render_emphasis_around(pieces, '_')
+            code = _CodeSpans(pieces, spans)
+            line = code.text
+    # Each emphasis family pairs up independently of the other and neither's
+    # tags contain the other's characters, so each is one split of the line.
+    if code is None:
+        if '*' in line:
+            line = _render_emphasis(line, '*')
+        if '_' in line:
+            line = _render_emphasis(line, '_')
+    # Nor do they contain brackets, so links and images can be matched on the
+    # rendered line exactly as they would be on the source
+    if '](' in line or '![' in line:
+        content = _inline_parts(line)
+        if content is not None:
+            if '#' in line:
+                content = _tag_parts(content)
+            return code.fill(content) if code else content
+        if code:
+            # An embed's name is copied into its src and alt
+            line = code.fill(line)
+            code = None
+        line = _render_embeds(_render_links(line))
+        # ![alt](src) only survives the link rule in malformed input
+        if '](' in line:
+            line = _render_image_links(line)
+    # Tags last, as an HTML tag or link around a # says it isn't one
+    content = _tag_parts(line) if '#' in line else line
+    return code.fill(content) if code else content
+
+
+def _render_image_links(line):
+    # ![alt](src), as r'!\[(.*?)\]\((.*?)\)' would match it.  The lazy
+    # groups retry every later ]( from every ![ when no ) follows, which
+    # is cubic on a run of ![a](; but if the first ]( after a ![ has no )
+    # after it on its line, no later one on that line has either.
+    out = []
+    start = pos = 0
+    while True:
+        i = line.find('![', pos)
+        if i < 0:
+            break
+        eol = line.find('\n', i)
+        if eol < 0:
+            eol = len(line)
+        j = line.find('](', i + 2, eol)
+        k = line.find(')', j + 2, eol) if j >= 0 else -1
+        if k < 0:
+            pos = eol
+            continue
+        out.append(f'{line[start:i]}<br><img src="{line[j + 2:k]}" alt="{line[i + 2:j]}"><br>')
+        start = pos = k + 1
+    if not out:
+        return line
+    out.append(line[start:])
+    return ''.join(out)
+
+
+def _render_line(line, fences):
+    """Render one source line to a Heading or to inline content."""
+    if line == '---':
+        return '<hr>'
+    if line[:1] == '#':
+        level = len(line) - len(line.lstrip('#'))
+        if level <= 6 and line[level:level + 1] == ' ':
+            return Heading(level, _render_inline(line[level + 1:], fences))
+    return _render_inline(line, fences)
+
+
+def _bullet_marker(line):
+    return 2 if line[:2] == '* ' else 0
+
+
+def _ordered_marker(line):
+    # Digits then ". ", as r'\d+\. ' would match at the start
+    if line[:1].isdecimal():
+        end = 1
+        while line[end:end + 1].isdecimal():
+            end += 1
+        if line[end:end + 2] == '. ':
+            return end + 2
+    return 0
+
+
+def _merge_parts(parts):
+    merged = []
+    run = []
+    for part in parts:
+        if part.__class__ is str:
+            run.append(part)
+        else:
+            merged.append(''.join(run))
+            merged.append(part)
+            run = []
+    merged.append(''.join(run))
+    return merged
+
+
+def _block_parts(node):
+    """The inline parts a block renders to, its own tags included."""
+    cls = node.__class__
+    if cls is List:
+        tag = 'ol' if node.ordered else 'ul'
+        parts = [f'<{tag}>\n']
+        for item in node.items:
+            parts.append('  <li>')
+            parts.extend([item] if item.__class__ is str else item)
+            parts.append('</li>\n')
+        parts.append(f'</{tag}>')
+    else:
+        children = node.children
+        parts = [children] if children.__class__ is str else list(children)
+        if cls is Paragraph:
+            parts = ['<p>', *parts, '</p>']
+        elif cls is Heading:
+            parts = [f'<h{node.level}>', *parts, f'</h{node.closing}>']
+    return _merge_parts(parts)
+
+
+def _split_lines(parts):
+    """Break inline parts at newlines into one inline content per line."""
+    lines = []
+    line = []
+    text = ''
+    for part in parts:
+        if part.__class__ is str:
+            pieces = part.split('\n')
+            text += pieces[0]
+            for piece in pieces[1:]:
+                line.append(text)
+                lines.append(_content(line))
+                line = []
+                text = piece
+        else:
+            line.append(text)
+            line.append(part)
+            text = ''
+    line.append(text)
+    lines.append(_content(line))
+    return lines
+
+
+def _fold(text):
+    """re.sub(r'\\n\\s+', ' ', text): a line break and the whitespace after it become one space."""
+    if '\n' not in text:
+        return text
+    pieces = text.split('\n')
+    out = [pieces[0]]
+    last = len(pieces) - 1
+    index = 1
+    while index <= last:
+        piece = pieces[index]
+        stripped = piece.lstrip()
+        if len(stripped) == len(piece) and (piece or index == last):
+            out.append('\n')
+            out.append(piece)
+        else:
+            # The run of whitespace goes on through whole blank lines
+            while not stripped and index < last:
+                index += 1
+                stripped = pieces[index].lstrip()
+            out.append(' ')
+            out.append(stripped)
+        index += 1
+    return ''.join(out)
+
+
+def _join_flat(lines, skip):
+    """Join lines into one inline content, minus the first `skip` characters.
+
+    A line break followed by whitespace collapses into one space, which
+    folds indented lines onto the line above.
+    """
+    texts = []
+    for line in lines:
+        if line.__class__ is str:
+            texts.append(line)
+        elif line.__class__ is Heading:
+            texts.append(_render_heading(line))
+        else:
+            break
+    else:
+        return _fold('\n'.join(texts))[skip:]
+    parts = []
+    text = []
+    for index, line in enumerate(lines):
+        if index:
+            text.append('\n')
+        if line.__class__ is Heading:
+            line = _render_heading(line)
+        if line.__class__ is str:
+            text.append(line)
+            continue
+        if line.__class__ is Code:
+            line = [line]
+        for part in line:
+            if part.__class__ is str:
+                text.append(part)
+            else:
+                parts.append(_fold(''.join(text)))
+                parts.append(part)
+                text = []
+    parts.append(_fold(''.join(text)))
+    parts[0] = parts[0][skip:]
+    return parts
+
+
+def _line_text(line):
+    # The leading text of a line of inline content; None for block nodes
+    cls = line.__class__
+    if cls is str:
+        return line
+    if cls is list:
+        return line[0]
+    return None
+
+
+def _nested_marker(text):
+    stripped = text.lstrip()
+    return len(stripped) < len(text) and (_bullet_marker(stripped) or _ordered_marker(stripped))
+
+
+def _in_nested(text, width):
+    # Deeper lines continue a nested list, and so do markers at its own depth
+    indent = len(text) - len(text.lstrip())
+    return indent > width or indent == width and _nested_marker(text)
+
+
+def _dedent(line, width):
+    cls = line.__class__
+    if cls is Code:
+        return line
+    return line[width:] if cls is str else [line[0][width:], *line[1:]]
+
+
+def _lstrip(line):
+    cls = line.__class__
+    if cls is Code:
+        return line
+    return line.lstrip() if cls is str else [line[0].lstrip(), *line[1:]]
+
+
+def _has_structure(lines):
+    """Whether an item holds a nested list or an indented paragraph.
+
+    Items that take in block nodes other than fenced code, such as
+    headings, are always folded.
+    """
+    found = False
+    previous_blank = False
+    for line in lines[1:]:
+        text = _line_text(line)
+        if text is None:
+            if line.__class__ is Code:
+                previous_blank = False
+                continue
+            return False
+        if found:
+            continue
+        if text[:1].isspace():
+            stripped = text.lstrip()
+            if not stripped and line.__class__ is str:
+                previous_blank = True
+                continue
+            found = previous_blank or _bullet_marker(stripped) or _ordered_marker(stripped)
+        previous_blank = not text and line.__class__ is str
+    return bool(found)
+
+
+def _join_item(lines, skip, depth=0):
+    """Join an item's lines into one inline content, minus its marker.
+
+    Continuation lines are folded onto the first line, except that an
+    indented line starting with a marker opens a nested list and an
+    indented line after a blank one starts a paragraph inside the item.
+    Nesting stops at _MAX_LIST_DEPTH, so every line is looked at a
+    bounded number of times.
+    """
+    if len(lines) < 2 or depth >= _MAX_LIST_DEPTH or not _has_structure(lines):
+        return _join_flat(lines, skip)
+    parts = []
+    flat = [lines[0]]
+    count = len(lines)
+    index = 1
+    while index < count:
+        if lines[index].__class__ is Code:
+            flat.append(lines[index])
+            index += 1
+            continue
+        text = _line_text(lines[index])
+        blank = lines[index].__class__ is str and not text.strip()
+        if not blank and _nested_marker(text):
+            width = len(text) - len(text.lstrip())
+            end = index + 1
+            while end < count:
+                following = _line_text(lines[end])
+                if following is None:
+                    # Fenced code indented past the marker is in the nested item
+                    if lines[end].__class__ is Code and lines[end].indent > width:
+                        end += 1
+                        continue
+                    break
+                if not following.strip() and lines[end].__class__ is str:
+                    # A blank line only belongs to the nested list if it goes on afterwards
+                    after = _line_text(lines[end + 1]) if end + 1 < count else None
+                    if after is None or not after.strip() or not _in_nested(after, width):
+                        break
+                elif not _in_nested(following, width):
+                    break
+                end += 1
+            if flat:
+                parts.append(_join_flat(flat, skip))
+                skip = 0
+                flat = []
+            nested = [_dedent(line, width) for line in lines[index:end]]
+            nested = _wrap_lists(nested, False, _bullet_marker, depth + 1)
+            for node in _wrap_lists(nested, True, _ordered_marker, depth + 1):
+                if node.__class__ is List:
+                    # Siblings share one list, unlike the one-list-per-item top level
+                    if parts and parts[-1].__class__ is List and parts[-1].ordered == node.ordered:
+                        parts[-1].items.extend(node.items)
+                    else:
+                        node.glued = False
+                        parts.append(node)
+                else:
+                    parts.append(' ')
+                    parts.append(_join_flat([_lstrip(node)], 0))
+            index = end
+            continue
+        following = _line_text(lines[index + 1]) if index + 1 < count else None
+        if (blank and following is not None and following[:1].isspace() and following.strip()
+                and not _nested_marker(following)):
+            end = index + 1
+            while end < count:
+                text = _line_text(lines[end])
+                if text is None or not text[:1].isspace() or not text.strip() or _nested_marker(text):
+                    break
+                end += 1
+            if flat:
+                parts.append(_join_flat(flat, skip))
+                skip = 0
+                flat = []
+            parts.append('<p>')
+            parts.append(_join_flat([_lstrip(lines[index + 1]), *lines[index + 2:end]], 0))
+            parts.append('</p>')
+            index = end
+            continue
+        flat.append(_lstrip(lines[index]) if not flat else lines[index])
+        index += 1
+    if flat:
+        parts.append(_join_flat(flat, skip))
+    merged = []
+    for part in parts:
+        if part.__class__ is list:
+            merged.extend(part)
+        else:
+            merged.append(part)
+    return _content(_merge_parts(merged))
+
+
+def _take_lists(nodes, open_block):
+    # Lists from an earlier pass go through whole, unless a block is open to
+    # take in their lines one by one as the rendered list would be
+    for node in nodes:
+        if node.__class__ is List and open_block[0]:
+            lines = _split_lines(_block_parts(node))
+            if node.glued:
+                lines[-1] = Text(lines[-1], True)
+            yield from lines
+        else:
+            yield node
+
+
+def _wrap_lists(lines, ordered, marker, depth=0):
+    """Group list items from a stream of lines into List nodes.
+
+    An item runs until the first line that starts with a non-blank
+    character, except that the line right after a blank one is always
+    taken in; a fenced block whose fence is indented counts as an
+    indented line.  The line break that ends the block is swallowed, so the
+    list is glued onto the line that follows it.
+    """
+    open_block = [False]
+    items = None
+    last_blank = after_glued = False
+    if ordered:
+        # Runs after the bullet pass, so some of its input is already lists
+        lines = _take_lists(lines, open_block)
+    for line in lines:
+        cls = line.__class__
+        if cls is str:
+            # Most lines are plain text outside a list, and only a * or a
+            # digit can start a marker
+            if items is None and not after_glued:
+                first = line[:1]
+                if (first == '*' or first.isdecimal()) and marker(line):
+                    items = [[line]]
+                    last_blank = False
+                    open_block[0] = True
+                    continue
+                yield line
+                continue
+            text = line
+        elif cls is list:
+            text = line[0]
+        else:
+            text = None
+        if items is not None:
+            if (last_blank and cls is not Code or text is not None and (not line or text[:1].isspace())
+                    or cls is Code and line.indent):
+                if text is not None and marker(text):
+                    items[-1].append('')
+                    items.append([line])
+                else:
+                    items[-1].append(line)
+                last_blank = cls is str and (not line or line.isspace())
+                continue
+            items[-1].append('')
+            yield List(ordered, [_join_item(item, marker(_first_text(item[0])), depth) for item in items], True)
+            items = None
+            open_block[0] = False
+        if text is None:
+            # Whatever follows a glued node is on the same line as its
+            # closing tag, so it cannot start a block
+            after_glued = line.glued
+        elif after_glued:
+            after_glued = False
+        else:
+            first = text[:1]
+            if (first == '*' or first.isdecimal()) and marker(text):
+                items = [[line]]
+                last_blank = False
+                open_block[0] = True
+                continue
+        yield line
+    if items is not None:
+        yield List(ordered, [_join_item(item, marker(_first_text(item[0])), depth) for item in items])
+
+
+def _first_text(content):
+    return content if content.__class__ is str else content[0]
+
+
+def _wrap_paragraphs(lines):
+    """Turn the remaining lines into Paragraph, Text and Rule nodes."""
+    in_special_block = False
+    glued = False
+    for node in lines:
+        cls = node.__class__
+        if cls is str or cls is list:
+            first = node if cls is str else node[0]
+            if glued:
+                # The line carries on from a closing list tag
+                in_special_block = True
+                node = Text(node)
+            elif cls is str and not node.strip():
+                in_special_block = False
+                node = Text(node)
+            elif first.startswith(_BLOCK_TAGS):
+                in_special_block = True
+                node = Rule() if node == '<hr>' else Text(node)
+            elif not in_special_block and not first.startswith('  <li>'):
+                node = Paragraph(node)
+            else:
+                node = Text(node)
+            glued = False
+        else:
+            in_special_block = True
+            glued = node.glued
+        yield node
+
+
+def _source_lines(chunks):
+    """Re-split arbitrary text chunks into lines, like str.split('\\n')."""
+    partial = ''
+    for chunk in chunks:
+        if chunk and not partial and chunk.find('\n') == len(chunk) - 1:
+            # The common case of reading a file line by line
+            yield chunk[:-1]
+        else:
+            pieces = (partial + chunk).split('\n')
+            partial = pieces.pop()
+            yield from pieces
+    yield partial
+
+
+def split_front_matter(lines):
+    """Split a document's lines into its YAML front matter and the rest.
+
+    The front matter is the lines between a first line of --- and the
+    next line of --- or ..., as Obsidian writes it, and is None when
+    there is none.  The rest comes as an iterator, taken lazily from
+    `lines`.
+    """
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is None or first.rstrip() != '---':
+        return None, _prepend(first, lines)
+    matter = []
+    for line in lines:
+        if line.rstrip() in ('---', '...'):
+            return matter, lines
+        matter.append(line)
+    # No closing line, so this was a rule rather than front matter
+    return None, iter([first, *matter])
+
+
+def _prepend(first, lines):
+    if first is not None:
+        yield first
+    yield from lines
+
+
+def _fence_open(line):
+    """(indent, backticks, language) when `line` opens a fenced block, else None."""
+    stripped = line.lstrip()
+    if stripped[:3] != '```':
+        return None
+    ticks = len(stripped) - len(stripped.lstrip('`'))
+    info = stripped[ticks:].strip()
+    if '`' in info:
+        # ```code``` on one line is inline
+        return None
+    return len(line) - len(stripped), ticks, info.split(None, 1)[0] if info else ''
+
+
+def _fence_close(line, ticks):
+    stripped = line.strip()
+    return len(stripped) >= ticks and not stripped.strip('`')
+
+
+def _code_blocks(lines):
+    """Take fenced code blocks out of a stream of source lines as Code nodes.
+
+    A line starting with ``` (after any indentation) opens a block that
+    runs to the next line of nothing but at least as many backticks.
+    The lines in between never reach the inline rules.  An opener that
+    is never closed leaves its lines as ordinary text, so they are held
+    back until the closer turns up or the input ends.
+    """
+    block = None
+    for line in lines:
+        if block is None:
+            if '```' in line:
+                fence = _fence_open(line)
+                if fence is not None:
+                    block = [line]
+                    continue
+            yield line
+        elif '```' in line and _fence_close(line, fence[1]):
+            indent, ticks, lang = fence
+            code = []
+            for text in block[1:]:
+                # Strip up to the fence's own indentation
+                code.append(text[min(indent, len(text) - len(text.lstrip())):])
+            yield Code(lang, '\n'.join(code), indent)
+            block = None
+        else:
+            block.append(line)
+    if block is not None:
+        yield from block
+
+
+def _render_lines(lines):
+    """Render headers, rules and inline spans line by line.
+
+    Whether a ``` marker opens a block depends on a partner showing up
+    later, so lines are held back from an unpartnered opener until the
+    next marker arrives or the input ends.
+    """
+    fences = _FenceState()
+    held = []
+    held_markers = 0
+    for line in lines:
+        if line.__class__ is Code:
+            # ``` inside a line cannot pair across a code block
+            if held:
+                fences.remaining = held_markers - 1
+                for pending in held:
+                    yield _render_line(pending, fences)
+                held = []
+            yield line
+            continue
+        if '```' not in line and not held:
+            # A blank line renders to itself
+            yield _render_line(line, fences) if line else line
+            continue
+        markers = line.count('```')
+        if held:
+            if not markers:
+                held.append(line)
+                continue
+            fences.remaining = held_markers
+            for pending in held:
+                yield _render_line(pending, fences)
+            held = []
+        if fences.open ^ (markers % 2 == 1):
+            held.append(line)
+            held_markers = markers
+            continue
+        fences.remaining = markers
+        yield _render_line(line, fences)
+    if held:
+        # The last opener never found its partner: it stays as typed
+        fences.remaining = held_markers - 1
+        for pending in held:
+            yield _render_line(pending, fences)
+
+
+def _find_header_tag(text, prefix, start, end):
+    """Where the first `prefix` + digit 1-6 + '>' in text[start:end] begins, or -1."""
+    i = text.find(prefix, start, end)
+    while i >= 0:
+        digit = i + len(prefix)
+        if digit + 1 < end and text[digit] in '123456' and text[digit + 1] == '>':
+            return i
+        i = text.find(prefix, i + 1, end)
+    return -1
+
+
+def _header_spans(text):
+    """Yield (start, end) of each match of r'<h[1-6]>.*?</h[1-6]>', as re finds them.
+
+    The lazy .*? rescans the rest of the line from every opening tag
+    that has no closing one, which is quadratic on a line full of them;
+    once one finds no closing tag, none after it on that line can.
+    """
+    pos = 0
+    length = len(text)
+    while True:
+        i = _find_header_tag(text, '<h', pos, length)
+        if i < 0:
+            return
+        eol = text.find('\n', i + 4)
+        if eol < 0:
+            eol = length
+        j = _find_header_tag(text, '</h', i + 4, eol)
+        if j < 0:
+            if eol == length:
+                return
+            pos = eol
+            continue
+        yield i, j + 5
+        pos = j + 5
+
+
+def strip_tags(text):
+    """text with its HTML tags taken out, as re.sub(r'<.*?>', '', text) would.
+
+    A tag doesn't reach past the end of its line.  Entities are left
+    as they are.
+    """
+    # Scanned the way _header_spans does
+    out = []
+    start = 0
+    i = text.find('<')
+    while i >= 0:
+        eol = text.find('\n', i)
+        if eol < 0:
+            eol = len(text)
+        j = text.find('>', i + 1, eol)
+        if j < 0:
+            i = text.find('<', eol)
+            continue
+        out.append(text[start:i])
+        start = j + 1
+        i = text.find('<', start)
+    if not out:
+        return text
+    out.append(text[start:])
+    return ''.join(out)
+
+
+def _section_id(header):
+    return strip_tags(header).lower().translate(_SLUG)
+
+
+def _heading_id(heading):
+    # _section_id of the rendered heading; plain text needs no rendering
+    children = heading.children
+    if children.__class__ is str and '<' not in children:
+        return children.lower().translate(_SLUG)
+    return _section_id(_render_heading(heading))
+
+
+def _contains(content, text):
+    if content.__class__ is str:
+        return text in content
+    for part in content:
+        cls = part.__class__
+        if cls is str:
+            if text in part:
+                return True
+        elif cls is Link:
+            if text in part.href or _contains(part.children, text):
+                return True
+        elif cls is Image:
+            if text in part.alt:
+                return True
+        elif cls is Tag:
+            if text in part.name:
+                return True
+        elif cls is List:
+            if any(_contains(item, text) for item in part.items):
+                return True
+    return False
+
+
+def _has_header_tag(node):
+    cls = node.__class__
+    if cls is Paragraph or cls is Text:
+        return _contains(node.children, '<h')
+    if cls is List:
+        return any(_contains(item, '<h') for item in node.items)
+    return cls is Heading
+
+
+def _keep(section):
+    # Content before the first header is dropped when it is all whitespace
+    if section.heading is not None:
+        return True
+    for child in section.children:
+        if child.__class__ is not Text or child.children.__class__ is not str or child.children.strip():
+            return True
+    return False
+
+
+def _unmask(text, start, end, gaps, index):
+    """text[start:end] as inline content, with the nodes of `gaps` back in.
+
+    `gaps` holds (offset, node) for each _NODE_MARK that stands in for a
+    node, in order, and `index` is the first one not yet put back.
+    Returns the content and the index of the next gap.
+    """
+    parts = []
+    while index < len(gaps) and gaps[index][0] < end:
+        offset, node = gaps[index]
+        parts.append(text[start:offset])
+        parts.append(node)
+        start = offset + 1
+        index += 1
+    parts.append(text[start:end])
+    return _content(parts), index
+
+
+def _wrap_sections(nodes):
+    """Group block nodes into one Section per header.
+
+    Yields each Section once the next header closes it.  A header tag
+    can also turn up inside another block, from raw HTML or from a
+    header line taken into a list item; that block is split at the tag
+    and the pieces on either side are kept as Text.
+    """
+    section = Section(None, [])
+    blocks = section.children
+    for node in nodes:
+        cls = node.__class__
+        if cls is Paragraph or cls is Text:
+            children = node.children
+            if children.__class__ is str and '<h' not in children:
+                blocks.append(node)
+                continue
+        elif cls is Heading:
+            children = node.children
+            if children.__class__ is str:
+                plain = '</h' not in children
+            else:
+                plain = not _contains(children, '</h')
+            if plain:
+                # The one place a section's id is made; the anchor, the
+                # nav and anything else that links to it read node.id
+                node.id = _heading_id(node)
+                blocks.append(Text(''))
+                if section.heading is not None or _keep(section):
+                    yield section
+                section = Section(node, [])
+                blocks = section.children
+                continue
+        elif cls is Rule:
+            blocks.append(node)
+            continue
+        if not _has_header_tag(node):
+            blocks.append(node)
+            continue
+        # Split the block's parts at the tags, with each Link or Image
+        # standing in as one character, whose offset is kept; nodes that
+        # hold a tag themselves leave the block as plain HTML
+        parts = _block_parts(node)
+        gaps = []
+        if _contains(parts[1::2], '<h') or _contains(parts[1::2], '</h'):
+            masked = render_parts(parts)
+        else:
+            masked = _NODE_MARK.join(parts[::2])
+            offset = -1
+            for index in range(1, len(parts), 2):
+                offset += len(parts[index - 1]) + 1
+                gaps.append((offset, parts[index]))
+        taken = start = 0
+        for i, j in _header_spans(masked):
+            if start:
+                # The previous header's line runs up to this one
+                section.heading.glued = True
+            text, taken = _unmask(masked, start, i, gaps, taken)
+            blocks.append(Text(text))
+            if _keep(section):
+                yield section
+            header = masked[i:j]
+            children, taken = _unmask(masked, i + 4, j - 5, gaps, taken)
+            heading = Heading(int(header[2]), children, closing=int(header[-2]))
+            heading.id = _heading_id(heading)
+            section = Section(heading, [])
+            blocks = section.children
+            start = j
+        if not start:
+            blocks.append(node)
+        elif start < len(masked) or node.glued:
+            section.heading.glued = True
+            blocks.append(Text(_unmask(masked, start, len(masked), gaps, taken)[0], node.glued))
+    if _keep(section):
+        yield section
+
+
+def render_parts(content):
+    """Render inline content, a str or a parts list of text and nodes, to HTML."""
+    if content.__class__ is str:
+        return content
+    out = []
+    for part in content:
+        cls = part.__class__
+        if cls is str:
+            out.append(part)
+        elif cls is Link:
+            out.append(f'<a href="{part.href}" class="read-more">{render_parts(part.children)}</a>')
+        elif cls is Image:
+            out.append(f'<br><img src="{part.src}" alt="{part.alt}"><br>')
+        elif cls is Tag:
+            out.append(f'<a href="{TAG_URL.format(tag_slug(part.name))}" class="tag">#{part.name}</a>')
+        else:
+            out.append(render_block(part))
+    return ''.join(out)
+
+
+def _render_unlinked(content):
+    # Inline content for inside another link: links and tags as their text
+    if content.__class__ is str:
+        return content
+    out = []
+    for part in content:
+        cls = part.__class__
+        if cls is str:
+            out.append(part)
+        elif cls is Link:
+            out.append(_render_unlinked(part.children))
+        elif cls is Tag:
+            out.append(f'#{part.name}')
+        else:
+            out.append(render_parts([part]))
+    return ''.join(out)
+
+
+def _render_heading(node):
+    return f'<h{node.level}>{render_parts(node.children)}</h{node.closing}>'
+
+
+def render_block(node):
+    """Render one block node of a Section (a Paragraph, Text, List, Rule, Code or Heading) to HTML."""
+    cls = node.__class__
+    if cls is Paragraph:
+        return f'<p>{render_parts(node.children)}</p>'
+    if cls is Text:
+        return render_parts(node.children)
+    if cls is List:
+        tag = 'ol' if node.ordered else 'ul'
+        items = ''.join(f'  <li>{render_parts(item)}</li>\n' for item in node.items)
+        return f'<{tag}>\n{items}</{tag}>'
+    if cls is Rule:
+        return '<hr>'
+    if cls is Code:
+        # Escaped once here; no other rule has seen the text
+        import html
+        lang = f' class="language-{html.escape(node.lang)}"' if node.lang else ''
+        return f'<pre><code{lang}>{html.escape(node.text, False)}</code></pre>'
+    return _render_heading(node)
+
+
+def render_section(section):
+    """Render a Section to its <div class="section"> block."""
+    heading = section.heading
+    if heading is None:
+        out = ['<div class="section">']
+        glued = True
+    else:
+        out = [f'<div class="section" id="{heading.id}">', _render_heading(heading)]
+        glued = heading.glued
+    for child in section.children:
+        if not glued:
+            out.append('\n')
+        cls = child.__class__
+        if cls is Text and child.children.__class__ is str:
+            out.append(child.children)
+        elif cls is Paragraph and child.children.__class__ is str:
+            out.append(f'<p>{child.children}</p>')
+        else:
+            out.append(render_block(child))
+        glued = child.glued
+    out.append('</div>')
+    return ''.join(out)
+
+
+def iter_nodes(sections):
+    """Walk every node of a parsed page, parents before their children."""
+    stack = list(reversed(sections))
+    while stack:
+        node = stack.pop()
+        yield node
+        cls = node.__class__
+        if cls is Section:
+            children = node.children if node.heading is None else [node.heading, *node.children]
+        elif cls is List:
+            children = [part for item in node.items if item.__class__ is list for part in item]
+        elif cls is Rule or cls is Image or cls is Tag or cls is Code or node.children.__class__ is str:
+            continue
+        else:
+            children = node.children
+        stack.extend(child for child in reversed(children) if child.__class__ is not str)
+
+
+def table_of_contents(sections):
+    """(level, html, id) for each header, in page order.
+
+    The html has no links of its own, as an entry is a link itself.
+    """
+    return [(s.heading.level, _render_unlinked(s.heading.children), s.heading.id)
+            for s in sections if s.heading is not None]
+
+
+def collect_links(sections):
+    """Every link target and image source on the page, in page order."""
+    links = []
+    for node in iter_nodes(sections):
+        if node.__class__ is Link:
+            links.append(node.href)
+        elif node.__class__ is Image:
+            links.append(node.src)
+    return links
+
+
+def extract_metadata(sections):
+    """Read the title and the `**Key:** value` lines under the first header."""
+    metadata = {}
+    metadata_line = _regex(_METADATA_LINE)
+    for section in sections:
+        if section.heading is None:
+            continue
+        metadata['title'] = strip_tags(render_parts(section.heading.children)).strip()
+        for child in section.children:
+            if child.__class__ in (Paragraph, Text):
+                # A **Tags:** line is a list of parts once its #tags are split out
+                text = child.children if child.children.__class__ is str else render_parts(child.children)
+                match = metadata_line.match(text)
+                if match:
+                    metadata[match.group(1).strip().lower()] = strip_tags(match.group(2)).strip()
+        break
+    return metadata
+
+
+def iter_sections(lines):
+    """Parse markdown into Sections, yielding each one as soon as it is done.
+
+    `lines` is any iterable of text chunks, such as an open file.  YAML
+    front matter is left out of the page (see split_front_matter).
+    """
+    lines = split_front_matter(_source_lines(lines))[1]
+    blocks = _render_lines(_code_blocks(lines))
+    blocks = _wrap_lists(blocks, False, _bullet_marker)
+    blocks = _wrap_lists(blocks, True, _ordered_marker)
+    return _wrap_sections(_wrap_paragraphs(blocks))
+
+
+def parse_markdown(markdown_text):
+    # The whole text is at hand, so each stage runs over the previous
+    # one's list: resuming a chain of six generators for every line costs
+    # about a quarter of the parse
+    lines = _source_lines([markdown_text])
+    if markdown_text[:3] == '---':
+        lines = split_front_matter(lines)[1]
+    lines = list(_code_blocks(lines))
+    blocks = list(_render_lines(lines))
+    blocks = list(_wrap_lists(blocks, False, _bullet_marker))
+    blocks = list(_wrap_lists(blocks, True, _ordered_marker))
+    return list(_wrap_sections(list(_wrap_paragraphs(blocks))))
+
+
+_NODE_TYPES = (Section, Heading, Paragraph, Text, Rule, List, Link, Image, Code, Tag)
+_NODE_CODES = {cls: code for code, cls in enumerate(_NODE_TYPES)}
+
+
+def _encode(value):
+    # Nodes become tuples of (type code, *fields) and lists stay lists, so the
+    # tree is plain data that marshal can store
+    cls = value.__class__
+    if cls is list:
+        return [_encode(item) for item in value]
+    if cls in _NODE_CODES:
+        return (_NODE_CODES[cls],) + tuple(_encode(getattr(value, name)) for name in cls.__slots__)
+    return value
+
+
+def _decode_content(content):
+    # Strings stay as they are; in a parts list, nodes sit at the odd positions
+    if content.__class__ is list:
+        for index in range(1, len(content), 2):
+            content[index] = _decode(content[index])
+    return content
+
+
+def _decode(data):
+    cls = _NODE_TYPES[data[0]]
+    if cls is Text:
+        return Text(_decode_content(data[1]), data[2])
+    if cls is Paragraph:
+        return Paragraph(_decode_content(data[1]))
+    if cls is Heading:
+        return Heading(data[1], _decode_content(data[2]), data[3], data[4], data[5])
+    if cls is Section:
+        return Section(data[1] and _decode(data[1]), [_decode(child) for child in data[2]])
+    if cls is List:
+        return List(data[1], [_decode_content(item) for item in data[2]], data[3])
+    if cls is Link:
+        return Link(data[1], _decode_content(data[2]))
+    if cls is Image:
+        return Image(data[1], data[2])
+    if cls is Code:
+        return Code(data[1], data[2], data[3])
+    if cls is Tag:
+        return Tag(data[1])
+    return Rule()
+
+
+def load_document(markdown_text, cache_dir):
+    """Parse markdown_text, reusing the tree cached for the same content.
+
+    Trees are stored in `cache_dir` under a hash of the text and the
+    format version, so any edit is a cache miss.
+    """
+    import hashlib
+    import marshal
+    key = hashlib.sha256(f'{_CACHE_VERSION}\0{markdown_text}'.encode('utf-8')).hexdigest()
+    path = os.path.join(cache_dir, f'{key}.ir')
+    try:
+        with open(path, 'rb') as f:
+            return [_decode(section) for section in marshal.loads(f.read())]
+    except (OSError, EOFError, ValueError, TypeError, IndexError):
+        # Missing or unreadable; parse again and replace it
+        pass
+    sections = parse_markdown(markdown_text)
+    os.makedirs(cache_dir, exist_ok=True)
+    temp = f'{path}.{os.getpid()}.tmp'
+    with open(temp, 'wb') as f:
+        f.write(marshal.dumps(_encode(sections)))
+    os.replace(temp, path)
+    return sections
+
+
+def write_if_changed(path, text):
+    """Write text to path as UTF-8 (bytes as they are), unless the file already holds exactly that.
+
+    The new content goes to a temporary file beside path that then
+    replaces it, so a crash never leaves a half-written page, and a page
+    that comes out the same keeps its mtime.  Returns whether the file
+    was written.
+    """
+    data = text if text.__class__ is bytes else text.encode('utf-8')
+    # Replace the file a symlink points to, not the link
+    path = os.path.realpath(path)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        st = None
+    if st is not None and st.st_size == len(data):
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    temp = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temp, 'wb') as f:
+            f.write(data)
+        _replace(temp, path, st)
+    except BaseException:
+        _discard(temp)
+        raise
+    return True
+
+
+def _replace(temp, path, st):
+    # Put temp in place of path, keeping the old file's permissions
+    if st is not None:
+        os.chmod(temp, st.st_mode & 0o7777)
+    os.replace(temp, path)
+
+
+def _discard(temp):
+    try:
+        os.remove(temp)
+    except OSError:
+        pass
+
+
+class StreamedPage:
+    """A page written chunk by chunk with write_if_changed()'s guarantees.
+
+    Chunks go to a temporary file beside path and are compared with the
+    old file as they arrive, so the page is never held in memory.
+    close() puts the new file in place only if it came out different;
+    discard() drops it and leaves the old page as it was.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.realpath(path)
+        try:
+            self.old = open(self.path, 'rb')
+        except FileNotFoundError:
+            self.old = None
+        self.same = self.old is not None
+        self.temp = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            self.file = open(self.temp, 'wb')
+        except BaseException:
+            if self.old is not None:
+                self.old.close()
+            raise
+
+    def write(self, text):
+        data = text.encode('utf-8')
+        if self.same:
+            self.same = self.old.read(len(data)) == data
+        self.file.write(data)
+
+    def close(self):
+        """Finish the page; returns whether the file was written."""
+        try:
+            self.file.close()
+            if self.old is None:
+                st = None
+            else:
+                st = os.fstat(self.old.fileno())
+                if self.same and not self.old.read(1):
+                    _discard(self.temp)
+                    return False
+            _replace(self.temp, self.path, st)
+        except BaseException:
+            _discard(self.temp)
+            raise
+        finally:
+            if self.old is not None:
+                self.old.close()
+        return True
+
+    def discard(self):
+        self.file.close()
+        if self.old is not None:
+            self.old.close()
+        _discard(self.temp)
+
+
+def _page_title(filename):
+    if filename:
+        # Remove the file extension and replace hyphens/underscores with spaces
+        title, newline = (filename[:-1], '\n') if filename[-1:] == '\n' else (filename, '')
+        for suffix in ('.md', '.markdown'):
+            if title.endswith(suffix):
+                title = title[:-len(suffix)]
+                break
+        title = (title + newline).replace('-', ' ').replace('_', ' ')
+        return title.title()  # Capitalize first letter of each word
+    return "Converted Markdown"
+
+
+def render_navigation(sections):
+    """The nav menu for a page: one link per header, to the id its section was given."""
+    nav_items = ''.join(f'<li><a href="#{section_id}">{header}</a></li>'
+                        for level, header, section_id in table_of_contents(sections))
+    return f'''<nav>
     <ul>
-        {''.join(nav_items)}
+        {nav_items}
     </ul>
 </nav>'''
-        
-        # Insert navigation after body tag
-        html_output = html_output.replace('<body>', f'<body>\n{nav_html}')
-    
-    args.output_file.write(html_output)
+
+
+class Converter:
+    """Converts any number of documents with the same options.
+
+    A Converter splits the page template into its static chunks once,
+    so each convert() only parses and joins.  Build, watch and serve keep one
+    per process.
+    """
+
+    def __init__(self, add_nav=False, cache_dir=None):
+        self.add_nav = add_nav
+        self.cache_dir = cache_dir
+        self._head, after_title = _PAGE_HEAD.split('{title}')
+        # The nav menu goes straight after <body>
+        body = after_title.index('<body>') + len('<body>')
+        self._before_body, self._after_body = after_title[:body], after_title[body:]
+        self._foot = _PAGE_FOOT
+
+    def parse(self, markdown_text):
+        """Parse to Sections, through the parse cache when there is one."""
+        if self.cache_dir:
+            return load_document(markdown_text, self.cache_dir)
+        return parse_markdown(markdown_text)
+
+    def page_head(self, filename=None, nav=None, title=None):
+        """Everything before the first section, with `nav` (a nav menu) after <body>.
+
+        The page title comes from the filename unless `title`, plain
+        text, is given.
+        """
+        if title is None:
+            title = _page_title(filename)
+        else:
+            import html
+            title = html.escape(title, False)
+        if nav is None:
+            return f'{self._head}{title}{self._before_body}{self._after_body}'
+        return f'{self._head}{title}{self._before_body}\n{nav}{self._after_body}'
+
+    def iter_render(self, sections, filename=None, title=None):
+        """Render parsed Sections to a page, one chunk at a time.
+
+        With add_nav the menu comes before the content, so the Sections
+        are all gathered before the first chunk.
+        """
+        nav = None
+        if self.add_nav:
+            sections = list(sections)
+            nav = render_navigation(sections)
+        yield self.page_head(filename, nav, title)
+        for section in sections:
+            yield render_section(section)
+        yield self._foot
+
+    def render(self, sections, filename=None, title=None):
+        """Render parsed Sections to a complete page."""
+        return ''.join(self.iter_render(sections, filename, title))
+
+    def convert(self, markdown_text, filename=None, title=None):
+        """Convert one document to a complete page."""
+        return self.render(self.parse(markdown_text), filename, title)
+
+
+_CONVERTER = Converter()
+_NAV_CONVERTER = Converter(add_nav=True)
+
+
+def iter_render(sections, filename=None):
+    """Render parsed Sections to a page, one chunk at a time."""
+    return _CONVERTER.iter_render(sections, filename)
+
+
+def iter_convert(lines, filename=None):
+    """Convert markdown to a page, yielding HTML as soon as each part is done.
+
+    `lines` is any iterable of text chunks, such as an open file.  The
+    page head comes first, then one chunk per section, then the footer;
+    joined together they are exactly convert_markdown_to_html's output.
+    """
+    return _CONVERTER.iter_render(iter_sections(lines), filename)
+
+
+def render_page(sections, filename=None, add_nav=False):
+    """Render parsed Sections to a complete page, optionally with a nav menu."""
+    return (_NAV_CONVERTER if add_nav else _CONVERTER).render(sections, filename)
+
+
+def profile_page(markdown_text, filename=None, add_nav=False):
+    """Convert like render_page(parse_markdown(...)), timing every stage.
+
+    Each stage runs to completion before the next one starts, so the
+    times add up to the whole conversion.  Returns the page, its
+    Sections and a list of (stage, seconds).
+    """
+    import time
+    timings = []
+
+    def run(stage, func):
+        start = time.perf_counter()
+        result = func()
+        timings.append((stage, time.perf_counter() - start))
+        return result
+
+    lines = run('split', lambda: list(split_front_matter(_source_lines([markdown_text]))[1]))
+    lines = run('code blocks', lambda: list(_code_blocks(lines)))
+    blocks = run('headers+inline', lambda: list(_render_lines(lines)))
+    blocks = run('bullet lists', lambda: list(_wrap_lists(blocks, False, _bullet_marker)))
+    blocks = run('ordered lists', lambda: list(_wrap_lists(blocks, True, _ordered_marker)))
+    blocks = run('paragraphs', lambda: list(_wrap_paragraphs(blocks)))
+    sections = run('sections', lambda: list(_wrap_sections(blocks)))
+    body = run('render', lambda: [render_section(section) for section in sections])
+    nav = run('nav', lambda: render_navigation(sections)) if add_nav else None
+    page = run('template', lambda: ''.join([_CONVERTER.page_head(filename, nav), *body, _PAGE_FOOT]))
+    return page, sections, timings
+
+
+def convert_markdown_to_html(markdown_text,filename=None):
+    return _CONVERTER.render(parse_markdown(markdown_text), filename)
+
+
+def _plain_args(argv):
+    """(input, output, add_nav) for `ch.py [--add-nav] [IN [OUT]]`, else None.
+
+    This covers editor hooks and shell loops, which then never pay for
+    importing argparse.
+    """
+    paths = []
+    add_nav = False
+    for arg in argv:
+        if arg == '--add-nav':
+            add_nav = True
+        elif arg == '-' or not arg.startswith('-'):
+            paths.append(arg)
+        else:
+            return None
+    if len(paths) > 2:
+        return None
+    paths += [None] * (2 - len(paths))
+    return paths[0], paths[1], add_nav
+
+
+def _parse_args(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description='Convert Markdown to HTML with custom styling',
+                                     epilog='Subcommands: ' + ', '.join(_COMMANDS) + ' (see ch.py <command> --help)')
+    parser.add_argument('input_file', nargs='?', help='Input Markdown file (default: stdin)')
+    parser.add_argument('output_file', nargs='?', help='Output HTML file (default: stdout)')
+    parser.add_argument('--add-nav', action='store_true', help='Add navigation menu')
+    parser.add_argument('--cache-dir', help='Reuse parse trees cached in this directory')
+    parser.add_argument('--profile', metavar='REPORT', help='Time each conversion stage and write a JSON report')
+    parser.add_argument('--profile-top', type=int, default=10, metavar='N',
+                        help='Entries in the profile summary printed to stderr (default: 10)')
+    parser.add_argument('--batch', action='store_true',
+                        help='Convert every file listed on stdin, as NUL-separated paths or JSON lines, '
+                             'printing a JSON status line for each')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='With --batch: worker processes (default: 1, converts in-process)')
+    args = parser.parse_args(argv)
+    if args.batch and (args.input_file or args.output_file or args.profile):
+        parser.error('--batch reads its file list from stdin and takes no files or --profile')
+    return args
+
+
+def _open_input(path):
+    if path is None or path == '-':
+        return sys.stdin
+    return open(path, encoding='utf-8')
+
+
+def daemon_socket_path():
+    """Where `ch.py daemon` listens: $CH_SOCKET, else a per-user path.
+
+    An empty CH_SOCKET turns the daemon off for both sides.
+    """
+    path = os.environ.get('CH_SOCKET')
+    if path is not None:
+        return path
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        return os.path.join(os.environ['XDG_RUNTIME_DIR'], 'ch.sock')
+    if not hasattr(os, 'getuid'):
+        return ''
+    return f'/tmp/ch-{os.getuid()}.sock'
+
+
+def daemon_socket_owned(path):
+    """Whether path is a socket this user owns, so a daemon answering on it is ours.
+
+    /tmp is shared: another user could bind the fallback path first and
+    be sent every page's markdown, or answer with HTML of their own.
+    """
+    import stat
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(st.st_mode) and (not hasattr(os, 'getuid') or st.st_uid == os.getuid())
+
+
+def source_stamp():
+    """Identifies this copy of ch.py, so a daemon running an older one isn't used."""
+    st = os.stat(__file__)
+    return f'{st.st_mtime_ns}:{st.st_size}'
+
+
+def _daemon_convert(path, markdown_text, filename, add_nav, output_file):
+    """Convert through the daemon listening on `path`, writing the page to output_file.
+
+    Returns False, with nothing written, when no daemon answers or it
+    turns the request down, so the caller converts in-process instead.
+    Raises ConnectionError when the page stops short of the length the
+    daemon said it would send, once part of it has been written.
+    """
+    # The socket module imports enum and selectors, which would cost more
+    # start-up than the daemon saves on a small page
+    import _socket
+    import codecs
+    import json
+    data = markdown_text.encode('utf-8')
+    request = json.dumps({'filename': filename, 'add_nav': add_nav, 'length': len(data),
+                          'version': source_stamp()})
+    sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    written = False
+    try:
+        sock.connect(path)
+        sock.sendall(request.encode('utf-8') + b'\n' + data)
+        received = b''
+        while b'\n' not in received:
+            chunk = sock.recv(_READ_SIZE)
+            if not chunk:
+                return False
+            received += chunk
+        status, _, chunk = received.partition(b'\n')
+        status = json.loads(status)
+        if not isinstance(status, dict) or status.get('ok') is not True or not isinstance(status.get('length'), int):
+            return False
+        length = status['length']
+        count = len(chunk)
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        while chunk:
+            output_file.write(decoder.decode(chunk))
+            written = True
+            chunk = sock.recv(_READ_SIZE)
+            count += len(chunk)
+        if count != length:
+            raise ConnectionError(f'the daemon sent {count} of {length} bytes')
+        output_file.write(decoder.decode(b'', True))
+    except (OSError, ValueError):
+        # Part of the page is already out; converting again would repeat it
+        if written:
+            raise
+        return False
+    finally:
+        sock.close()
+    return True
+
+
+def _convert_file(args, input_file, output_file, filename, add_nav):
+    # Read in large blocks; iter_sections re-splits them into lines
+    blocks = iter(lambda: input_file.read(_READ_SIZE), '')
+    socket_path = daemon_socket_path() if args is None else ''
+    if socket_path and daemon_socket_owned(socket_path):
+        # A plain run goes through the daemon when one is up
+        markdown_text = input_file.read()
+        if _daemon_convert(socket_path, markdown_text, filename, add_nav, output_file):
+            return
+        blocks = [markdown_text]
+    elif args is not None and args.profile:
+        import ch_profile
+        page, sections, record = ch_profile.profile_file(input_file.read(), filename, add_nav)
+        output_file.write(page)
+        ch_profile.write_report([record], args.profile, args.profile_top)
+        return
+
+    converter = Converter(add_nav, args and args.cache_dir)
+    if converter.cache_dir:
+        # The cache is keyed on the whole text, so read it in one go
+        sections = converter.parse(input_file.read())
+    else:
+        sections = iter_sections(blocks)
+
+    # Stream the page out section by section as the input is read (with
+    # --add-nav, once it has all been read)
+    for chunk in converter.iter_render(sections, filename):
+        output_file.write(chunk)
+
+
+def main():
+    argv = sys.argv[1:]
+    if argv and argv[0] in _COMMANDS:
+        # Subcommands live in sibling modules so single-file runs don't load them
+        import importlib
+        return importlib.import_module(_COMMANDS[argv[0]]).main(argv[1:])
+
+    plain = _plain_args(argv)
+    if plain is None:
+        args = _parse_args(argv)
+        if args.batch:
+            import ch_batch
+            return ch_batch.main(sys.stdin, args.jobs, args.add_nav, args.cache_dir)
+        input_path, output_path, add_nav = args.input_file, args.output_file, args.add_nav
+    else:
+        input_path, output_path, add_nav = plain
+        args = None
+
+    try:
+        input_file = _open_input(input_path)
+    except OSError as e:
+        print(f"{os.path.basename(sys.argv[0])}: error: can't open '{input_path}': {e}", file=sys.stderr)
+        return 2
+    filename = None if input_file is sys.stdin else os.path.basename(input_path)
+
+    # A page for a file streams into a temporary file that replaces it at
+    # the end, so a failed conversion leaves the old page in place
+    to_file = output_path is not None and output_path != '-'
+    try:
+        output_file = StreamedPage(output_path) if to_file else sys.stdout
+    except OSError as e:
+        if input_file is not sys.stdin:
+            input_file.close()
+        return _write_error(output_path, e)
+    try:
+        _convert_file(args, input_file, output_file, filename, add_nav)
+    except BaseException:
+        if to_file:
+            output_file.discard()
+        raise
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+    if to_file:
+        try:
+            output_file.close()
+        except OSError as e:
+            return _write_error(output_path, e)
+    return 0
+
+
+def _write_error(output_path, e):
+    print(f"{os.path.basename(sys.argv[0])}: error: can't write '{output_path}': {e.strerror or e}", file=sys.stderr)
+    return 2
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Subcommand modules import this file as `ch`; share it instead of loading a second copy
+    sys.modules.setdefault('ch', sys.modules[__name__])
+    sys.exit(main())
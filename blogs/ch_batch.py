@@ -0,0 +1,113 @@
+"""Convert a list of files given on stdin in one process.
+
+    find . -name '*.md' -print0 | python blogs/ch.py --batch
+    python blogs/ch.py --batch --jobs 4 < manifest.jsonl
+
+Input is either NUL-separated paths, each written next to its source as
+.html, or JSON lines of {"input": ..., "output": ..., "title": ...}
+records where only "input" is required.  Which one is told apart by
+the first character: JSON lines start with "{".  One JSON status line
+per item is printed on stdout as soon as the item is done, in order
+without a pool and in order of completion with one; "written" is false
+when the output already held the same page and was left alone.
+"""
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import ch
+import ch_build
+
+
+def read_items(text):
+    """Yield one item dict per entry in the stdin text.
+
+    Entries that can't be used come through with an "error" key and
+    are reported without being converted.
+    """
+    if text.lstrip()[:1] != '{':
+        for path in text.rstrip('\n').split('\0'):
+            if path:
+                yield {'input': path, 'output': ch_build.output_path(path)}
+        return
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield {'line': number, 'error': f'invalid JSON: {e}'}
+            continue
+        if not isinstance(record, dict) or not isinstance(record.get('input'), str):
+            yield {'line': number, 'error': 'record has no "input" path'}
+            continue
+        item = {'input': record['input'], 'output': record.get('output') or ch_build.output_path(record['input'])}
+        if record.get('title') is not None:
+            item['title'] = str(record['title'])
+        yield item
+
+
+def convert_item(item, add_nav=False, cache_dir=None):
+    """Convert one item; returns its status record."""
+    start = time.perf_counter()
+    status = {'input': item['input'], 'output': item['output']}
+    try:
+        with open(item['input'], encoding='utf-8') as f:
+            text = f.read()
+        converter = ch_build.converter_for(add_nav, cache_dir)
+        page = converter.convert(text, os.path.basename(item['input']), item.get('title'))
+        os.makedirs(os.path.dirname(item['output']) or '.', exist_ok=True)
+        written = ch.write_if_changed(item['output'], page)
+    except Exception as e:
+        status.update(ok=False, error=f'{type(e).__name__}: {e}')
+        return status
+    status.update(ok=True, written=written, bytes_in=len(text.encode('utf-8')),
+                  bytes_out=len(page.encode('utf-8')), seconds=round(time.perf_counter() - start, 6))
+    return status
+
+
+def _report(status, out):
+    out.write(json.dumps(status) + '\n')
+    out.flush()
+
+
+def run(items, jobs=1, add_nav=False, cache_dir=None, out=sys.stdout):
+    """Convert every item, reporting each one on `out`; returns the number that failed.
+
+    jobs=1 converts in this process; more starts a pool of that many
+    workers, each of which keeps its Converter for the whole batch.
+    """
+    failed = 0
+    pending = []
+    for item in items:
+        if 'error' in item:
+            _report({**item, 'ok': False}, out)
+            failed += 1
+        elif jobs == 1:
+            status = convert_item(item, add_nav, cache_dir)
+            failed += not status['ok']
+            _report(status, out)
+        else:
+            pending.append(item)
+    if not pending:
+        return failed
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(convert_item, item, add_nav, cache_dir): item for item in pending}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                status = future.result()
+            except Exception as e:
+                # The worker itself died
+                status = {'input': item['input'], 'output': item['output'], 'ok': False,
+                          'error': f'{type(e).__name__}: {e}'}
+            failed += not status['ok']
+            _report(status, out)
+    return failed
+
+
+def main(stream, jobs=1, add_nav=False, cache_dir=None):
+    return 1 if run(read_items(stream.read()), jobs, add_nav, cache_dir) else 0
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""Convert a whole directory of markdown writeups in parallel.
+
+    python blogs/ch.py build SRC_DIR OUT_DIR [--jobs N] [--add-nav] [--cache-dir DIR]
+
+Every .md/.markdown file under SRC_DIR becomes an .html file at the same
+relative path under OUT_DIR.  Builds are incremental: OUT_DIR keeps a
+manifest of source hashes, and a page is only reconverted when its
+source, the converter or the page template/CSS changed.  The words of
+every converted page go into the search index under OUT_DIR/search/
+(see ch_search.py), and every #tag gets a page listing the writeups
+that carry it (see ch_tags.py).
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import urllib.parse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import ch
+
+# ch_index, ch_search, ch_tags and ch_profile are imported where a build
+# uses them: ch_batch and the daemon only need converter_for() and
+# output_path() from here
+
+MARKDOWN_SUFFIXES = ('.md', '.markdown')
+MANIFEST_NAME = '.ch-manifest.json'
+MANIFEST_VERSION = 5
+
+# One Converter per option set, kept for the life of the process
+_CONVERTERS = {}
+
+# What convert_file() returns for a page: sizes in bytes, the names of
+# the files it links to, its profile record (None unless profiled), its
+# card metadata and its search terms
+PageResult = namedtuple('PageResult', 'bytes_in bytes_out seconds links profile meta terms')
+
+# Inputs shared by every page: the converter (which holds the page
+# template) and the stylesheet the template links to
+TEMPLATE_INPUTS = (
+    os.path.abspath(ch.__file__),
+    os.path.join(os.path.dirname(os.path.abspath(ch.__file__)), '..', 'css', 'blog.css'),
+)
+
+
+def _scan(src_dir):
+    """Yield (relative path, stat) for the markdown files under src_dir."""
+    pending = [src_dir]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir():
+                    pending.append(entry.path)
+                elif entry.name.endswith(MARKDOWN_SUFFIXES):
+                    yield os.path.relpath(entry.path, src_dir), entry.stat()
+
+
+def find_sources(src_dir):
+    """Relative paths of the markdown files under src_dir, largest first.
+
+    Starting the biggest files first keeps one slow page from running
+    alone at the end of the build.
+    """
+    found = sorted(_scan(src_dir), key=lambda item: (-item[1].st_size, item[0]))
+    return [rel for rel, st in found]
+
+
+def output_path(rel):
+    """The .html path that mirrors a source path."""
+    return os.path.splitext(rel)[0] + '.html'
+
+
+def page_references(sections):
+    """Names of the local files a page links to or embeds.
+
+    Only the base name is kept, which is what Obsidian-style links use,
+    so a page can be found again from any file that changes.
+    """
+    names = set()
+    for target in ch.collect_links(sections):
+        target = urllib.parse.unquote(target.split('#', 1)[0].split('?', 1)[0])
+        if target and '://' not in target and not target.startswith('mailto:'):
+            names.add(os.path.basename(target))
+    return sorted(names)
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def build_fingerprint(add_nav=False, template_inputs=TEMPLATE_INPUTS):
+    """Hash of everything besides the source that shapes a page."""
+    h = hashlib.sha256(f'{MANIFEST_VERSION}\0{add_nav}\0'.encode())
+    for path in template_inputs:
+        h.update(os.path.basename(path).encode() + b'\0')
+        try:
+            h.update(file_digest(path).encode())
+        except OSError:
+            h.update(b'missing')
+    return h.hexdigest()
+
+
+def load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest
+
+
+def save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    os.makedirs(out_dir, exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def plan_build(src_dir, out_dir, fingerprint, manifest, force=False):
+    """Split the sources into pages to convert and pages that are current.
+
+    Returns (stale, pages, removed): `stale` lists the sources to
+    convert, largest first, `pages` is the new manifest entry for every
+    source and `removed` lists the sources that disappeared since the
+    last build.
+    """
+    old_pages = manifest.get('pages', {}) if manifest.get('fingerprint') == fingerprint and not force else {}
+    pages = {}
+    stale = []
+    for rel, st in sorted(_scan(src_dir), key=lambda item: (-item[1].st_size, item[0])):
+        entry = old_pages.get(rel)
+        if entry and not os.path.exists(os.path.join(out_dir, output_path(rel))):
+            entry = None
+        if entry and entry['size'] == st.st_size and entry['mtime'] == st.st_mtime_ns:
+            # Same size and mtime as last time; trust the recorded hash
+            pages[rel] = entry
+            continue
+        digest = file_digest(os.path.join(src_dir, rel))
+        if entry and entry['source'] == digest:
+            # Touched but not changed
+            pages[rel] = dict(entry, size=st.st_size, mtime=st.st_mtime_ns)
+            continue
+        pages[rel] = {'source': digest, 'size': st.st_size, 'mtime': st.st_mtime_ns}
+        stale.append(rel)
+    removed = [rel for rel in manifest.get('pages', {}) if rel not in pages]
+    return stale, pages, removed
+
+
+def converter_for(add_nav=False, cache_dir=None):
+    """This process's ch.Converter for these options."""
+    key = (add_nav, cache_dir)
+    converter = _CONVERTERS.get(key)
+    if converter is None:
+        converter = _CONVERTERS[key] = ch.Converter(add_nav, cache_dir)
+    return converter
+
+
+def convert_file(src, dst, add_nav=False, cache_dir=None, profile=False):
+    """Convert one file; returns a PageResult.
+
+    Profiling always parses, bypassing cache_dir, so every stage is
+    measured.  dst is only rewritten when the page
+    differs from what it holds.
+    """
+    start = time.perf_counter()
+    with open(src, encoding='utf-8') as f:
+        text = f.read()
+    import ch_index
+    import ch_search
+    record = None
+    if profile:
+        import ch_profile
+        page, sections, record = ch_profile.profile_file(text, os.path.basename(src), add_nav)
+    else:
+        converter = converter_for(add_nav, cache_dir)
+        sections = converter.parse(text)
+        page = converter.render(sections, os.path.basename(src))
+    os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+    ch.write_if_changed(dst, page)
+    meta = ch_index.page_metadata(text, sections, os.path.basename(src))
+    return PageResult(len(text.encode('utf-8')), len(page.encode('utf-8')), time.perf_counter() - start,
+                      page_references(sections), record, meta, ch_search.page_terms(sections, meta['title']))
+
+
+def convert_all(tasks, jobs=None, add_nav=False, cache_dir=None, profile=False):
+    """Run convert_file over (rel, src, dst) tasks, in order of submission.
+
+    Returns {rel: convert_file's PageResult}, with an exception in
+    its place for files that failed.  jobs=1 converts in this
+    process instead of starting a pool.
+    """
+    results = {}
+    if jobs == 1 or len(tasks) <= 1:
+        for rel, src, dst in tasks:
+            try:
+                results[rel] = convert_file(src, dst, add_nav, cache_dir, profile)
+            except Exception as e:
+                results[rel] = e
+        return results
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        # The pool starts tasks in the order they were submitted
+        futures = {pool.submit(convert_file, src, dst, add_nav, cache_dir, profile): rel
+                   for rel, src, dst in tasks}
+        for future in as_completed(futures):
+            rel = futures[future]
+            try:
+                results[rel] = future.result()
+            except Exception as e:
+                results[rel] = e
+    return results
+
+
+def record_results(pages, results):
+    """Store converted pages' references and card metadata in the manifest entries.
+
+    Failed pages are dropped from the manifest so the next build
+    retries them.
+    """
+    for rel, result in results.items():
+        if isinstance(result, Exception):
+            pages.pop(rel, None)
+        else:
+            pages[rel]['links'] = result.links
+            pages[rel]['meta'] = result.meta
+
+
+def search_changes(results):
+    """The successful results as update_search() takes them: {rel: (url, title, terms)}."""
+    return {rel: (output_path(rel).replace(os.sep, '/'), result.meta['title'], result.terms)
+            for rel, result in results.items() if isinstance(result, PageResult)}
+
+
+def build(src_dir, out_dir, jobs=None, add_nav=False, cache_dir=None, force=False, profile=False,
+          site_root=None):
+    """Bring out_dir up to date with the sources under src_dir.
+
+    Tag pages go to tags/ under site_root, by default
+    ch_tags.site_root(out_dir).
+
+    Returns (results, unchanged, removed): the convert_all results for
+    the pages that were rebuilt, the number of pages left untouched and
+    the sources whose outputs were deleted because the source is gone.
+    """
+    import ch_index
+    import ch_search
+    import ch_tags
+    fingerprint = build_fingerprint(add_nav)
+    manifest = load_manifest(out_dir)
+    # Pages already converted are only in the search index if it survived
+    force = force or not ch_search.is_current(out_dir)
+    stale, pages, removed = plan_build(src_dir, out_dir, fingerprint, manifest, force)
+
+    tasks = [(rel, os.path.join(src_dir, rel), os.path.join(out_dir, output_path(rel)))
+             for rel in stale]
+    unchanged = len(pages) - len(stale)
+    results = convert_all(tasks, jobs, add_nav, cache_dir, profile)
+    record_results(pages, results)
+
+    for rel in removed:
+        try:
+            os.remove(os.path.join(out_dir, output_path(rel)))
+        except FileNotFoundError:
+            pass
+
+    new_manifest = {'version': MANIFEST_VERSION, 'fingerprint': fingerprint, 'pages': pages}
+    if new_manifest != manifest:
+        save_manifest(out_dir, new_manifest)
+    # From the manifest alone: unchanged pages' sources aren't read again
+    ch_index.update_indexes(out_dir, pages, removed)
+    ch_search.update_search(out_dir, pages, search_changes(results))
+    ch_tags.update_tags(out_dir, pages, site_root)
+    return results, unchanged, removed
+
+
+def print_summary(results, unchanged, removed, elapsed, out=sys.stdout):
+    failed = 0
+    total_in = total_out = 0
+    for rel in sorted(results):
+        result = results[rel]
+        if isinstance(result, Exception):
+            failed += 1
+            print(f'  FAILED  {rel}: {result}', file=out)
+            continue
+        total_in += result.bytes_in
+        total_out += result.bytes_out
+        print(f'{result.seconds * 1000:>8.1f}ms  {result.bytes_in:>9}B -> {result.bytes_out:>9}B  {output_path(rel)}',
+              file=out)
+    for rel in sorted(removed):
+        print(f'  removed  {output_path(rel)}', file=out)
+    done = len(results) - failed
+    print(f'{done} page(s) built, {unchanged} unchanged, {len(removed)} removed, {failed} failed, '
+          f'{total_in}B -> {total_out}B in {elapsed:.2f}s', file=out)
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='ch.py build', description='Convert a directory of Markdown files to HTML')
+    parser.add_argument('src_dir', help='Directory searched for .md/.markdown files')
+    parser.add_argument('out_dir', help='Directory the .html files are written to')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Worker processes (default: one per CPU, 1 converts in-process)')
+    parser.add_argument('--add-nav', action='store_true', help='Add navigation menu')
+    parser.add_argument('--cache-dir', help='Reuse parse trees cached in this directory')
+    parser.add_argument('--force', action='store_true', help='Rebuild every page, ignoring the manifest')
+    parser.add_argument('--site-root', help='Directory the site is served from; tag pages go to its tags/ '
+                        '(default: the repository if OUT_DIR is in it, else OUT_DIR)')
+    parser.add_argument('--profile', metavar='REPORT', help='Time each conversion stage and write a JSON report')
+    parser.add_argument('--profile-top', type=int, default=10, metavar='N',
+                        help='Entries in the profile summary printed to stderr (default: 10)')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.src_dir):
+        parser.error(f'{args.src_dir} is not a directory')
+
+    start = time.perf_counter()
+    results, unchanged, removed = build(args.src_dir, args.out_dir, args.jobs, args.add_nav,
+                                        args.cache_dir, args.force, bool(args.profile), args.site_root)
+    failed = print_summary(results, unchanged, removed, time.perf_counter() - start)
+    if args.profile:
+        import ch_profile
+        records = []
+        for rel, result in sorted(results.items()):
+            if not isinstance(result, Exception):
+                result.profile['file'] = rel
+                records.append(result.profile)
+        ch_profile.write_report(records, args.profile, args.profile_top)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
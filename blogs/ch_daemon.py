@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Keep a converter warm for editor integrations.
+
+    python blogs/ch.py daemon [--socket PATH] [--cache-dir DIR]
+    python blogs/ch.py daemon --status
+
+Rendering on save starts a new interpreter per save, and start-up costs
+more than the conversion.  The daemon listens on a Unix domain socket
+($CH_SOCKET, else $XDG_RUNTIME_DIR/ch.sock or /tmp/ch-UID.sock) with
+its Converters and the parse trees of recent documents in memory.
+While it is running, a plain `ch.py [--add-nav] [IN [OUT]]` sends its
+input here and writes out the page it gets back, and converts in its
+own process whenever the daemon can't be reached.  Only a socket owned
+by the same user is ever connected to, since /tmp is open to everyone.
+An empty CH_SOCKET turns this off.
+
+One request per connection: a JSON line {"filename", "title",
+"add_nav", "length", "version"} followed by `length` bytes of UTF-8
+markdown, at most MAX_LENGTH of them.  The answer is a JSON status
+line, {"ok": true, "length": N} on success and then the N bytes of the
+page, after which the connection closes; a client that gets fewer
+knows the page was cut short.  {"ok": false, "error": ...} turns the
+request down.  {"op": "stats"} is answered with the daemon's
+counters instead.  A client whose "version" (ch.source_stamp())
+differs is turned down, so an edited ch.py is never answered by the
+old copy.
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import ch
+import ch_build
+
+# The longest document accepted, in bytes
+MAX_LENGTH = 1 << 26
+
+
+class ParseCache:
+    """Parse trees of the most recently converted documents, keyed on their text."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, markdown_text, parse):
+        """The Sections for markdown_text, parsed with `parse` when not cached."""
+        with self.lock:
+            sections = self.entries.get(markdown_text)
+            if sections is not None:
+                self.entries.move_to_end(markdown_text)
+                self.hits += 1
+                return sections
+            self.misses += 1
+        # Parsed outside the lock; two requests for one new text both parse it
+        sections = parse(markdown_text)
+        with self.lock:
+            self.entries[markdown_text] = sections
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return sections
+
+
+class Handler(socketserver.StreamRequestHandler):
+    # Buffered, so the status line and the page go out in a few sends
+    wbufsize = 1 << 16
+
+    def reply(self, status):
+        self.wfile.write(json.dumps(status).encode('utf-8') + b'\n')
+
+    def handle(self):
+        server = self.server
+        start = time.perf_counter()
+        try:
+            request = json.loads(self.rfile.readline())
+            if request.get('op') == 'stats':
+                return self.reply(server.stats())
+            if request.get('version') != server.version:
+                return self.reply({'ok': False, 'error': 'the daemon is running a different ch.py'})
+            length = request.get('length')
+            if type(length) is not int or not 0 <= length <= MAX_LENGTH:
+                return self.reply({'ok': False, 'error': f'length must be 0 to {MAX_LENGTH} bytes, not {length!r}'})
+            data = self.rfile.read(length)
+            if len(data) != length:
+                return self.reply({'ok': False, 'error': f'expected {length} bytes, got {len(data)}'})
+            markdown_text = data.decode('utf-8')
+            converter = ch_build.converter_for(bool(request.get('add_nav')), server.cache_dir)
+            sections = server.parses.get(markdown_text, converter.parse)
+            # Rendered whole, so the status line can say how long it is
+            page = converter.render(sections, request.get('filename'), request.get('title')).encode('utf-8')
+        except Exception as e:
+            return self.reply({'ok': False, 'error': f'{type(e).__name__}: {e}'})
+        server.requests += 1
+        self.reply({'ok': True, 'length': len(page)})
+        self.wfile.write(page)
+        if server.verbose:
+            print(f'  {request.get("filename") or "<stdin>":<40} {len(data):>9} B  '
+                  f'{(time.perf_counter() - start) * 1000:>6.1f} ms', flush=True)
+
+
+class Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, cache_dir=None, max_entries=256, verbose=False):
+        # Only this user may connect
+        umask = os.umask(0o177)
+        try:
+            super().__init__(path, Handler)
+        finally:
+            os.umask(umask)
+        self.version = ch.source_stamp()
+        self.cache_dir = cache_dir
+        self.parses = ParseCache(max_entries)
+        self.verbose = verbose
+        self.requests = 0
+        self.started = time.time()
+
+    def stats(self):
+        return {'ok': True, 'pid': os.getpid(), 'uptime': round(time.time() - self.started, 1),
+                'requests': self.requests, 'cached': len(self.parses.entries),
+                'hits': self.parses.hits, 'misses': self.parses.misses}
+
+
+def query(path, request):
+    """Send `request` to the daemon on path; returns its status line, or None if none answers."""
+    if not ch.daemon_socket_owned(path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+            sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            with sock.makefile('r', encoding='utf-8') as response:
+                return json.loads(response.readline())
+    except (OSError, ValueError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='ch.py daemon',
+                                     description='Serve conversions over a Unix socket from a warm process')
+    parser.add_argument('--socket', default=ch.daemon_socket_path(),
+                        help='Socket to listen on (default: $CH_SOCKET or a per-user path)')
+    parser.add_argument('--cache-dir', help='Also keep parse trees cached in this directory')
+    parser.add_argument('--entries', type=int, default=256,
+                        help='Documents whose parse trees are kept in memory (default: 256)')
+    parser.add_argument('--status', action='store_true', help='Print the running daemon\'s counters and exit')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Print a line per conversion')
+    args = parser.parse_args(argv)
+
+    if not args.socket:
+        parser.error('no socket path: pass --socket or set CH_SOCKET')
+    running = query(args.socket, {'op': 'stats'})
+    if args.status:
+        if running is None:
+            print(f'no daemon is listening on {args.socket}', file=sys.stderr)
+            return 1
+        print(json.dumps(running))
+        return 0
+    if running is not None:
+        parser.error(f'a daemon is already listening on {args.socket} (pid {running.get("pid")})')
+    try:
+        st = os.lstat(args.socket)
+    except FileNotFoundError:
+        pass
+    else:
+        # Only a socket of ours left behind by a daemon that was killed is
+        # removed; anything else at the path is someone's file or a trap
+        if not stat.S_ISSOCK(st.st_mode):
+            parser.error(f'{args.socket} exists and is not a socket')
+        if st.st_uid != os.getuid():
+            parser.error(f'{args.socket} belongs to another user')
+        os.unlink(args.socket)
+
+    server = Server(args.socket, args.cache_dir, args.entries, args.verbose)
+    # Stopped by a service manager: clean up the socket as on Ctrl-C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f'listening on {args.socket}, Ctrl-C to stop', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        server.server_close()
+        try:
+            os.unlink(args.socket)
+        except FileNotFoundError:
+            pass
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Assemble the publishable site in dist/.
+
+    python blogs/ch.py dist [--root DIR] [--out DIR] [--strict]
+
+Starting from index.html (and 404.html, favicon.ico and the other files
+Netlify or browsers look for by name), follows every local href/src/
+form action in HTML, url()/@import in CSS, icon in web manifests and
+"files" in JSON such as the search index's index.json, and copies only
+the files reached into OUT.  Editor history, the converter and other
+unreferenced files never make it into a deploy.  Files whose content
+is already in OUT are left alone and files no longer reached are
+removed, so the publish directory changes only where the site did.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import urllib.parse
+from html.parser import HTMLParser
+
+import ch
+
+# Requested by name rather than linked
+ENTRY_POINTS = ('index.html', '404.html', 'favicon.ico', 'robots.txt', 'sitemap.xml', '_headers', '_redirects')
+
+_CSS_URL = re.compile(r'''url\(\s*(['"]?)(.*?)\1\s*\)|@import\s+(['"])(.*?)\3''')
+_URL_ATTRS = ('href', 'src', 'poster', 'action')
+
+
+class _ReferenceParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.refs = []
+
+    def handle_starttag(self, tag, attrs):
+        for name, value in attrs:
+            if not value:
+                continue
+            if name in _URL_ATTRS:
+                self.refs.append(value)
+            elif name == 'srcset':
+                self.refs.extend(candidate.split()[0] for candidate in value.split(',') if candidate.strip())
+
+
+def html_references(text):
+    parser = _ReferenceParser()
+    parser.feed(text)
+    parser.close()
+    return parser.refs
+
+
+def css_references(text):
+    return [m.group(2) or m.group(4) for m in _CSS_URL.finditer(text)]
+
+
+def manifest_references(text):
+    try:
+        manifest = json.loads(text)
+    except ValueError:
+        return []
+    return [icon['src'] for icon in manifest.get('icons', ()) if isinstance(icon, dict) and 'src' in icon]
+
+
+def json_references(text):
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return []
+    files = data.get('files', ()) if isinstance(data, dict) else ()
+    return [name for name in files if isinstance(name, str)]
+
+
+REFERENCE_SCANNERS = {
+    '.html': html_references,
+    '.htm': html_references,
+    '.css': css_references,
+    '.webmanifest': manifest_references,
+    '.json': json_references,
+}
+
+
+class Site:
+    """Maps URLs to files under a site root, the way the host would serve them."""
+
+    def __init__(self, root, exclude=()):
+        self.root = os.path.realpath(root)
+        self.exclude = [os.path.realpath(path) for path in exclude]
+
+    def published(self, rel):
+        """Whether a root-relative path may be deployed at all."""
+        if any(part.startswith('.') for part in rel.split('/')):
+            return False
+        full = os.path.join(self.root, rel)
+        return not any(full == path or full.startswith(path + os.sep) for path in self.exclude)
+
+    def resolve(self, page, ref):
+        """The root-relative file a reference on `page` points to, or None if it's not local.
+
+        Raises LookupError for a local reference with no file behind it.
+        """
+        url = urllib.parse.urljoin('/' + page, ref)
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme or parts.netloc:
+            return None
+        path = urllib.parse.unquote(parts.path)
+        if not path:
+            return None
+        if path.endswith('/'):
+            path += 'index.html'
+        rel = os.path.normpath(path.lstrip('/')).replace(os.sep, '/')
+        if rel.startswith('../'):
+            raise LookupError(url)
+        candidates = [rel]
+        if not os.path.splitext(rel)[1]:
+            # Netlify serves /page from page.html and /dir from dir/index.html
+            candidates += [rel + '.html', rel + '/index.html']
+        for candidate in candidates:
+            if os.path.isfile(os.path.join(self.root, candidate)) and self.published(candidate):
+                return candidate
+        raise LookupError(url)
+
+    def crawl(self, entries=ENTRY_POINTS):
+        """Every file reachable from the entry points.
+
+        Returns (files, missing): the set of root-relative paths and a list
+        of (referring page, url) for local references that lead nowhere.
+        """
+        pending = [rel for rel in entries if os.path.isfile(os.path.join(self.root, rel))]
+        files = set(pending)
+        missing = []
+        while pending:
+            page = pending.pop()
+            scanner = REFERENCE_SCANNERS.get(os.path.splitext(page)[1].lower())
+            if scanner is None:
+                continue
+            with open(os.path.join(self.root, page), encoding='utf-8', errors='replace') as f:
+                refs = scanner(f.read())
+            for ref in refs:
+                if ref.startswith('#'):
+                    continue
+                try:
+                    target = self.resolve(page, ref)
+                except LookupError as e:
+                    missing.append((page, e.args[0]))
+                    continue
+                if target is not None and target not in files:
+                    files.add(target)
+                    pending.append(target)
+        return files, missing
+
+
+def _same_file(src, dst):
+    try:
+        if os.path.getsize(src) != os.path.getsize(dst):
+            return False
+    except OSError:
+        return False
+    with open(src, 'rb') as a, open(dst, 'rb') as b:
+        return a.read() == b.read()
+
+
+def publish(root, out_dir, files):
+    """Make out_dir hold exactly `files` from root; returns (copied, unchanged, removed)."""
+    copied = []
+    unchanged = 0
+    for rel in sorted(files):
+        src = os.path.join(root, rel)
+        dst = os.path.join(out_dir, rel)
+        if _same_file(src, dst):
+            unchanged += 1
+            continue
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = f'{dst}.{os.getpid()}.tmp'
+        with open(src, 'rb') as f, open(tmp, 'wb') as g:
+            g.write(f.read())
+        os.replace(tmp, dst)
+        copied.append(rel)
+
+    removed = []
+    for path, dirs, names in os.walk(out_dir, topdown=False):
+        for name in names:
+            rel = os.path.relpath(os.path.join(path, name), out_dir).replace(os.sep, '/')
+            if rel not in files:
+                os.remove(os.path.join(path, name))
+                removed.append(rel)
+        if path != out_dir and not os.listdir(path):
+            os.rmdir(path)
+    return copied, unchanged, removed
+
+
+def main(argv=None):
+    default_root = os.path.join(os.path.dirname(os.path.abspath(ch.__file__)), '..')
+    parser = argparse.ArgumentParser(prog='ch.py dist', description='Copy the reachable part of the site into a publish directory')
+    parser.add_argument('--root', default=default_root, help='Site directory (default: the repository)')
+    parser.add_argument('--out', help='Publish directory (default: ROOT/dist)')
+    parser.add_argument('--strict', action='store_true', help='Fail if any local link points to a missing file')
+    args = parser.parse_args(argv)
+
+    out_dir = os.path.normpath(args.out or os.path.join(args.root, 'dist'))
+    site = Site(args.root, exclude=[out_dir])
+    files, missing = site.crawl()
+    for page, url in missing:
+        print(f'  missing  {url} (linked from {page})', file=sys.stderr)
+    if not files:
+        parser.error(f'no index.html in {args.root}')
+    if missing and args.strict:
+        return 1
+
+    copied, unchanged, removed = publish(site.root, out_dir, files)
+    for rel in copied:
+        print(f'  copied   {rel}')
+    for rel in removed:
+        print(f'  removed  {rel}')
+    size = sum(os.path.getsize(os.path.join(site.root, rel)) for rel in files)
+    print(f'{len(files)} file(s), {size}B in {out_dir}: {len(copied)} copied, {unchanged} unchanged, '
+          f'{len(removed)} removed, {len(missing)} missing link(s)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
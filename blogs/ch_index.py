@@ -0,0 +1,487 @@
+"""Challenge listing pages, from the metadata at the top of each writeup.
+
+Every writeup starts with a header block:
+
+    # Cookies - Write-Up
+
+    **Date:** 13/03/2025
+    **Challenge Category:** #Web-Security
+    **Difficulty:** #Easy
+
+or carries the same keys as YAML front matter.  `build` reads it into a
+record kept in the manifest next to the page's source hash, so only
+pages whose source changed are read again.  The card grid of each
+directory's index page, picoCTF/picoCTF.html for picoCTF/*.md, is then
+rewritten from those records between these two comments:
+
+    <!-- ch:cards -->
+    <!-- /ch:cards -->
+
+Index pages without them are left alone.  When the index page also has
+
+    <!-- ch:tabs -->
+    <!-- /ch:tabs -->
+
+the tabs between them become links to one static page per category
+(picoCTF-web.html) and per difficulty (picoCTF-difficulty-easy.html),
+each a copy of the index page with only its own cards.  Filtering needs
+no script, which the site's Content-Security-Policy would block, and a
+visitor only downloads the cards they asked for.
+
+Options on the opening cards comment split long listings into pages:
+
+    <!-- ch:cards per-page=24 shards -->
+
+Each listing then comes as picoCTF.html, picoCTF-2.html, ... with
+previous/next links between <!-- ch:pager --> and <!-- /ch:pager -->.
+With "shards", every page also gets a JSON shard (picoCTF-2.json) of
+its cards for a script that loads more as the reader scrolls; the site
+has no such script yet, so its index pages leave shards off.  Cards
+run oldest first, so a new writeup usually changes only the last page
+of a listing, and pages and shards whose content comes out the same
+are not rewritten.
+
+OUT_DIR/.ch-index.json records the listing pages and shards written in
+each directory.  A listing that shrinks or goes away has its old pages
+removed, and only those: a file the state doesn't name is never
+touched, whatever its name looks like.
+"""
+import datetime
+import html
+import json
+import os
+import urllib.parse
+
+import ch
+
+# Opening comments may carry options before their closing -->
+CARDS_START = '<!-- ch:cards'
+CARDS_END = '<!-- /ch:cards -->'
+TABS_START = '<!-- ch:tabs'
+TABS_END = '<!-- /ch:tabs -->'
+PAGER_START = '<!-- ch:pager'
+PAGER_END = '<!-- /ch:pager -->'
+
+STATE_NAME = '.ch-index.json'
+# Bump when the state's layout changes
+FORMAT = 1
+
+# (data-category, tab label, words that put a category in it)
+CATEGORIES = (
+    ('web', 'Web Exploitation', ('web',)),
+    ('crypto', 'Cryptography', ('crypt',)),
+    ('forensics', 'Forensics', ('forensic',)),
+    ('binary', 'Binary Exploitation', ('binary', 'pwn')),
+    ('reverse', 'Reverse Engineering', ('reverse', 'reversing')),
+)
+OTHER = 'other'
+
+# Difficulty tabs come in this order, then any others alphabetically
+DIFFICULTIES = ('easy', 'medium', 'hard', 'insane')
+
+_TITLE_SUFFIXES = (' - write-up', ' - writeup', ' write-up', ' writeup')
+
+
+def _scalar(value):
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+        return value[1:-1]
+    return value
+
+
+def front_matter(text):
+    """The keys of a leading YAML front matter block, lowercased; {} if there is none.
+
+    Only what Obsidian writes is understood: `key: value` scalars,
+    quoted strings, and [a, b] or `- item` lists.
+    """
+    if not text.startswith('---'):
+        return {}
+    # The block the converter leaves out of the page
+    matter = ch.split_front_matter(text.split('\n'))[0]
+    if matter is None:
+        return {}
+    data = {}
+    key = None
+    for line in matter:
+        line = line.rstrip()
+        stripped = line.strip()
+        if not stripped or stripped.startswith('#'):
+            continue
+        if stripped.startswith('- ') and key is not None:
+            if not isinstance(data[key], list):
+                data[key] = []
+            data[key].append(_scalar(stripped[2:]))
+            continue
+        name, colon, value = line.partition(':')
+        if not colon or line[0].isspace():
+            # Nested mappings aren't needed for cards
+            continue
+        key = name.strip().lower()
+        value = value.strip()
+        if value.startswith('[') and value.endswith(']'):
+            data[key] = [_scalar(item) for item in value[1:-1].split(',') if item.strip()]
+        else:
+            data[key] = _scalar(value)
+    return data
+
+
+def _first(value):
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if value is None:
+        return None
+    value = str(value).strip().lstrip('#').strip()
+    return value or None
+
+
+def iso_date(value):
+    """YYYY-MM-DD for a date written as 13/03/2025 (day first) or 2025-03-13; None if it isn't one."""
+    if not value:
+        return None
+    parts = value.replace('/', '-').replace('.', '-').split('-')
+    if len(parts) != 3 or not all(part.isdigit() for part in parts):
+        return None
+    if len(parts[0]) == 4:
+        year, month, day = parts
+    else:
+        day, month, year = parts
+    try:
+        return datetime.date(int(year), int(month), int(day)).isoformat()
+    except ValueError:
+        return None
+
+
+def category_section(category):
+    """The data-category a challenge category is filed under."""
+    if category:
+        lowered = category.lower()
+        for section, label, words in CATEGORIES:
+            if any(word in lowered for word in words):
+                return section
+    return OTHER
+
+
+def page_metadata(text, sections, filename=None):
+    """The card record for one writeup.
+
+    Front matter keys win over the header block.  The title loses its
+    " - Write-Up" suffix and falls back to the file name.
+    """
+    fields = ch.extract_metadata(sections)
+    matter = front_matter(text)
+    fields.update(matter)
+    title = _first(fields.get('title'))
+    if title:
+        lowered = title.lower()
+        for suffix in _TITLE_SUFFIXES:
+            if lowered.endswith(suffix):
+                title = title[:-len(suffix)].rstrip()
+                break
+    if not title and filename:
+        title = os.path.splitext(filename)[0]
+    category = _first(fields.get('challenge category') or fields.get('category') or fields.get('categories'))
+    return {
+        'title': title,
+        'date': iso_date(_first(fields.get('date'))),
+        'category': category,
+        'section': category_section(category),
+        'difficulty': _first(fields.get('difficulty')),
+        'tags': page_tags(sections, matter.get('tags')),
+    }
+
+
+def page_tags(sections, listed=None):
+    """The page's tags, front matter `tags:` first and then the #tags in
+    the text, in the order they first appear and one per tag page."""
+    if not isinstance(listed, list):
+        listed = str(listed or '').replace(',', ' ').split()
+    tags = {}
+    for name in listed:
+        name = str(name).strip().lstrip('#')
+        if name and ch.tag_slug(name).strip('-'):
+            tags.setdefault(ch.tag_slug(name), name)
+    for node in ch.iter_nodes(sections):
+        if node.__class__ is ch.Tag:
+            tags.setdefault(ch.tag_slug(node.name), node.name)
+    return list(tags.values())
+
+
+def sort_key(item):
+    rel, record = item
+    return record.get('date') or '', (record.get('title') or '').lower(), rel
+
+
+def card_href(rel):
+    """The link from an index page to the page built from `rel`, a sibling."""
+    return urllib.parse.quote(os.path.splitext(os.path.basename(rel))[0] + '.html')
+
+
+def render_card(rel, record, href=None):
+    """One blog-card div linking to `href`, by default the sibling page built from `rel`."""
+    href = href or card_href(rel)
+    lines = [f'<div class="blog-card" data-category="{record.get("section") or OTHER}">',
+             f'    <h3>{html.escape(record.get("title") or "", False)}</h3>']
+    if record.get('date'):
+        lines.append(f'    <span class="blog-date">{record["date"]}</span>')
+    if record.get('difficulty'):
+        lines.append(f'    <span class="blog-difficulty">Difficulty: {html.escape(record["difficulty"], False)}</span>')
+    lines.append(f'    <a href="{href}" class="read-more">Read Writeup</a>')
+    lines.append('</div>')
+    return lines
+
+
+def _fill(page, start_marker, end_marker, lines):
+    # page with `lines` between the markers, indented like the first one;
+    # None without them
+    start = page.find(start_marker)
+    close = page.find('-->', start)
+    end = page.find(end_marker, close)
+    if start < 0 or close < 0 or end < 0:
+        return None
+    line_start = page.rfind('\n', 0, start) + 1
+    indent = page[line_start:start]
+    if indent.strip():
+        indent = ''
+    body = ''.join(f'{indent}{line}\n' if line else '\n' for line in lines)
+    return f'{page[:close + 3]}\n{body}{indent}{page[end:]}'
+
+
+def card_options(page):
+    """(cards per page or 0 for one page, whether to write shards) from the cards comment."""
+    start = page.find(CARDS_START)
+    close = page.find('-->', start)
+    if start < 0 or close < 0:
+        return 0, False
+    per_page = 0
+    shards = False
+    for option in page[start + len(CARDS_START):close].split():
+        name, _, value = option.partition('=')
+        if name == 'per-page' and value.isdigit():
+            per_page = int(value)
+        elif name == 'shards':
+            shards = True
+    return per_page, shards
+
+
+def fill_cards(page, items):
+    """page with the cards for (rel, record) items between the markers; None without markers."""
+    lines = []
+    for rel, record in sorted(items, key=sort_key):
+        if lines:
+            lines.append('')
+        lines.extend(render_card(rel, record))
+    return _fill(page, CARDS_START, CARDS_END, lines or ['<p>No writeups here yet.</p>'])
+
+
+def _slug(text):
+    return ''.join(c if c.isalnum() else '-' for c in text.lower())
+
+
+def listings(name, items):
+    """[(base name, tab label, tab row, items)] for an index page and its listings.
+
+    Every category gets a listing, so its tab always leads somewhere;
+    "Other" and the difficulties only appear when some card has them.
+    """
+    pages = [(name, 'All', 'category', items)]
+    categories = list(CATEGORIES)
+    if any(record.get('section') == OTHER for rel, record in items):
+        categories.append((OTHER, 'Other', ()))
+    for section, label, words in categories:
+        pages.append((f'{name}-{section}', label, 'category',
+                      [item for item in items if item[1].get('section') == section]))
+    difficulties = {}
+    for rel, record in items:
+        if record.get('difficulty'):
+            difficulties.setdefault(_slug(record['difficulty']), record['difficulty'])
+    order = {slug: n for n, slug in enumerate(DIFFICULTIES)}
+    for slug in sorted(difficulties, key=lambda slug: (order.get(slug, len(order)), slug)):
+        pages.append((f'{name}-difficulty-{slug}', difficulties[slug], 'difficulty',
+                      [item for item in items if _slug(item[1].get('difficulty') or '') == slug]))
+    return pages
+
+
+def page_name(base, number, suffix='.html'):
+    """File name of page `number` (from 1) of a listing."""
+    return f'{base}{suffix}' if number == 1 else f'{base}-{number}{suffix}'
+
+
+def paginate(items, per_page):
+    """The sorted items split into pages of per_page; one page when per_page is 0."""
+    items = sorted(items, key=sort_key)
+    if not per_page or len(items) <= per_page:
+        return [items]
+    return [items[start:start + per_page] for start in range(0, len(items), per_page)]
+
+
+def tab_lines(pages, active):
+    """The tab rows, as links to each listing's first page, with `active` marked."""
+    lines = []
+    for row in ('category', 'difficulty'):
+        tabs = [(base, label) for base, label, page_row, items in pages if page_row == row]
+        if not tabs:
+            continue
+        lines.append('<div class="category-tabs">')
+        for base, label in tabs:
+            if base == active:
+                attrs = 'class="category-tab active" aria-current="page"'
+            else:
+                attrs = 'class="category-tab"'
+            lines.append(f'    <a {attrs} href="{urllib.parse.quote(page_name(base, 1))}">{html.escape(label, False)}</a>')
+        lines.append('</div>')
+    return lines
+
+
+def pager_lines(base, number, count, shards):
+    """Previous/next links for page `number` of `count`, and its shard's links.
+
+    The total isn't shown, so adding a page only changes the one
+    before it.  With shards, the page links its own shard and the next
+    one, for prefetching; that is also how `ch.py dist` finds them.
+    """
+    lines = []
+    if count > 1:
+        lines.append('<div class="category-tabs">')
+        if number > 1:
+            lines.append(f'    <a class="category-tab" rel="prev" href="{urllib.parse.quote(page_name(base, number - 1))}">'
+                         f'Previous</a>')
+        lines.append(f'    <span class="category-tab active" aria-current="page">Page {number}</span>')
+        if number < count:
+            lines.append(f'    <a class="category-tab" rel="next" href="{urllib.parse.quote(page_name(base, number + 1))}">'
+                         f'Next</a>')
+        lines.append('</div>')
+    if shards:
+        lines.append(f'<link rel="alternate" type="application/json" '
+                     f'href="{urllib.parse.quote(page_name(base, number, ".json"))}">')
+        if number < count:
+            lines.append(f'<link rel="prefetch" href="{urllib.parse.quote(page_name(base, number + 1, ".json"))}">')
+    return lines
+
+
+def shard(base, number, count, items):
+    """The JSON shard of one page: its cards as data, and the next shard's name."""
+    cards = []
+    for rel, record in items:
+        card = {key: record.get(key) for key in ('title', 'date', 'difficulty', 'section')}
+        card['href'] = card_href(rel)
+        cards.append(card)
+    next_shard = page_name(base, number + 1, '.json') if number < count else None
+    return json.dumps({'page': number, 'next': next_shard, 'cards': cards}, indent=1, sort_keys=True) + '\n'
+
+
+def _retitle(page, label):
+    start = page.find('<title>')
+    if start < 0:
+        return page
+    start += len('<title>')
+    return f'{page[:start]}{html.escape(label, False)} | {page[start:]}'
+
+
+def index_path(out_dir, directory):
+    """The index page of an output directory: picoCTF/picoCTF.html."""
+    return os.path.join(out_dir, directory, os.path.basename(directory) + '.html')
+
+
+def load_state(out_dir):
+    try:
+        with open(os.path.join(out_dir, STATE_NAME), encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(state, dict) or state.get('format') != FORMAT:
+        return {}
+    return state
+
+
+def save_state(out_dir, state):
+    os.makedirs(out_dir, exist_ok=True)
+    ch.write_if_changed(os.path.join(out_dir, STATE_NAME), json.dumps(state, indent=1, sort_keys=True))
+
+
+def update_indexes(out_dir, pages, removed=()):
+    """Rewrite every index page under out_dir, and its listing pages, from the manifest `pages`.
+
+    `removed` lists sources that are gone, so a directory whose last
+    page went away is emptied too.  Returns the pages written.
+    """
+    state = load_state(out_dir)
+    listed = dict(state.get('listings', {}))
+    groups = {os.path.dirname(rel): [] for rel in removed}
+    for rel, entry in pages.items():
+        record = entry.get('meta')
+        directory = os.path.dirname(rel)
+        # A markdown index page gets no card of its own
+        if record is not None and os.path.splitext(os.path.basename(rel))[0] != os.path.basename(directory):
+            groups.setdefault(directory, []).append((rel, record))
+    written = []
+    for directory, items in sorted(groups.items()):
+        if not directory:
+            continue
+        path = index_path(out_dir, directory)
+        try:
+            with open(path, encoding='utf-8') as f:
+                template = f.read()
+        except FileNotFoundError:
+            continue
+        if CARDS_START not in template:
+            continue
+        pages_written, generated = write_listings(os.path.join(out_dir, directory), template, items,
+                                                  listed.get(directory, ()))
+        written += pages_written
+        listed[directory] = generated
+    new_state = {'format': FORMAT, 'listings': {directory: names for directory, names in listed.items() if names}}
+    if new_state != state and (state or new_state['listings']):
+        save_state(out_dir, new_state)
+    return written
+
+
+def write_listings(directory, template, items, generated=()):
+    """Write the index page in `directory` and every listing page made from it.
+
+    `generated` names the listing pages and shards written there last
+    time; those no longer made are removed.  Returns the pages written
+    and the sorted names of the listing pages and shards now there.
+    """
+    name = os.path.basename(directory)
+    per_page, shards = card_options(template)
+    listing = listings(name, items)
+    if TABS_START not in template:
+        # Cards only, as on an index page that filters some other way
+        listing = listing[:1]
+    outputs = {}
+    for base, label, row, listing_items in listing:
+        chunks = paginate(listing_items, per_page)
+        for number, chunk in enumerate(chunks, 1):
+            page = fill_cards(template, chunk)
+            page = _fill(page, TABS_START, TABS_END, tab_lines(listing, base)) or page
+            page = _fill(page, PAGER_START, PAGER_END, pager_lines(base, number, len(chunks), shards)) or page
+            if number > 1:
+                page = _retitle(page, f'Page {number}' if base == name else f'{label}, page {number}')
+            elif base != name:
+                page = _retitle(page, label)
+            outputs[page_name(base, number)] = page
+            if shards:
+                outputs[page_name(base, number, '.json')] = shard(base, number, len(chunks), chunk)
+    written = []
+    for filename, content in outputs.items():
+        if ch.write_if_changed(os.path.join(directory, filename), content):
+            written.append(os.path.join(directory, filename))
+    # The index page itself is the template, never a generated listing
+    names = set(outputs) - {page_name(name, 1)}
+    _remove_stale(directory, set(generated) - names, items)
+    return written, sorted(names)
+
+
+def _remove_stale(directory, filenames, items):
+    # Pages and shards of listings that shrank or went away: a difficulty
+    # or "Other" no card has any more, or pages past the new last one.
+    # Never a page built from a source, even one named like a listing.
+    keep = {urllib.parse.unquote(card_href(rel)) for rel, record in items}
+    for filename in filenames:
+        if filename in keep or os.path.basename(filename) != filename:
+            continue
+        try:
+            os.remove(os.path.join(directory, filename))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,81 @@
+"""Per-stage, per-page profiling for ch.py and `ch.py build`.
+
+profile_file() converts one page twice: once untraced, for stage times
+that tracing would distort, and once under tracemalloc for the memory
+peak.  write_report() stores every record as JSON and prints the pages
+and stages that took longest to stderr.
+"""
+import json
+import sys
+import time
+import tracemalloc
+
+import ch
+
+
+def profile_file(text, filename=None, add_nav=False):
+    """Convert `text`; returns (page, sections, record), record being a JSON-able dict."""
+    start = time.perf_counter()
+    page, sections, timings = ch.profile_page(text, filename, add_nav)
+    seconds = time.perf_counter() - start
+
+    tracing = tracemalloc.is_tracing()
+    if tracing and hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    else:
+        # Starting afresh resets the peak too; reset_peak() is 3.9+
+        frames = tracemalloc.get_traceback_limit()
+        tracemalloc.stop()
+        tracemalloc.start(frames)
+    base = tracemalloc.get_traced_memory()[0]
+    ch.profile_page(text, filename, add_nav)
+    peak = tracemalloc.get_traced_memory()[1] - base
+    if not tracing:
+        tracemalloc.stop()
+
+    record = {
+        'file': filename or '<stdin>',
+        'bytes_in': len(text.encode('utf-8')),
+        'bytes_out': len(page.encode('utf-8')),
+        'seconds': seconds,
+        'peak_memory': peak,
+        'stages': dict(timings),
+    }
+    return page, sections, record
+
+
+def summarize(records):
+    """Totals over all records: seconds per stage and overall figures."""
+    stages = {}
+    for record in records:
+        for stage, seconds in record['stages'].items():
+            stages[stage] = stages.get(stage, 0.0) + seconds
+    return {
+        'files': len(records),
+        'bytes_in': sum(r['bytes_in'] for r in records),
+        'bytes_out': sum(r['bytes_out'] for r in records),
+        'seconds': sum(r['seconds'] for r in records),
+        'peak_memory': max((r['peak_memory'] for r in records), default=0),
+        'stages': stages,
+    }
+
+
+def write_report(records, path, top=10, out=sys.stderr):
+    """Save the records and their summary to `path`, print the top entries to `out`."""
+    totals = summarize(records)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'summary': totals, 'files': records}, f, indent=1)
+        f.write('\n')
+
+    total = totals['seconds'] or 1e-9
+    print(f'profile: {totals["files"]} page(s), {totals["bytes_in"]}B -> {totals["bytes_out"]}B '
+          f'in {totals["seconds"] * 1000:.1f}ms, peak {totals["peak_memory"] / 1024:.0f}KiB ({path})', file=out)
+    print('  slowest stages:', file=out)
+    for stage, seconds in sorted(totals['stages'].items(), key=lambda item: -item[1])[:top]:
+        print(f'  {seconds * 1000:>9.1f}ms {seconds / total:>6.1%}  {stage}', file=out)
+    if len(records) > 1:
+        print('  slowest pages:', file=out)
+        for record in sorted(records, key=lambda r: -r['seconds'])[:top]:
+            stage = max(record['stages'], key=record['stages'].get)
+            print(f'  {record["seconds"] * 1000:>9.1f}ms {record["bytes_in"]:>9}B '
+                  f'{record["peak_memory"] / 1024:>7.0f}KiB  {record["file"]} (mostly {stage})', file=out)
@@ -0,0 +1,430 @@
+"""A full-text search index for the built pages, as static files.
+
+`build` and `watch` tokenize every page they convert: its title,
+headings, #tags and text, each word weighted by where it was found.
+The index is inverted, one posting list of (page, weight) per word, and
+written under OUT_DIR/search/:
+
+    index.json       format, shard prefix length, page count and the
+                     list of files below, which `ch.py dist` copies
+    ab.bin           every word starting with "ab" and its postings
+    docs-0.json      [url, title] of pages 0-255, null for unused ids
+
+Words are sharded on their first PREFIX characters, so a search only
+fetches the shard of each word it looks for, and js/search.js does
+exactly that.  A shard is a run of entries sorted by word:
+
+    varint  length of the word in UTF-8 bytes
+    bytes   the word
+    varint  number of postings
+    varint  length of the postings in bytes
+    varints (page id - previous page id, weight) for each posting
+
+with page ids ascending, so the deltas stay small.  Files of GZIP_MIN
+bytes or more also get a .gz copy beside them for servers that send
+precompressed files (nginx's gzip_static); brotli would need a package
+outside the standard library.
+
+Updates are per page and per word.  OUT_DIR/.ch-search/ keeps each
+page's id and the words it was indexed under with their weights, so a
+changed or deleted page is taken out of the shards it was in without
+reading any other page again.  Only the shards of words a page gained,
+lost or changed the weight of are read and rewritten, and only the docs
+blocks of pages added, removed or retitled: a typo fix touches a few
+shards, while a page rewritten from scratch touches one shard for
+nearly every word on it, often hundreds.
+
+The index is built from the markdown sources, which live outside this
+repository, so it is output like the pages and is not committed: run
+`ch.py build` to make it before serving or `ch.py dist`.
+"""
+import bisect
+import gzip
+import html
+import itertools
+import operator
+import json
+import os
+import re
+
+import ch
+
+SEARCH_DIR = 'search'
+STATE_DIR = '.ch-search'
+FORMAT = 1
+
+# Characters a word is sharded on, and pages per docs block
+PREFIX = 2
+BLOCK = 256
+# Smaller files aren't worth a .gz copy
+GZIP_MIN = 1024
+
+TITLE_WEIGHT = 8
+HEADING_WEIGHT = 4
+TAG_WEIGHT = 4
+# A word repeated all over one page doesn't keep counting, and every
+# weight fits in one varint byte
+MAX_WEIGHT = 127
+
+MIN_LENGTH = 2
+MAX_LENGTH = 32
+
+STOPWORDS = frozenset('''
+    an and are as at be but by can do for from has have he her his how if in into is it its me my no not
+    of on or our so than that the their them then there these they this to too up us was we were what
+    when which who will with you your
+'''.split())
+
+_WORD = re.compile(r'[^\W_]+')
+_TAG = re.compile(r'(?<!\w)#([^\W_][\w-]*)')
+
+
+def tokens(text):
+    """The indexable words of text: lowercased runs of letters and digits, less stopwords."""
+    return [word for word in _WORD.findall(text.lower())
+            if MIN_LENGTH <= len(word) <= MAX_LENGTH and word not in STOPWORDS]
+
+
+def _plain(fragment):
+    return html.unescape(ch.strip_tags(fragment))
+
+
+def page_terms(sections, title=None):
+    """{word: weight} for a parsed page.
+
+    Every occurrence in the text counts 1, in a heading HEADING_WEIGHT,
+    in a #tag TAG_WEIGHT and in the title TITLE_WEIGHT, up to MAX_WEIGHT.
+    """
+    terms = {}
+
+    def add(text, weight):
+        for word in tokens(text):
+            terms[word] = terms.get(word, 0) + weight
+
+    if title:
+        add(title, TITLE_WEIGHT)
+    for section in sections:
+        if section.heading is not None:
+            add(_plain(ch.render_parts(section.heading.children)), HEADING_WEIGHT)
+        for child in section.children:
+            text = _plain(ch.render_block(child))
+            add(text, 1)
+            for tag in _TAG.findall(text):
+                add(tag, TAG_WEIGHT)
+    return {word: min(weight, MAX_WEIGHT) for word, weight in terms.items()}
+
+
+def shard_key(word):
+    return word[:PREFIX]
+
+
+def shard_name(key):
+    """File name of a shard: the key itself when it is ASCII letters and digits."""
+    return ''.join(c if c.isascii() and c.isalnum() else f'_{ord(c):x}_' for c in key) + '.bin'
+
+
+def _varint(value, out):
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_postings(postings):
+    """Varint bytes for [(page id, weight)] sorted by id."""
+    if not postings:
+        return b''
+    docs, weights = zip(*postings)
+    flat = [0] * (2 * len(docs))
+    flat[0::2] = map(operator.sub, docs, (0, *docs[:-1]))
+    flat[1::2] = weights
+    if max(flat) < 0x80:
+        # Every varint is one byte, as in the long lists of common words
+        return bytes(flat)
+    out = bytearray()
+    for value in flat:
+        _varint(value, out)
+    return bytes(out)
+
+
+def decode_postings(data):
+    if data.isascii():
+        return list(zip(itertools.accumulate(data[0::2]), data[1::2]))
+    postings = []
+    pos = doc = 0
+    while pos < len(data):
+        delta, pos = _read_varint(data, pos)
+        weight, pos = _read_varint(data, pos)
+        doc += delta
+        postings.append((doc, weight))
+    return postings
+
+
+def merge_postings(data, removed, added):
+    """(count, bytes) of encoded postings less the ids in `removed`, plus the sorted `added` ones.
+
+    When every varint in data is one byte, the common case for a word
+    on many pages, and only a few postings change, the ids are found
+    without decoding each posting in Python and the runs between
+    changes are copied as they are.
+    """
+    if not data.isascii() or len(removed) + len(added) > len(data) // 16:
+        postings = [posting for posting in decode_postings(data) if posting[0] not in removed]
+        postings += added
+        postings.sort()
+        return len(postings), encode_postings(postings)
+    docs = list(itertools.accumulate(data[0::2]))
+    # (position, page id or None to drop the posting there, weight)
+    changes = []
+    for doc in removed:
+        i = bisect.bisect_left(docs, doc)
+        if i < len(docs) and docs[i] == doc:
+            changes.append((i, None, 0))
+    for doc, weight in added:
+        changes.append((bisect.bisect_left(docs, doc), doc, weight))
+    # Drops before inserts at one position, as the insert may reuse its id
+    changes.sort(key=lambda change: (change[0], change[1] is not None, change[1] or 0))
+    out = bytearray()
+    previous = cursor = 0
+    for position, doc, weight in changes:
+        if cursor < position:
+            _varint(docs[cursor] - previous, out)
+            out += data[2 * cursor + 1:2 * position]
+            previous = docs[position - 1]
+        if doc is None:
+            cursor = position + 1
+        else:
+            _varint(doc - previous, out)
+            _varint(weight, out)
+            previous = doc
+            cursor = max(cursor, position)
+    if cursor < len(docs):
+        _varint(docs[cursor] - previous, out)
+        out += data[2 * cursor + 1:]
+    removed_count = sum(1 for change in changes if change[1] is None)
+    return len(docs) - removed_count + len(added), bytes(out)
+
+
+def read_shard(data):
+    """{word: (count, postings bytes)} from a shard; the postings stay encoded."""
+    entries = {}
+    pos = 0
+    while pos < len(data):
+        length, pos = _read_varint(data, pos)
+        word = data[pos:pos + length].decode('utf-8')
+        count, pos = _read_varint(data, pos + length)
+        size, pos = _read_varint(data, pos)
+        entries[word] = (count, data[pos:pos + size])
+        pos += size
+    return entries
+
+
+def encode_shard(entries):
+    out = bytearray()
+    for word in sorted(entries, key=lambda word: word.encode('utf-8')):
+        count, postings = entries[word]
+        encoded = word.encode('utf-8')
+        _varint(len(encoded), out)
+        out += encoded
+        _varint(count, out)
+        _varint(len(postings), out)
+        out += postings
+    return bytes(out)
+
+
+def _write(path, data):
+    """Write data and its .gz copy when they differ from what is there; returns whether data did."""
+    written = ch.write_if_changed(path, data)
+    if len(data) >= GZIP_MIN:
+        if written or not os.path.exists(path + '.gz'):
+            ch.write_if_changed(path + '.gz', gzip.compress(data, 6, mtime=0))
+    else:
+        _remove(path + '.gz')
+    return written
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _read(path, default):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return default
+
+
+class Index:
+    """The search index under one output directory and the state that keeps it incremental."""
+
+    def __init__(self, out_dir):
+        self.dir = os.path.join(out_dir, SEARCH_DIR)
+        self.state_dir = os.path.join(out_dir, STATE_DIR)
+        self.ids = {}
+        # Whether the state on disk was read, so that pages not passed
+        # to update() are already in the index
+        self.current = False
+        try:
+            with open(os.path.join(self.state_dir, 'state.json'), encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('format') == FORMAT and os.path.exists(os.path.join(self.dir, 'index.json')):
+                self.ids = state['pages']
+                self.current = True
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _terms_path(self, doc):
+        return os.path.join(self.state_dir, f'{doc}.terms')
+
+    def _old_terms(self, doc):
+        # {word: weight}; a word saved without its weight never matches
+        # one, so its postings are redone
+        terms = {}
+        for line in _read(self._terms_path(doc), b'').decode('utf-8').splitlines():
+            word, _, weight = line.partition(' ')
+            if word:
+                terms[word] = int(weight) if weight.isdigit() else None
+        return terms
+
+    def update(self, pages, changed):
+        """Index the `changed` pages, {rel: (url, title, {word: weight})}, and drop pages not in `pages`.
+
+        Returns the number of files rewritten.
+        """
+        gone = [rel for rel in self.ids if rel not in pages and rel not in changed]
+        if not gone and not changed:
+            return 0
+        # With every page reindexed, as after the converter changed, the
+        # index is made from nothing rather than from its old shards
+        fresh = all(rel in changed or rel not in pages for rel in self.ids)
+        # The words each page was indexed under before, by id
+        old = {}
+        for rel in [*gone, *changed]:
+            doc = self.ids.get(rel)
+            if doc is not None:
+                old[doc] = {} if fresh else self._old_terms(doc)
+        for rel in gone:
+            del self.ids[rel]
+        free = sorted(set(range(len(self.ids) + len(changed))) - set(self.ids.values()))
+        free.reverse()
+        docs = {}
+        for rel in sorted(changed):
+            if rel not in self.ids:
+                self.ids[rel] = free.pop()
+            docs[self.ids[rel]] = changed[rel]
+        touched = old.keys() | docs.keys()
+
+        # {shard key: {word: ({ids whose posting comes out}, [(id, weight)] going in)}}.
+        # A word whose weight on a page is unchanged keeps its posting,
+        # even on an id that went from a deleted page to a new one.
+        shards = {}
+        for doc, words in old.items():
+            terms = docs[doc][2] if doc in docs else {}
+            for word, weight in words.items():
+                if weight is None or terms.get(word) != weight:
+                    shards.setdefault(shard_key(word), {}).setdefault(word, (set(), []))[0].add(doc)
+        for doc, (url, title, terms) in docs.items():
+            before = old.get(doc, {})
+            for word, weight in terms.items():
+                if before.get(word) != weight:
+                    shards.setdefault(shard_key(word), {}).setdefault(word, (set(), []))[1].append((doc, weight))
+
+        os.makedirs(self.dir, exist_ok=True)
+        os.makedirs(self.state_dir, exist_ok=True)
+        written = 0
+        keep = {'index.json'}
+        for key, words in shards.items():
+            path = os.path.join(self.dir, shard_name(key))
+            entries = {} if fresh else read_shard(_read(path, b''))
+            for word, (removed, added) in words.items():
+                count, postings = entries.pop(word, (0, b''))
+                added.sort()
+                count, postings = merge_postings(postings, removed, added)
+                if count:
+                    entries[word] = (count, postings)
+            if entries:
+                written += _write(path, encode_shard(entries))
+                keep.add(shard_name(key))
+            else:
+                written += _remove(path)
+                _remove(path + '.gz')
+        blocks_written, blocks = self._write_docs(touched, docs, fresh)
+        written += blocks_written
+        keep.update(blocks)
+        if fresh:
+            for name in os.listdir(self.dir):
+                if (name[:-3] if name.endswith('.gz') else name) not in keep:
+                    written += _remove(os.path.join(self.dir, name))
+
+        terms_files = {f'{doc}.terms' for doc in self.ids.values()}
+        for doc, (url, title, terms) in docs.items():
+            ch.write_if_changed(self._terms_path(doc),
+                                ''.join(f'{word} {weight}\n' for word, weight in sorted(terms.items())))
+        for name in (os.listdir(self.state_dir) if fresh else [f'{doc}.terms' for doc in old]):
+            if name.endswith('.terms') and name not in terms_files:
+                _remove(os.path.join(self.state_dir, name))
+        written += self._write_index()
+        ch.write_if_changed(os.path.join(self.state_dir, 'state.json'),
+                            json.dumps({'format': FORMAT, 'pages': self.ids}, indent=1, sort_keys=True))
+        return written
+
+    def _write_docs(self, touched, docs, fresh=False):
+        # Rewrites the blocks holding `touched` ids; returns how many were
+        # written and the names of those that are left
+        written = 0
+        names = set()
+        for block in sorted({doc // BLOCK for doc in touched}):
+            path = os.path.join(self.dir, f'docs-{block}.json')
+            try:
+                rows = [] if fresh else json.loads(_read(path, b'[]'))
+            except ValueError:
+                rows = []
+            rows += [None] * (BLOCK - len(rows))
+            for doc in touched:
+                if doc // BLOCK == block:
+                    entry = docs.get(doc)
+                    rows[doc % BLOCK] = [entry[0], entry[1]] if entry else None
+            while rows and rows[-1] is None:
+                rows.pop()
+            if rows:
+                written += _write(path, json.dumps(rows, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+                names.add(os.path.basename(path))
+            else:
+                written += _remove(path)
+                _remove(path + '.gz')
+        return written, names
+
+    def _write_index(self):
+        files = sorted(name for name in os.listdir(self.dir)
+                       if name != 'index.json' and not name.startswith('.') and not name.endswith('.tmp'))
+        index = {'format': FORMAT, 'prefix': PREFIX, 'block': BLOCK, 'docs': len(self.ids), 'files': files}
+        return _write(os.path.join(self.dir, 'index.json'), json.dumps(index, indent=1).encode('utf-8'))
+
+
+def update_search(out_dir, pages, changed):
+    """Bring OUT_DIR/search/ up to date; see Index.update."""
+    return Index(out_dir).update(pages, changed)
+
+
+def is_current(out_dir):
+    """Whether out_dir holds a search index that update_search() can bring up to date.
+
+    Without one, every page has to be converted and passed to it.
+    """
+    return Index(out_dir).current
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""Preview the site locally, with writeups rendered on the fly.
+
+    python blogs/ch.py serve SRC_DIR [--root DIR] [--prefix /blogs/] [--port 8000]
+
+Serves the site under --root (the repository by default) the way
+Netlify would: the headers from netlify.toml, strong ETags, gzip when
+the browser accepts it and extensionless "pretty" URLs.  Markdown pages
+under SRC_DIR are rendered into memory and served below --prefix in
+place of anything on disk.  Open pages reload themselves over
+Server-Sent Events when a page they show is rebuilt.  Nothing is
+fetched from the network.
+"""
+import argparse
+import fnmatch
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import ch
+import ch_build
+import ch_watch
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+EVENTS_PATH = '/__livereload'
+SCRIPT_PATH = '/__livereload.js'
+RELOAD_TAG = f'<script src="{SCRIPT_PATH}"></script>'
+
+# External rather than inline, so the Content-Security-Policy allows it
+RELOAD_SCRIPT = b'''new EventSource('/__livereload').onmessage = function (event) {
+    var changed = JSON.parse(event.data);
+    var path = location.pathname.replace(/\\/$/, '/index.html');
+    if (changed.indexOf('*') >= 0 || changed.indexOf(path) >= 0 || changed.indexOf(path + '.html') >= 0) {
+        location.reload();
+    }
+};
+'''
+
+COMPRESSIBLE = ('text/', 'application/javascript', 'application/json', 'application/manifest+json',
+                'image/svg+xml')
+
+mimetypes.add_type('application/manifest+json', '.webmanifest')
+
+
+class Resource:
+    """A response body with its validators, compressed on first request."""
+
+    __slots__ = ('body', 'content_type', 'etag', '_gzipped')
+
+    def __init__(self, body, content_type):
+        self.body = body
+        self.content_type = content_type
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self._gzipped = None
+
+    def gzipped(self):
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, mtime=0)
+        return self._gzipped
+
+    @property
+    def compressible(self):
+        return self.content_type.startswith(COMPRESSIBLE)
+
+
+_RELOAD_SCRIPT = Resource(RELOAD_SCRIPT, 'application/javascript')
+
+
+def html_resource(page):
+    """A Resource for an HTML page, with the live-reload script added."""
+    if '</body>' in page:
+        page = page.replace('</body>', RELOAD_TAG + '\n</body>', 1)
+    else:
+        page += RELOAD_TAG
+    return Resource(page.encode('utf-8'), 'text/html; charset=utf-8')
+
+
+def load_header_rules(root):
+    """[(path pattern, {header: value})] from root/netlify.toml."""
+    if tomllib is None:
+        return []
+    try:
+        with open(os.path.join(root, 'netlify.toml'), 'rb') as f:
+            config = tomllib.load(f)
+    except (OSError, ValueError):
+        return []
+    return [(rule['for'], dict(rule.get('values', {})))
+            for rule in config.get('headers', []) if 'for' in rule]
+
+
+class Events:
+    """Hands the latest list of rebuilt URLs to every waiting client."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.serial = 0
+        self.urls = []
+
+    def publish(self, urls):
+        with self.condition:
+            self.serial += 1
+            self.urls = urls
+            self.condition.notify_all()
+
+    def wait(self, serial, timeout):
+        """(serial, urls) once something newer than `serial` is published, or after timeout."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.serial != serial, timeout)
+            return self.serial, self.urls
+
+
+class PageCache(ch_watch.WatchSession):
+    """A WatchSession that keeps rendered pages in memory instead of on disk."""
+
+    def __init__(self, src_dir, prefix='/', add_nav=False, cache_dir=None, events=None):
+        super().__init__(src_dir, None, add_nav, cache_dir)
+        self.prefix = prefix
+        self.events = events or Events()
+        self.pages = {}
+
+    def url_for(self, rel):
+        return self.prefix + ch_build.output_path(rel).replace(os.sep, '/')
+
+    def load(self):
+        self.manifest = {'pages': {}}
+        self.dependents = {}
+        self.pages = {}
+        results = super().rebuild(ch_build.find_sources(self.src_dir))
+        self.events.publish(['*'])
+        return results, 0, []
+
+    def rebuild(self, changed):
+        results = super().rebuild(changed)
+        if results:
+            self.events.publish([self.url_for(rel) for rel in results])
+        return results
+
+    def convert(self, rel):
+        start = time.perf_counter()
+        with open(os.path.join(self.src_dir, rel), encoding='utf-8') as f:
+            text = f.read()
+        converter = ch_build.converter_for(self.add_nav, self.cache_dir)
+        sections = converter.parse(text)
+        resource = html_resource(converter.render(sections, os.path.basename(rel)))
+        links = ch_build.page_references(sections)
+        self.pages[self.url_for(rel)] = resource
+        self.manifest['pages'][rel] = {'links': links}
+        return ch_build.PageResult(len(text.encode('utf-8')), len(resource.body), time.perf_counter() - start,
+                                   links, None, None, None)
+
+    def remove(self, rel):
+        self.manifest['pages'].pop(rel, None)
+        self.pages.pop(self.url_for(rel), None)
+
+    def save(self):
+        pass
+
+    def update_indexes(self, results):
+        pass
+
+
+class Site:
+    """Resolves URL paths to rendered pages or files under root."""
+
+    def __init__(self, root, rendered, header_rules=()):
+        self.root = os.path.realpath(root)
+        self.rendered = rendered
+        self.header_rules = list(header_rules)
+        self.files = {}
+
+    def headers_for(self, path):
+        headers = {}
+        for pattern, values in self.header_rules:
+            if fnmatch.fnmatchcase(path, pattern):
+                headers.update(values)
+        return headers
+
+    def _file(self, path):
+        full = os.path.realpath(os.path.join(self.root, path.lstrip('/')))
+        if full != self.root and not full.startswith(self.root + os.sep):
+            return None
+        try:
+            st = os.stat(full)
+        except OSError:
+            return None
+        if not os.path.isfile(full):
+            return None
+        key = (st.st_mtime_ns, st.st_size)
+        cached = self.files.get(full)
+        if cached and cached[0] == key:
+            return cached[1]
+        with open(full, 'rb') as f:
+            body = f.read()
+        content_type = mimetypes.guess_type(full)[0] or 'application/octet-stream'
+        if content_type == 'text/html':
+            resource = html_resource(body.decode('utf-8', 'replace'))
+        else:
+            if content_type.startswith('text/'):
+                content_type += '; charset=utf-8'
+            resource = Resource(body, content_type)
+        self.files[full] = (key, resource)
+        return resource
+
+    def lookup(self, path):
+        """The Resource for a URL path, or None."""
+        if path == SCRIPT_PATH:
+            return _RELOAD_SCRIPT
+        if path.endswith('/'):
+            path += 'index.html'
+        candidates = [path]
+        if not os.path.splitext(path)[1]:
+            candidates += [path + '.html', path + '/index.html']
+        for candidate in candidates:
+            resource = self.rendered.pages.get(candidate) or self._file(candidate)
+            if resource is not None:
+                return resource
+        return None
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = 'ch.py'
+
+    def do_GET(self):
+        self.serve(send_body=True)
+
+    def do_HEAD(self):
+        self.serve(send_body=False)
+
+    def serve(self, send_body):
+        site = self.server.site
+        path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        if path == EVENTS_PATH:
+            return self.stream_events()
+
+        status = HTTPStatus.OK
+        resource = site.lookup(path)
+        if resource is None:
+            status = HTTPStatus.NOT_FOUND
+            resource = site.lookup('/404.html') or Resource(b'Not Found\n', 'text/plain; charset=utf-8')
+
+        body = resource.body
+        etag = resource.etag
+        encoding = None
+        if resource.compressible and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = resource.gzipped()
+            etag = etag[:-1] + '-gzip"'
+            encoding = 'gzip'
+
+        if status == HTTPStatus.OK and etag in self.headers.get('If-None-Match', ''):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(status)
+        for name, value in site.headers_for(path).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', resource.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'public, max-age=0, must-revalidate')
+        if resource.compressible:
+            self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def stream_events(self):
+        events = self.server.events
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        serial = events.serial
+        try:
+            while True:
+                latest, urls = events.wait(serial, 15)
+                if latest == serial:
+                    # Keeps proxies and the browser from timing out the stream
+                    self.wfile.write(b': keepalive\n\n')
+                else:
+                    serial = latest
+                    self.wfile.write(f'data: {json.dumps(urls)}\n\n'.encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        if self.path != EVENTS_PATH:
+            super().log_message(format, *args)
+
+
+def main(argv=None):
+    default_root = os.path.join(os.path.dirname(os.path.abspath(ch.__file__)), '..')
+    parser = argparse.ArgumentParser(prog='ch.py serve', description='Preview the site with live-rendered writeups')
+    parser.add_argument('src_dir', help='Directory searched for .md/.markdown files')
+    parser.add_argument('--root', default=default_root, help='Site directory to serve (default: the repository)')
+    parser.add_argument('--prefix', default='/blogs/', help='URL path the rendered pages appear under (default: /blogs/)')
+    parser.add_argument('--bind', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on (default: 8000)')
+    parser.add_argument('--add-nav', action='store_true', help='Add navigation menu')
+    parser.add_argument('--cache-dir', help='Reuse parse trees cached in this directory')
+    parser.add_argument('--debounce', type=float, default=20,
+                        help='Milliseconds to wait for more events before rebuilding (default: 20)')
+    parser.add_argument('--poll', action='store_true', help='Scan for changes instead of using inotify')
+    parser.add_argument('--interval', type=float, default=0.5,
+                        help='Seconds between scans when polling (default: 0.5)')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.src_dir):
+        parser.error(f'{args.src_dir} is not a directory')
+    prefix = '/' + args.prefix.strip('/') + '/' if args.prefix.strip('/') else '/'
+
+    events = Events()
+    pages = PageCache(args.src_dir, prefix, args.add_nav, args.cache_dir, events)
+    results, unchanged, removed = pages.load()
+    failed = [rel for rel, result in results.items() if isinstance(result, Exception)]
+    for rel in failed:
+        print(f'  FAILED  {rel}: {results[rel]}', file=sys.stderr)
+    print(f'{len(pages.pages)} page(s) rendered from {args.src_dir}')
+
+    skip = [os.path.realpath(args.cache_dir)] if args.cache_dir else []
+    watcher = ch_watch.open_watcher(args.src_dir, skip, args.poll, args.interval)
+    thread = threading.Thread(target=ch_watch.watch, args=(pages, watcher, args.debounce / 1000), daemon=True)
+    thread.start()
+
+    server = ThreadingHTTPServer((args.bind, args.port), Handler)
+    server.daemon_threads = True
+    server.site = Site(args.root, pages, load_header_rules(args.root))
+    server.events = events
+    host, port = server.server_address[:2]
+    print(f'serving {os.path.realpath(args.root)} at http://{host}:{port}/ ({watcher.name}), Ctrl-C to stop')
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        server.server_close()
+        watcher.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Tag pages, one per Obsidian #tag, from the metadata at the top of each writeup.
+
+A #tag in a writeup's text, as in
+
+    **Challenge Category:** #Web-Security
+    **Difficulty:** #Easy
+
+or listed under `tags:` in its front matter, is rendered as a link to
+that tag's page, /tags/web-security.html (ch.TAG_URL), however the page
+was converted: by `build`, `watch`, `serve`, the daemon or ch.py on its
+own.  `build` and `watch` write the tag pages to where that link leads,
+the tags/ directory at the root of the site, as a card for every
+writeup carrying the tag.  The site root is --site-root, by default the
+repository when OUT_DIR is inside it, as `ch.py dist` publishes it, and
+OUT_DIR otherwise.
+
+Which pages carry which tag is worked out from the card records in the
+build manifest, so no source is read again.  OUT_DIR/.ch-tags.json
+keeps every tag's cards as last written, and only the pages of tags
+whose cards changed (a page gained or lost the tag, or one of its
+cards has a new title, date or difficulty) are rendered again.  Pages
+of tags no writeup carries any more are removed.
+"""
+import html
+import json
+import os
+import urllib.parse
+
+import ch
+import ch_index
+
+STATE_NAME = '.ch-tags.json'
+# The tags directory, under the site root, as ch.TAG_URL links to it
+TAGS_DIR = 'tags'
+# What `ch.py dist` publishes by default
+REPOSITORY = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(ch.__file__)), '..'))
+# Bump when TEMPLATE or the card markup changes, to rewrite every tag page
+FORMAT = 1
+
+TEMPLATE = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{title} | T4QI</title>
+    <link href="https://fonts.googleapis.com/css2?family=Space+Grotesk:wght@300;400;700&display=swap" rel="stylesheet">
+    <link rel="icon" type="image/x-icon" href="/assets/favicon.ico">
+    <link rel="stylesheet" href="/css/base.css">
+    <link rel="stylesheet" href="/css/navigation.css">
+    <link rel="stylesheet" href="/css/hero.css">
+    <link rel="stylesheet" href="/css/sections.css">
+    <link rel="stylesheet" href="/css/utilities.css">
+</head>
+<body>
+    <nav>
+        <ul>
+            <li><a href="/">Home</a></li>
+            <li><a href="/Projects.html">Projects</a></li>
+            <li><a href="/Blogs.html">Blog</a></li>
+        </ul>
+    </nav>
+
+    <div class="hero">
+        <div class="container">
+            <h1>{heading}</h1>
+            <p>{summary}</p>
+        </div>
+    </div>
+
+    <section class="section">
+        <div class="container">
+            <div class="blog-posts">
+{body}
+            </div>
+            <a href="/Blogs.html" class="read-more">← Back to Blog</a>
+        </div>
+    </section>
+</body>
+</html>
+'''
+
+
+def tags_path(tags_dir, slug):
+    return os.path.join(tags_dir, slug + '.html')
+
+
+def site_root(out_dir):
+    """The default site root for pages built into out_dir: the repository
+    when out_dir is inside it, else out_dir itself."""
+    out_dir = os.path.abspath(out_dir)
+    if os.path.commonpath([out_dir, REPOSITORY]) == REPOSITORY:
+        return REPOSITORY
+    return out_dir
+
+
+def tag_pages_dir(out_dir, root=None):
+    """Where the tag pages for out_dir go: TAGS_DIR under root, by default site_root(out_dir)."""
+    return os.path.join(root or site_root(out_dir), TAGS_DIR)
+
+
+def tag_map(pages, out_dir, tags_dir):
+    """{slug: {"name": ..., "cards": [[href, title, date, difficulty, section], ...]}} from the manifest `pages`.
+
+    Cards run oldest first, as on the listing pages, and hrefs are
+    relative to tags_dir.  A tag is shown as its first page spells it.
+    """
+    tags = {}
+    items = [(rel, entry['meta']) for rel, entry in pages.items() if entry.get('meta')]
+    for rel, record in sorted(items, key=ch_index.sort_key):
+        if not record.get('tags'):
+            continue
+        target = os.path.join(out_dir, os.path.splitext(rel)[0] + '.html')
+        href = urllib.parse.quote(os.path.relpath(target, tags_dir).replace(os.sep, '/'))
+        card = [href, record.get('title'), record.get('date'), record.get('difficulty'), record.get('section')]
+        for name in record['tags']:
+            slug = ch.tag_slug(name)
+            tag = tags.setdefault(slug, {'name': name, 'cards': []})
+            if not tag['cards'] or tag['cards'][-1][0] != href:
+                tag['cards'].append(card)
+    return tags
+
+
+def render_tag(tag):
+    """The page of one tag."""
+    body = []
+    for href, title, date, difficulty, section in tag['cards']:
+        record = {'title': title, 'date': date, 'difficulty': difficulty, 'section': section}
+        lines = ch_index.render_card(href, record, href)
+        body.append('\n'.join(' ' * 16 + line for line in lines))
+    count = len(tag['cards'])
+    name = html.escape(tag['name'], False)
+    return TEMPLATE.format(title=f'#{name}', heading=f'#{name}',
+                           summary=f'{count} writeup{"" if count == 1 else "s"} tagged #{name}',
+                           body='\n\n'.join(body))
+
+
+def load_state(out_dir):
+    try:
+        with open(os.path.join(out_dir, STATE_NAME), encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(state, dict) or state.get('format') != FORMAT:
+        return {}
+    return state
+
+
+def save_state(out_dir, state):
+    os.makedirs(out_dir, exist_ok=True)
+    ch.write_if_changed(os.path.join(out_dir, STATE_NAME), json.dumps(state, indent=1, sort_keys=True))
+
+
+def _remove_pages(directory, slugs):
+    for slug in slugs:
+        try:
+            os.remove(tags_path(directory, slug))
+        except FileNotFoundError:
+            pass
+
+
+def update_tags(out_dir, pages, root=None):
+    """Bring the tag pages up to date with the manifest `pages`; returns the pages written.
+
+    The pages go to TAGS_DIR under the site root `root`, by default
+    site_root(out_dir).  If they went somewhere else last time, the
+    pages written there are removed.
+    """
+    directory = tag_pages_dir(out_dir, root)
+    tags = tag_map(pages, out_dir, directory)
+    state = load_state(out_dir)
+    if state.get('tags_dir') != os.path.abspath(directory):
+        if state.get('tags_dir'):
+            _remove_pages(state['tags_dir'], state.get('tags', ()))
+        state = {}
+    old = state.get('tags', {})
+    if not tags and not old:
+        return []
+
+    written = []
+    os.makedirs(directory, exist_ok=True)
+    for slug, tag in tags.items():
+        path = tags_path(directory, slug)
+        # The file is checked too, in case it was deleted by hand
+        if old.get(slug) != tag or not os.path.exists(path):
+            if ch.write_if_changed(path, render_tag(tag)):
+                written.append(path)
+    _remove_pages(directory, old.keys() - tags.keys())
+
+    new_state = {'format': FORMAT, 'tags_dir': os.path.abspath(directory), 'tags': tags}
+    if new_state != state:
+        save_state(out_dir, new_state)
+    return written
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""Rebuild pages as soon as their markdown is saved.
+
+    python blogs/ch.py watch SRC_DIR OUT_DIR [--add-nav] [--debounce MS] [--poll]
+
+Runs one incremental build, then keeps the converter loaded and waits
+for changes under SRC_DIR: inotify where the kernel has it, a stat scan
+every --interval seconds otherwise.  Bursts of events (editors often
+write, rename and chmod on one save) are merged for --debounce ms, then
+only the changed pages and the pages that link to or embed a changed
+file are reconverted.
+"""
+import argparse
+import ctypes
+import os
+import select
+import struct
+import sys
+import time
+
+import ch_build
+
+# <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+_EVENT = struct.Struct('iIII')
+
+# Returned by a watcher when it lost track of what changed
+RESCAN = None
+
+
+def _skipped(path, skip):
+    return os.path.basename(path).startswith('.') or os.path.realpath(path) in skip
+
+
+def _walk_files(root, skip):
+    """Yield (relative path, stat) of every file under root."""
+    pending = [root]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if _skipped(entry.path, skip):
+                    continue
+                if entry.is_dir():
+                    pending.append(entry.path)
+                elif entry.is_file():
+                    yield os.path.relpath(entry.path, root), entry.stat()
+
+
+class Inotify:
+    """Recursive inotify watch on a directory tree, through libc."""
+
+    name = 'inotify'
+
+    def __init__(self, root, skip=()):
+        self.root = root
+        self.skip = set(skip)
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError('inotify is not available')
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.dirs = {}
+        self._add_tree(root)
+
+    def _add_tree(self, top):
+        for path, dirs, files in os.walk(top):
+            dirs[:] = [d for d in dirs if not _skipped(os.path.join(path, d), self.skip)]
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f'cannot watch {path}')
+            self.dirs[wd] = path
+
+    def changes(self, timeout):
+        """Relative paths changed within `timeout` seconds (None waits forever)."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    return RESCAN
+                directory = self.dirs.get(wd)
+                if directory is None or not name:
+                    if mask & IN_DELETE_SELF:
+                        self.dirs.pop(wd, None)
+                    continue
+                path = os.path.join(directory, name)
+                if _skipped(path, self.skip):
+                    continue
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        # A new directory may already hold files
+                        self._add_tree(path)
+                        changed.update(rel for rel, st in _walk_files(path, self.skip))
+                    continue
+                changed.add(os.path.relpath(path, self.root))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Poller:
+    """Finds changes by comparing stat results between scans."""
+
+    name = 'polling'
+
+    def __init__(self, root, skip=(), interval=0.5):
+        self.root = root
+        self.skip = set(skip)
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self):
+        return {rel: (st.st_mtime_ns, st.st_size) for rel, st in _walk_files(self.root, self.skip)}
+
+    def changes(self, timeout):
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        snapshot = self._scan()
+        changed = {rel for rel in snapshot.keys() | self.snapshot.keys()
+                   if snapshot.get(rel) != self.snapshot.get(rel)}
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+class WatchSession:
+    """Keeps the build manifest in memory and reconverts pages on demand.
+
+    Call load() before the first rebuild().
+    """
+
+    def __init__(self, src_dir, out_dir, add_nav=False, cache_dir=None, site_root=None):
+        self.src_dir = src_dir
+        self.out_dir = out_dir
+        self.add_nav = add_nav
+        self.cache_dir = cache_dir
+        self.site_root = site_root
+        self.manifest = {'pages': {}}
+        self.dependents = {}
+
+    def load(self):
+        """Bring the output up to date and index who links to what."""
+        results, unchanged, removed = ch_build.build(self.src_dir, self.out_dir, add_nav=self.add_nav,
+                                                     cache_dir=self.cache_dir, site_root=self.site_root)
+        self.manifest = ch_build.load_manifest(self.out_dir)
+        self.dependents = {}
+        for rel, entry in self.manifest['pages'].items():
+            self._link(rel, entry.get('links', ()))
+        return results, unchanged, removed
+
+    def _link(self, rel, names):
+        for name in names:
+            self.dependents.setdefault(name, set()).add(rel)
+
+    def _unlink(self, rel):
+        for name in self.manifest['pages'].get(rel, {}).get('links', ()):
+            self.dependents.get(name, set()).discard(rel)
+
+    def affected(self, changed):
+        """The sources to reconvert after `changed` paths were written."""
+        pages = {rel for rel in changed if rel.endswith(ch_build.MARKDOWN_SUFFIXES)}
+        for rel in changed:
+            name = os.path.basename(rel)
+            stem, suffix = os.path.splitext(name)
+            for key in (name, stem, stem + '.html'):
+                pages |= self.dependents.get(key, set())
+        return sorted(pages)
+
+    def rebuild(self, changed):
+        """Reconvert what `changed` affects; returns {rel: result or exception or None}.
+
+        None marks a source that was deleted, whose output is removed.
+        """
+        results = {}
+        for rel in self.affected(changed):
+            self._unlink(rel)
+            try:
+                result = self.convert(rel)
+            except FileNotFoundError:
+                self.remove(rel)
+                results[rel] = None
+                continue
+            except Exception as e:
+                self.manifest['pages'].pop(rel, None)
+                results[rel] = e
+                continue
+            self._link(rel, result.links)
+            results[rel] = result
+        if results:
+            self.save()
+            self.update_indexes(results)
+        return results
+
+    def convert(self, rel):
+        """Convert one source and record it; returns convert_file's PageResult."""
+        src = os.path.join(self.src_dir, rel)
+        st = os.stat(src)
+        result = ch_build.convert_file(src, os.path.join(self.out_dir, ch_build.output_path(rel)),
+                                       self.add_nav, self.cache_dir)
+        self.manifest['pages'][rel] = {'source': ch_build.file_digest(src), 'size': st.st_size,
+                                       'mtime': st.st_mtime_ns, 'links': result.links, 'meta': result.meta}
+        return result
+
+    def remove(self, rel):
+        """Forget a deleted source and remove its output."""
+        self.manifest['pages'].pop(rel, None)
+        try:
+            os.remove(os.path.join(self.out_dir, ch_build.output_path(rel)))
+        except FileNotFoundError:
+            pass
+
+    def save(self):
+        ch_build.save_manifest(self.out_dir, self.manifest)
+
+    def update_indexes(self, results):
+        """Rewrite the index pages' cards, the search index and the tag pages after rebuild() `results`."""
+        import ch_index
+        import ch_search
+        import ch_tags
+        pages = self.manifest['pages']
+        ch_index.update_indexes(self.out_dir, pages, [rel for rel, result in results.items() if result is None])
+        ch_search.update_search(self.out_dir, pages, ch_build.search_changes(results))
+        ch_tags.update_tags(self.out_dir, pages, self.site_root)
+
+
+def open_watcher(root, skip=(), poll=False, interval=0.5):
+    """An Inotify watcher on root, or a Poller if inotify can't be used."""
+    if not poll:
+        try:
+            return Inotify(root, skip)
+        except OSError as e:
+            print(f'inotify unavailable ({e}), polling instead', file=sys.stderr)
+    return Poller(root, skip, interval)
+
+
+def watch(session, watcher, debounce, out=sys.stdout):
+    """Rebuild from watcher events until interrupted."""
+    pending = set()
+    first = None
+    while True:
+        changed = watcher.changes(debounce if pending else None)
+        if changed is RESCAN:
+            print('event queue overflowed, rescanning', file=out)
+            session.load()
+            pending.clear()
+            continue
+        if changed:
+            if not pending:
+                first = time.perf_counter()
+            pending |= changed
+            continue
+        if not pending:
+            continue
+        results = session.rebuild(pending)
+        pending.clear()
+        elapsed = (time.perf_counter() - first) * 1000
+        for rel, result in sorted(results.items()):
+            if result is None:
+                print(f'  removed  {ch_build.output_path(rel)}', file=out)
+            elif isinstance(result, Exception):
+                print(f'  FAILED  {rel}: {result}', file=out)
+            else:
+                print(f'{result.seconds * 1000:>8.1f}ms  {ch_build.output_path(rel)}', file=out)
+        if results:
+            print(f'{len(results)} page(s) updated {elapsed:.0f}ms after the first change', file=out)
+        out.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='ch.py watch', description='Rebuild Markdown pages as they change')
+    parser.add_argument('src_dir', help='Directory searched for .md/.markdown files')
+    parser.add_argument('out_dir', help='Directory the .html files are written to')
+    parser.add_argument('--add-nav', action='store_true', help='Add navigation menu')
+    parser.add_argument('--cache-dir', help='Reuse parse trees cached in this directory')
+    parser.add_argument('--site-root', help='Directory the site is served from; tag pages go to its tags/ '
+                        '(default: the repository if OUT_DIR is in it, else OUT_DIR)')
+    parser.add_argument('--debounce', type=float, default=20,
+                        help='Milliseconds to wait for more events before rebuilding (default: 20)')
+    parser.add_argument('--poll', action='store_true', help='Scan for changes instead of using inotify')
+    parser.add_argument('--interval', type=float, default=0.5,
+                        help='Seconds between scans when polling (default: 0.5)')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.src_dir):
+        parser.error(f'{args.src_dir} is not a directory')
+
+    start = time.perf_counter()
+    session = WatchSession(args.src_dir, args.out_dir, args.add_nav, args.cache_dir, args.site_root)
+    results, unchanged, removed = session.load()
+    ch_build.print_summary(results, unchanged, removed, time.perf_counter() - start)
+
+    import ch_tags
+    skip = [os.path.realpath(args.out_dir), os.path.realpath(ch_tags.tag_pages_dir(args.out_dir, args.site_root))]
+    if args.cache_dir:
+        skip.append(os.path.realpath(args.cache_dir))
+    watcher = open_watcher(args.src_dir, skip, args.poll, args.interval)
+
+    print(f'watching {args.src_dir} ({watcher.name}), Ctrl-C to stop')
+    sys.stdout.flush()
+    try:
+        watch(session, watcher, args.debounce / 1000)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        watcher.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,210 @@
+// Search over the static index `ch.py build` writes (blogs/ch_search.py
+// describes the files).  Only index.json, the shard of each word in the
+// query and the docs blocks of the results shown are fetched.
+(function () {
+    'use strict';
+
+    const STOPWORDS = new Set((
+        'an and are as at be but by can do for from has have he her his how if in into is it its me my no not ' +
+        'of on or our so than that the their them then there these they this to too up us was we were what ' +
+        'when which who will with you your').split(' '));
+    const MIN_LENGTH = 2;
+    const MAX_LENGTH = 32;
+    const MAX_RESULTS = 20;
+
+    const link = document.getElementById('search-index');
+    const form = document.getElementById('search-form');
+    const input = document.getElementById('search-input');
+    const status = document.getElementById('search-status');
+    const list = document.getElementById('search-results');
+    if (!link || !form || !input || !status || !list) {
+        return;
+    }
+    const indexUrl = new URL(link.getAttribute('href'), document.baseURI);
+    // Page URLs in the docs blocks are relative to the build's output directory
+    const siteUrl = new URL('../', indexUrl);
+    const files = new Map();
+
+    function fetchOnce(name, type) {
+        if (!files.has(name)) {
+            files.set(name, fetch(new URL(name, indexUrl)).then(function (response) {
+                if (!response.ok) {
+                    throw new Error(name + ': ' + response.status);
+                }
+                return type === 'json' ? response.json() : response.arrayBuffer();
+            }));
+        }
+        return files.get(name);
+    }
+
+    // The same words ch_search.tokens() indexes
+    function tokens(text) {
+        return text.toLowerCase().split(/[^\p{L}\p{N}]+/u).filter(function (word) {
+            const length = Array.from(word).length;
+            return length >= MIN_LENGTH && length <= MAX_LENGTH && !STOPWORDS.has(word);
+        });
+    }
+
+    function shardName(word, prefix) {
+        return Array.from(word).slice(0, prefix).map(function (c) {
+            return /^[a-z0-9]$/.test(c) ? c : '_' + c.codePointAt(0).toString(16) + '_';
+        }).join('') + '.bin';
+    }
+
+    function readVarint(bytes, state) {
+        let value = 0;
+        let shift = 0;
+        for (;;) {
+            const byte = bytes[state.pos++];
+            value += (byte & 0x7f) * Math.pow(2, shift);
+            if (byte < 0x80) {
+                return value;
+            }
+            shift += 7;
+        }
+    }
+
+    // Map of word -> [start, end) of its postings; they are decoded on use
+    function readShard(buffer) {
+        const bytes = new Uint8Array(buffer);
+        const decoder = new TextDecoder();
+        const words = new Map();
+        const state = {pos: 0};
+        while (state.pos < bytes.length) {
+            const length = readVarint(bytes, state);
+            const word = decoder.decode(bytes.subarray(state.pos, state.pos + length));
+            state.pos += length;
+            readVarint(bytes, state);
+            const size = readVarint(bytes, state);
+            words.set(word, {bytes: bytes, start: state.pos, end: state.pos + size});
+            state.pos += size;
+        }
+        return words;
+    }
+
+    function postings(entry) {
+        const found = new Map();
+        const state = {pos: entry.start};
+        let doc = 0;
+        while (state.pos < entry.end) {
+            doc += readVarint(entry.bytes, state);
+            found.set(doc, readVarint(entry.bytes, state));
+        }
+        return found;
+    }
+
+    // {doc: weight} for one query word; the last one also matches longer words
+    async function lookup(index, word, isPrefix) {
+        const name = shardName(word, index.prefix);
+        if (!index.shards.has(name)) {
+            return new Map();
+        }
+        const shard = readShard(await fetchOnce(name, 'bin'));
+        const found = new Map();
+        shard.forEach(function (entry, key) {
+            if (key === word || (isPrefix && key.startsWith(word))) {
+                postings(entry).forEach(function (weight, doc) {
+                    found.set(doc, Math.max(found.get(doc) || 0, weight));
+                });
+            }
+        });
+        return found;
+    }
+
+    async function search(query) {
+        const index = await fetchOnce('index.json', 'json');
+        if (!index.shards) {
+            index.shards = new Set(index.files);
+        }
+        const words = Array.from(new Set(tokens(query)));
+        if (!words.length) {
+            return [];
+        }
+        const open = /[\p{L}\p{N}]$/u.test(query);
+        const matches = await Promise.all(words.map(function (word, i) {
+            return lookup(index, word, open && i === words.length - 1);
+        }));
+        // Every word has to match; rarer words count for more
+        let scores = null;
+        matches.forEach(function (found) {
+            const idf = Math.log(1 + index.docs / Math.max(found.size, 1));
+            const next = new Map();
+            found.forEach(function (weight, doc) {
+                if (scores === null || scores.has(doc)) {
+                    next.set(doc, (scores === null ? 0 : scores.get(doc)) + weight * idf);
+                }
+            });
+            scores = next;
+        });
+        const ranked = Array.from(scores).sort(function (a, b) {
+            return b[1] - a[1] || a[0] - b[0];
+        }).slice(0, MAX_RESULTS);
+        const blocks = await Promise.all(ranked.map(function (item) {
+            return fetchOnce('docs-' + Math.floor(item[0] / index.block) + '.json', 'json');
+        }));
+        return ranked.map(function (item, i) {
+            const row = blocks[i][item[0] % index.block];
+            return {url: new URL(row[0], siteUrl).href, title: row[1] || row[0], total: scores.size};
+        });
+    }
+
+    let pending = 0;
+
+    async function run(query) {
+        const current = ++pending;
+        status.textContent = query.trim() ? 'Searching…' : '';
+        let results;
+        try {
+            results = await search(query);
+        } catch (error) {
+            if (current === pending) {
+                status.textContent = 'Search is unavailable right now.';
+            }
+            return;
+        }
+        if (current !== pending) {
+            return;
+        }
+        list.replaceChildren();
+        results.forEach(function (result) {
+            const item = document.createElement('li');
+            const anchor = document.createElement('a');
+            anchor.href = result.url;
+            anchor.textContent = result.title;
+            item.appendChild(anchor);
+            list.appendChild(item);
+        });
+        if (!query.trim()) {
+            status.textContent = '';
+        } else if (!results.length) {
+            status.textContent = 'No writeups match.';
+        } else {
+            const total = results[0].total;
+            status.textContent = total > results.length
+                ? 'Top ' + results.length + ' of ' + total + ' writeups'
+                : total + (total === 1 ? ' writeup' : ' writeups');
+        }
+    }
+
+    let timer = null;
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        timer = setTimeout(function () {
+            run(input.value);
+        }, 150);
+    });
+    form.addEventListener('submit', function (event) {
+        event.preventDefault();
+        clearTimeout(timer);
+        const url = new URL(location.href);
+        url.searchParams.set('q', input.value);
+        history.replaceState(null, '', url);
+        run(input.value);
+    });
+
+    const initial = new URLSearchParams(location.search).get('q');
+    if (initial) {
+        input.value = initial;
+        run(initial);
+    }
+}());
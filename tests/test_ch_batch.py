@@ -0,0 +1,70 @@
+"""The --batch input framing and the status line reported for each item."""
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'blogs'))
+
+import ch  # noqa: E402
+import ch_batch  # noqa: E402
+
+TEXT = '# Cookies\n\nSome *text*.\n'
+
+
+class ReadItemsTest(unittest.TestCase):
+
+    def test_nul_separated_paths(self):
+        items = list(ch_batch.read_items('a.md\0dir/b c.md\0\n'))
+        self.assertEqual(items, [{'input': 'a.md', 'output': 'a.html'},
+                                 {'input': 'dir/b c.md', 'output': 'dir/b c.html'}])
+
+    def test_json_lines(self):
+        text = ('{"input": "a.md", "output": "out/a.html", "title": "A"}\n'
+                '\n'
+                'not json\n'
+                '{"output": "x.html"}\n'
+                '{"input": "b.md"}\n')
+        items = list(ch_batch.read_items(text))
+        self.assertEqual(items[0], {'input': 'a.md', 'output': 'out/a.html', 'title': 'A'})
+        self.assertEqual(items[1]['line'], 3)
+        self.assertIn('invalid JSON', items[1]['error'])
+        self.assertEqual(items[2], {'line': 4, 'error': 'record has no "input" path'})
+        self.assertEqual(items[3], {'input': 'b.md', 'output': 'b.html'})
+
+
+class RunTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.src = os.path.join(tmp.name, 'cookies.md')
+        with open(self.src, 'w', encoding='utf-8') as f:
+            f.write(TEXT)
+
+    def run_batch(self, text):
+        out = io.StringIO()
+        failed = ch_batch.run(ch_batch.read_items(text), out=out)
+        return failed, [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_one_status_line_per_item(self):
+        missing = self.src.replace('cookies', 'missing')
+        failed, statuses = self.run_batch(f'{self.src}\0{missing}\0')
+        self.assertEqual(failed, 1)
+        self.assertEqual([status['ok'] for status in statuses], [True, False])
+        self.assertIs(statuses[0]['written'], True)
+        self.assertIn('FileNotFoundError', statuses[1]['error'])
+        with open(statuses[0]['output'], encoding='utf-8') as f:
+            self.assertEqual(f.read(), ch.convert_markdown_to_html(TEXT, 'cookies.md'))
+
+    def test_unchanged_page_not_written(self):
+        self.run_batch(f'{self.src}\0')
+        failed, statuses = self.run_batch(f'{self.src}\0')
+        self.assertEqual(failed, 0)
+        self.assertIs(statuses[0]['written'], False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+"""Incremental builds from the content-hash manifest."""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'blogs'))
+
+import ch_build  # noqa: E402
+
+PAGES = {
+    'a.md': '# A\n\nLinks to [b](b.html).\n',
+    'b.md': '# B\n\n**Difficulty:** #Easy\n',
+    os.path.join('sub', 'c.md'): '# C\n\nText.\n',
+}
+
+
+class BuildTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.src = os.path.join(tmp.name, 'src')
+        self.out = os.path.join(tmp.name, 'out')
+        for rel, text in PAGES.items():
+            self.write(rel, text)
+
+    def write(self, rel, text):
+        path = os.path.join(self.src, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def build(self, **options):
+        return ch_build.build(self.src, self.out, jobs=1, **options)
+
+    def outputs(self):
+        """{path: (mtime, contents)} of every file under OUT_DIR."""
+        found = {}
+        for root, _, files in os.walk(self.out):
+            for name in files:
+                path = os.path.join(root, name)
+                with open(path, 'rb') as f:
+                    found[path] = os.stat(path).st_mtime_ns, f.read()
+        return found
+
+    def test_noop_rebuild_touches_nothing(self):
+        results, unchanged, removed = self.build()
+        self.assertEqual(sorted(results), sorted(PAGES))
+        before = self.outputs()
+        results, unchanged, removed = self.build()
+        self.assertEqual((results, unchanged, removed), ({}, len(PAGES), []))
+        self.assertEqual(self.outputs(), before)
+
+    def test_only_changed_source_converted(self):
+        self.build()
+        self.write('b.md', '# B\n\nNew text.\n')
+        results, unchanged, removed = self.build()
+        self.assertEqual(list(results), ['b.md'])
+        self.assertEqual(unchanged, len(PAGES) - 1)
+        with open(os.path.join(self.out, 'b.html'), encoding='utf-8') as f:
+            self.assertIn('<p>New text.</p>', f.read())
+
+    def test_removed_source_removes_page(self):
+        self.build()
+        os.remove(os.path.join(self.src, 'sub', 'c.md'))
+        results, unchanged, removed = self.build()
+        self.assertEqual(removed, [os.path.join('sub', 'c.md')])
+        self.assertFalse(os.path.exists(os.path.join(self.out, 'sub', 'c.html')))
+
+    def test_option_change_converts_everything(self):
+        self.build()
+        results, unchanged, removed = self.build(add_nav=True)
+        self.assertEqual(sorted(results), sorted(PAGES))
+        self.assertEqual(unchanged, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
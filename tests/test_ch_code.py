@@ -0,0 +1,59 @@
+"""Code spans and fenced blocks are kept away from the other inline rules."""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'blogs'))
+
+import ch  # noqa: E402
+
+
+def body(text):
+    return ''.join(ch.render_section(section) for section in ch.parse_markdown(text))
+
+
+class CodeSpanTest(unittest.TestCase):
+
+    def test_no_emphasis_inside(self):
+        self.assertEqual(body('`__init__` and `picoCTF{a_b_c}`\n'),
+                         '<div class="section"><p><code>__init__</code> and <code>picoCTF{a_b_c}</code></p>\n</div>')
+
+    def test_escaped(self):
+        self.assertIn('<code>&lt;script&gt; &amp;</code>', body('`<script> &`\n'))
+
+    def test_emphasis_around(self):
+        self.assertIn('<em>x <code>y_z</code> w</em>', body('*x `y_z` w*\n'))
+
+    def test_no_link_or_tag_inside(self):
+        html = body('`[a](b) #c` [`d`](e.html)\n')
+        self.assertIn('<code>[a](b) #c</code>', html)
+        self.assertIn('<a href="e.html" class="read-more"><code>d</code></a>', html)
+
+    def test_no_tag_right_after(self):
+        self.assertIn('<code>x</code>#tag', body('`x`#tag\n'))
+
+    def test_embed_name_with_code(self):
+        self.assertIn('<img src="pics/a<code>b</code>" alt="a<code>b</code>">', body('![[a`b`]]\n'))
+
+    def test_nul_in_source_kept(self):
+        html = body('a\0 `b\0` [c\0](d) *e\0*\n')
+        self.assertIn('<p>a\0 <code>b\0</code> <a href="d" class="read-more">c\0</a> <em>e\0</em></p>', html)
+
+
+class FencedBlockTest(unittest.TestCase):
+
+    def test_line_inside_inline_fence(self):
+        html = body('x ``` a\n*b* <i>\nc ``` d\n')
+        self.assertIn('<p>*b* &lt;i&gt;</p>', html)
+
+    def test_indented_fence_stays_in_item(self):
+        html = body('* item\n    ```py\n    x = 1\n    ```\n* next\n')
+        self.assertIn('<li>item\n<pre><code class="language-py">x = 1</code></pre>\n</li>', html)
+
+    def test_fence_in_nested_item(self):
+        html = body('* a\n    * b\n      ```\n      c\n      ```\n    * d\n')
+        self.assertIn('<li>b\n<pre><code>c</code></pre>\n</li>\n  <li>d</li>', html)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""The daemon's request and response framing, from both ends of the socket."""
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'blogs'))
+
+import ch  # noqa: E402
+import ch_daemon  # noqa: E402
+
+TEXT = '# Title\n\nSome *text* and `code`.\n'
+
+
+class DaemonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.socket = os.path.join(self.tmp.name, 'ch.sock')
+
+    def serve(self):
+        server = ch_daemon.Server(self.socket)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+    def fake(self, answer):
+        # A daemon that reads the request and sends `answer` whatever it was
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.socket)
+        listener.listen(1)
+        self.addCleanup(listener.close)
+
+        def run():
+            conn, _ = listener.accept()
+            with conn:
+                conn.recv(1 << 16)
+                conn.sendall(answer)
+        threading.Thread(target=run, daemon=True).start()
+
+    def ask(self, request, data=b''):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(self.socket)
+            sock.sendall(json.dumps(request).encode() + b'\n' + data)
+            with sock.makefile('rb') as response:
+                return json.loads(response.readline()), response.read()
+
+    def convert(self, out, text=TEXT):
+        with open(os.path.join(self.tmp.name, 'in.md'), 'w', encoding='utf-8') as f:
+            f.write(text)
+        argv = ['ch.py', f.name, out]
+        with mock.patch.dict(os.environ, {'CH_SOCKET': self.socket}), mock.patch.object(sys, 'argv', argv):
+            return ch.main()
+
+    def test_page_matches_in_process(self):
+        self.serve()
+        out = os.path.join(self.tmp.name, 'out.html')
+        self.assertEqual(self.convert(out), 0)
+        with open(out, encoding='utf-8') as f:
+            self.assertEqual(f.read(), ch.convert_markdown_to_html(TEXT, 'in.md'))
+        self.assertEqual(self.ask({'op': 'stats'})[0]['requests'], 1)
+
+    def test_length_in_status(self):
+        self.serve()
+        data = TEXT.encode()
+        status, page = self.ask({'filename': 'in.md', 'length': len(data), 'version': ch.source_stamp()}, data)
+        self.assertEqual(status, {'ok': True, 'length': len(page)})
+
+    def test_bad_lengths_turned_down(self):
+        self.serve()
+        for length in (None, -1, '12', ch_daemon.MAX_LENGTH + 1):
+            request = {'length': length, 'version': ch.source_stamp()}
+            if length is None:
+                del request['length']
+            status, page = self.ask(request)
+            self.assertIs(status['ok'], False, length)
+            self.assertEqual(page, b'')
+
+    def test_truncated_stream_keeps_old_page(self):
+        out = os.path.join(self.tmp.name, 'out.html')
+        with open(out, 'w', encoding='utf-8') as f:
+            f.write('old page')
+        self.fake(b'{"ok": true, "length": 1000}\n<!DOCTYPE html>')
+        with self.assertRaises(ConnectionError):
+            self.convert(out)
+        with open(out, encoding='utf-8') as f:
+            self.assertEqual(f.read(), 'old page')
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ['ch.sock', 'in.md', 'out.html'])
+
+    def test_refusal_converts_in_process(self):
+        out = os.path.join(self.tmp.name, 'out.html')
+        self.fake(b'{"ok": false, "error": "no"}\n')
+        self.assertEqual(self.convert(out), 0)
+        with open(out, encoding='utf-8') as f:
+            self.assertEqual(f.read(), ch.convert_markdown_to_html(TEXT, 'in.md'))
+
+
+if __name__ == '__main__':
+    unittest.main()
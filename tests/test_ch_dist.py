@@ -0,0 +1,72 @@
+"""The publish directory holds what the site links to, and only that."""
+import io
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'blogs'))
+
+import ch_dist  # noqa: E402
+
+SITE = {
+    'index.html': '<link rel="stylesheet" href="css/site.css"><a href="blogs/a">A</a> <a href="#top">top</a>'
+                  '<a href="https://example.com/">out</a> <a href="gone.html">gone</a>',
+    'css/site.css': 'body { background: url("../img/bg.png"); }',
+    'img/bg.png': 'png',
+    'blogs/a.html': '<img src="b%20c.png"><link rel="prefetch" href="/search/index.json">',
+    'blogs/b c.png': 'png',
+    'search/index.json': '{"files": ["ab.bin"]}',
+    'search/ab.bin': 'bin',
+    'notes.md': 'never linked',
+    '.history/index.html': 'editor history',
+}
+
+
+class DistTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = os.path.join(tmp.name, 'site')
+        self.out = os.path.join(self.root, 'dist')
+        for rel, text in SITE.items():
+            self.write(rel, text)
+
+    def write(self, rel, text):
+        path = os.path.join(self.root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def dist(self, *options):
+        with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+            return ch_dist.main(['--root', self.root, *options])
+
+    def published(self):
+        return sorted(os.path.relpath(os.path.join(path, name), self.out).replace(os.sep, '/')
+                      for path, dirs, names in os.walk(self.out) for name in names)
+
+    def test_crawl(self):
+        files, missing = ch_dist.Site(self.root, exclude=[self.out]).crawl()
+        self.assertEqual(sorted(files), ['blogs/a.html', 'blogs/b c.png', 'css/site.css', 'img/bg.png',
+                                         'index.html', 'search/ab.bin', 'search/index.json'])
+        self.assertEqual(missing, [('index.html', '/gone.html')])
+
+    def test_publish_follows_the_site(self):
+        self.assertEqual(self.dist(), 0)
+        self.assertNotIn('notes.md', self.published())
+        self.write('index.html', '<a href="blogs/a.html">A</a>')
+        self.assertEqual(self.dist(), 0)
+        self.assertEqual(self.published(), ['blogs/a.html', 'blogs/b c.png', 'index.html',
+                                            'search/ab.bin', 'search/index.json'])
+        self.assertFalse(os.path.exists(os.path.join(self.out, 'css')))
+
+    def test_strict_fails_on_missing_links(self):
+        self.assertEqual(self.dist('--strict'), 1)
+        self.assertFalse(os.path.exists(self.out))
+
+
+if __name__ == '__main__':
+    unittest.main()
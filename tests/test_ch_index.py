@@ -0,0 +1,112 @@
+"""Card metadata read from writeup headers and front matter, and the listings made from it."""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'blogs'))
+
+import ch  # noqa: E402
+import ch_index  # noqa: E402
+
+
+def metadata(text, filename='cookies.md'):
+    return ch_index.page_metadata(text, ch.parse_markdown(text), filename)
+
+
+class PageMetadataTest(unittest.TestCase):
+
+    def test_header_block(self):
+        record = metadata('# Cookies - Write-Up\n\n'
+                          '**Date:** 13/03/2025\n'
+                          '**Challenge Category:** #Web-Security\n'
+                          '**Difficulty:** #Easy\n')
+        self.assertEqual(record, {'title': 'Cookies', 'date': '2025-03-13', 'category': 'Web-Security',
+                                  'section': 'web', 'difficulty': 'Easy', 'tags': ['Web-Security', 'Easy']})
+
+    def test_missing_fields_are_none(self):
+        record = metadata('Just some notes.\n')
+        self.assertEqual(record['title'], 'cookies')
+        self.assertIsNone(record['date'])
+        self.assertIsNone(record['category'])
+        self.assertIsNone(record['difficulty'])
+        self.assertEqual(record['section'], ch_index.OTHER)
+
+    def test_front_matter_wins(self):
+        record = metadata('---\ntitle: "Local Authority"\ndifficulty: [Medium]\ntags:\n  - web\n---\n'
+                          '# Other Title\n\n**Difficulty:** Easy\n')
+        self.assertEqual(record['title'], 'Local Authority')
+        self.assertEqual(record['difficulty'], 'Medium')
+        self.assertEqual(record['tags'], ['web'])
+
+    def test_empty_list_is_none(self):
+        self.assertIsNone(metadata('---\ndifficulty: []\n---\n# T\n')['difficulty'])
+
+
+class FrontMatterTest(unittest.TestCase):
+
+    def test_scalars_and_lists(self):
+        text = '---\nTitle: \'Cookies\'\ntags: [a, "b c"]\naliases:\n  - x\n  - y\n# comment\n---\nbody\n'
+        self.assertEqual(ch_index.front_matter(text),
+                         {'title': 'Cookies', 'tags': ['a', 'b c'], 'aliases': ['x', 'y']})
+
+    def test_unclosed_block_is_a_rule(self):
+        self.assertEqual(ch_index.front_matter('---\ntitle: x\n'), {})
+
+    def test_no_front_matter(self):
+        self.assertEqual(ch_index.front_matter('# Title\n---\n'), {})
+
+    def test_left_out_of_the_page(self):
+        text = '---\ntitle: Cookies\ntags: [web]\n---\n# Cookies\n\nbody\n'
+        html = ch.convert_markdown_to_html(text, 'cookies.md')
+        self.assertNotIn('title: Cookies', html)
+        self.assertNotIn('<hr>', html)
+        self.assertIn('<h1>Cookies</h1>', html)
+        streamed = ''.join(ch.iter_convert([text[:7], text[7:]], 'cookies.md'))
+        self.assertEqual(streamed, html)
+
+    def test_unclosed_block_stays_on_the_page(self):
+        html = ch.convert_markdown_to_html('---\ntitle: x\n', 'x.md')
+        self.assertIn('<hr>', html)
+        self.assertIn('title: x', html)
+
+
+def entry(title, difficulty):
+    return {'meta': {'title': title, 'date': '2025-03-13', 'section': 'web', 'difficulty': difficulty}}
+
+
+class ListingTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.out = tmp.name
+        self.directory = os.path.join(self.out, 'picoCTF')
+        os.makedirs(self.directory)
+        self.write('picoCTF.html', '<title>picoCTF</title>\n<!-- ch:tabs -->\n<!-- /ch:tabs -->\n'
+                                   '<!-- ch:cards -->\n<!-- /ch:cards -->\n')
+
+    def write(self, filename, text):
+        with open(os.path.join(self.directory, filename), 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def test_only_recorded_listings_removed(self):
+        ch_index.update_indexes(self.out, {'picoCTF/a.md': entry('A', 'Easy'), 'picoCTF/b.md': entry('B', 'Hard')})
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'picoCTF-difficulty-hard.html')))
+        # Hand-written pages that happen to look like listings
+        self.write('picoCTF-difficulty-insane.html', 'by hand')
+        self.write('picoCTF-other-2.html', 'by hand')
+        ch_index.update_indexes(self.out, {'picoCTF/a.md': entry('A', 'Easy')}, ['picoCTF/b.md'])
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['picoCTF-binary.html', 'picoCTF-crypto.html', 'picoCTF-difficulty-easy.html',
+                          'picoCTF-difficulty-insane.html', 'picoCTF-forensics.html', 'picoCTF-other-2.html',
+                          'picoCTF-reverse.html', 'picoCTF-web.html', 'picoCTF.html'])
+
+    def test_no_state_removes_nothing(self):
+        self.write('picoCTF-difficulty-hard.html', 'from an older build')
+        ch_index.update_indexes(self.out, {'picoCTF/a.md': entry('A', 'Easy')})
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'picoCTF-difficulty-hard.html')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""The search index a build writes, read back the way js/search.js reads it."""
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'blogs'))
+
+import ch_build  # noqa: E402
+import ch_search  # noqa: E402
+
+
+class SearchIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.src = os.path.join(tmp.name, 'src')
+        self.out = os.path.join(tmp.name, 'out')
+        os.makedirs(os.path.join(self.src, 'picoCTF'))
+        self.write('picoCTF/cookies.md', '# Cookies\n\nThe flag was in a cookie.\n\n## Solution\n\nbrute force\n')
+        self.write('picoCTF/ssti.md', '# SSTI\n\nA template injection. #Web\n')
+
+    def write(self, rel, text):
+        with open(os.path.join(self.src, rel), 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def search(self, word):
+        """{url: (title, weight)} of the pages indexed under word."""
+        directory = os.path.join(self.out, 'search')
+        with open(os.path.join(directory, 'index.json'), encoding='utf-8') as f:
+            index = json.load(f)
+        self.assertEqual(index['format'], ch_search.FORMAT)
+        shard = ch_search.shard_name(word[:index['prefix']])
+        if shard not in index['files']:
+            return {}
+        with open(os.path.join(directory, shard), 'rb') as f:
+            entry = ch_search.read_shard(f.read()).get(word)
+        if entry is None:
+            return {}
+        found = {}
+        for page, weight in ch_search.decode_postings(entry[1]):
+            with open(os.path.join(directory, f'docs-{page // ch_search.BLOCK}.json'), encoding='utf-8') as f:
+                url, title = json.load(f)[page % ch_search.BLOCK]
+            found[url] = (title, weight)
+        return found
+
+    def test_round_trip(self):
+        ch_build.build(self.src, self.out, jobs=1)
+        self.assertEqual(self.search('cookie'), {'picoCTF/cookies.html': ('Cookies', 1)})
+        self.assertEqual(self.search('solution'), {'picoCTF/cookies.html': ('Cookies', ch_search.HEADING_WEIGHT)})
+        self.assertEqual(self.search('ssti'), {'picoCTF/ssti.html': ('SSTI', ch_search.TITLE_WEIGHT
+                                                                        + ch_search.HEADING_WEIGHT)})
+        self.assertEqual(self.search('web'), {'picoCTF/ssti.html': ('SSTI', 1 + ch_search.TAG_WEIGHT)})
+        self.assertEqual(self.search('the'), {})
+
+    def test_changed_and_removed_pages(self):
+        ch_build.build(self.src, self.out, jobs=1)
+        self.write('picoCTF/cookies.md', '# Cookies\n\nNothing here now.\n')
+        os.remove(os.path.join(self.src, 'picoCTF', 'ssti.md'))
+        ch_build.build(self.src, self.out, jobs=1)
+        self.assertEqual(self.search('cookie'), {})
+        self.assertEqual(self.search('nothing'), {'picoCTF/cookies.html': ('Cookies', 1)})
+        self.assertEqual(self.search('template'), {})
+
+    def test_rebuilt_from_scratch_when_state_is_lost(self):
+        ch_build.build(self.src, self.out, jobs=1)
+        before = self.search('template')
+        state = os.path.join(self.out, '.ch-search')
+        for name in os.listdir(state):
+            os.remove(os.path.join(state, name))
+        ch_build.build(self.src, self.out, jobs=1)
+        self.assertEqual(self.search('template'), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
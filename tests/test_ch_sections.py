@@ -0,0 +1,33 @@
+"""Blocks split into sections at header tags that turn up inside them."""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'blogs'))
+
+import ch  # noqa: E402
+
+
+def body(text):
+    return ''.join(ch.render_section(section) for section in ch.parse_markdown(text))
+
+
+class HeaderInBlockTest(unittest.TestCase):
+
+    def test_split_keeps_links(self):
+        html = body('a [b](c)<h2>[d](e)</h2>[f](g)\n')
+        self.assertIn('<p>a <a href="c" class="read-more">b</a>', html)
+        self.assertIn('<div class="section" id="d"><h2><a href="e" class="read-more">d</a></h2>'
+                      '<a href="g" class="read-more">f</a>', html)
+
+    def test_nul_in_source(self):
+        html = ch.convert_markdown_to_html('<h2>x</h2>[a](b)\0\n', 'x.md')
+        self.assertIn('<h2>x</h2><a href="b" class="read-more">a</a>\0\n', html)
+
+    def test_nul_around_nodes(self):
+        html = body('\0<h2>[x\0](y)\0</h2>\0[a](b)\n')
+        self.assertIn('<h2><a href="y" class="read-more">x\0</a>\0</h2>\0<a href="b" class="read-more">a</a>', html)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""Tag pages kept in step with the writeups that carry each #tag."""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'blogs'))
+
+import ch  # noqa: E402
+import ch_build  # noqa: E402
+import ch_tags  # noqa: E402
+
+
+def page(title, *tags):
+    return {'meta': {'title': title, 'date': '2025-03-13', 'difficulty': None, 'section': 'web',
+                     'tags': list(tags)}}
+
+
+class UpdateTagsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.out = os.path.join(self.tmp.name, 'out')
+        self.tags = os.path.join(self.out, ch_tags.TAGS_DIR)
+
+    def listing(self):
+        return sorted(os.listdir(self.tags))
+
+    def test_stale_tags_removed(self):
+        ch_tags.update_tags(self.out, {'a.md': page('A', 'Web', 'Easy'), 'b.md': page('B', 'Web')})
+        self.assertEqual(self.listing(), ['easy.html', 'web.html'])
+        written = ch_tags.update_tags(self.out, {'a.md': page('A', 'Web'), 'b.md': page('B', 'Web')})
+        self.assertEqual(self.listing(), ['web.html'])
+        self.assertEqual(written, [])
+
+    def test_only_changed_tags_rewritten(self):
+        ch_tags.update_tags(self.out, {'a.md': page('A', 'Web'), 'b.md': page('B', 'Easy')})
+        written = ch_tags.update_tags(self.out, {'a.md': page('A2', 'Web'), 'b.md': page('B', 'Easy')})
+        self.assertEqual(written, [os.path.join(self.tags, 'web.html')])
+        with open(written[0], encoding='utf-8') as f:
+            self.assertIn('<h3>A2</h3>', f.read())
+
+    def test_pages_follow_the_site_root(self):
+        ch_tags.update_tags(self.out, {'a.md': page('A', 'Web')})
+        root = os.path.join(self.tmp.name, 'site')
+        ch_tags.update_tags(self.out, {'a.md': page('A', 'Web')}, root)
+        self.assertEqual(self.listing(), [])
+        self.assertEqual(os.listdir(os.path.join(root, ch_tags.TAGS_DIR)), ['web.html'])
+
+
+class TagLinkTest(unittest.TestCase):
+
+    def test_build_links_as_a_single_page(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, 'src')
+            os.makedirs(os.path.join(src, 'picoCTF'))
+            text = '# Cookies\n\n**Difficulty:** #Easy\n'
+            with open(os.path.join(src, 'picoCTF', 'cookies.md'), 'w', encoding='utf-8') as f:
+                f.write(text)
+            out = os.path.join(tmp, 'out')
+            ch_build.build(src, out, jobs=1)
+            with open(os.path.join(out, 'picoCTF', 'cookies.html'), encoding='utf-8') as f:
+                built = f.read()
+            self.assertEqual(built, ch.convert_markdown_to_html(text, 'cookies.md'))
+            self.assertIn('<a href="/tags/easy.html" class="tag">#Easy</a>', built)
+            self.assertTrue(os.path.exists(os.path.join(out, 'tags', 'easy.html')))
+
+    def test_default_site_root(self):
+        self.assertEqual(ch_tags.site_root(os.path.join(ch_tags.REPOSITORY, 'blogs')), ch_tags.REPOSITORY)
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertEqual(ch_tags.site_root(tmp), os.path.abspath(tmp))
+
+
+if __name__ == '__main__':
+    unittest.main()